@@ -1,25 +1,112 @@
 # Create and activate a virtual environment
 # ------------------------------------------------------------------
 # python3 -m venv myenv && source myenv/bin/activate
-# pip install --upgrade pip && pip install requests websockets
+# pip install --upgrade pip && pip install requests websockets aiohttp ijson numpy pyarrow
 # deactivate
 
 import json
 import signal
 import asyncio
+import aiohttp
 import requests
 import websockets
+from requests.adapters import HTTPAdapter
+from pagination import paginate
+from query_batching import QueryBatcher
+from streaming_json import iter_items
+from graphql_document import parse
+from instrumentation import TimingHTTPAdapter
+from columnar import to_columnar
+
+class HttpTransport:
+    """
+    A pooled, keep-alive HTTP transport for the GraphQL endpoint.
+    A single instance is meant to be shared by every DgraphClient so that
+    repeated queries reuse the same TCP (and TLS) connections.
+    """
+    def __init__(self, pool_connections=4, pool_maxsize=16, timeout=(3.05, 60), max_retries=0):
+        """
+        Initialize the transport with its own connection pool.
+
+        :param pool_connections: Number of distinct hosts to keep pools for.
+        :param pool_maxsize: Maximum number of idle connections kept per host.
+        :param timeout: Default (connect, read) timeout in seconds for each request.
+        :param max_retries: Number of retries on connection errors.
+        """
+        self.timeout = timeout
+        self.pool_options = {'pool_connections': pool_connections, 'pool_maxsize': pool_maxsize, 'max_retries': max_retries}
+        self.instrumented = False
+        self.session = requests.Session()
+        self._mount(HTTPAdapter(**self.pool_options))
+        self.session.headers.update({'Connection': 'keep-alive'})
+
+    def instrument(self):
+        """
+        Switch to connections that report DNS and connect times to Instrumentation.
+        Called by DgraphClients given an Instrumentation; idle pooled connections are closed.
+        """
+        if not self.instrumented:
+            self.instrumented = True
+            self._mount(TimingHTTPAdapter(**self.pool_options))
+
+    def _mount(self, adapter):
+        previous = set(self.session.adapters.values())
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        for replaced in previous:
+            replaced.close()
+
+    def post(self, url, payload, timeout=None, **kwargs):
+        """
+        POST a JSON payload over a pooled connection.
+
+        :param url: The URL to post to.
+        :param payload: The JSON-serializable request body.
+        :param timeout: Optional per-request timeout overriding the default.
+        :return: The requests.Response object.
+        """
+        return self.session.post(url, json=payload, timeout=timeout or self.timeout, **kwargs)
+
+    def close(self):
+        """
+        Close all pooled connections.
+        """
+        self.session.close()
+
+_default_transport = None
+
+def get_default_transport():
+    """
+    Return the process-wide HttpTransport, creating it on first use.
+    """
+    global _default_transport
+    if _default_transport is None:
+        _default_transport = HttpTransport()
+    return _default_transport
 
 class DgraphClient:
     """
     A client class to interact with Dgraph's GraphQL API.
     It supports querying, mutating, and subscribing to real-time updates.
     """
-    def __init__(self, graphql_endpoint='http://localhost:8080/graphql'):
+    def __init__(self, graphql_endpoint='http://localhost:8080/graphql', transport=None, timeout=None, cache=None,
+                 instrumentation=None):
         """
         Initialize the DgraphClient with the provided GraphQL endpoint.
+
+        :param graphql_endpoint: The GraphQL endpoint URL.
+        :param transport: Optional HttpTransport; defaults to the shared process-wide pool.
+        :param timeout: Optional timeout for this client's requests, overriding the transport default.
+        :param cache: Optional result cache (e.g. a ResultCache) consulted before every query.
+        :param instrumentation: Optional Instrumentation timing every query and mutation.
         """
         self.graphql_endpoint = graphql_endpoint
+        self.transport = transport or get_default_transport()
+        self.timeout = timeout
+        self.cache = cache
+        self.instrumentation = instrumentation
+        if instrumentation is not None:
+            self.transport.instrument()
         self.stop_event = asyncio.Event()
 
     def query(self, query, variables=None):
@@ -30,15 +117,74 @@ class DgraphClient:
         :param variables: Optional variables for the query.
         :return: The response from the GraphQL API.
         """
-        response = requests.post(self.graphql_endpoint, json={'query': query, 'variables': variables})
+        if self.cache is not None:
+            cached = self.cache.get(query, variables)
+            if cached is not None:
+                if self.instrumentation is not None:
+                    self.instrumentation.record_cache_hit(query)
+                return cached
+            # A mutation invalidating these types while the query runs keeps its result out of the cache
+            generation = self.cache.generation(query)
+        result = self._post(query, variables)
+        if self.cache is not None:
+            self.cache.put(query, variables, result, generation)
+        return result
+
+    def mutate(self, mutation, variables=None):
+        """
+        Perform a GraphQL mutation.
+        Cached results that read a type written by the mutation are invalidated.
+
+        :param mutation: The GraphQL mutation string.
+        :param variables: Optional variables for the mutation.
+        :return: The response from the GraphQL API.
+        """
+        result = self._post(mutation, variables)
+        if self.cache is not None:
+            self.cache.invalidate_mutation(mutation)
+        return result
+
+    def _post(self, document, variables):
+        if self.instrumentation is not None:
+            return self.instrumentation.post(self.transport, self.graphql_endpoint, document, variables, self.timeout)
+        response = self.transport.post(self.graphql_endpoint, {'query': document, 'variables': variables}, timeout=self.timeout)
         return response.json()
 
-    async def subscribe(self, subscription, variables=None):
+    def query_stream(self, query, variables=None, root_field=None, chunk_size=65536):
+        """
+        Perform a GraphQL query and yield the records of one root field as they arrive,
+        instead of materializing the whole response.
+
+        :param query: The GraphQL query string.
+        :param variables: Optional variables for the query.
+        :param root_field: The root field whose records are yielded; may be omitted when the query has a single root field.
+        :param chunk_size: Number of bytes read from the response body at a time.
+        :return: A generator of records.
+
+        Streamed results are never held in full, so they bypass the result cache: they are neither
+        looked up nor stored. They are still timed by the instrumentation, like every other operation.
+        """
+        if root_field is None:
+            selections = parse(query).operation().selections
+            if len(selections) != 1:
+                raise ValueError("The query has several root fields, choose one with root_field")
+            root_field = selections[0].response_key
+        if self.instrumentation is not None:
+            chunks = self.instrumentation.stream(self.transport, self.graphql_endpoint, query, variables,
+                                                 self.timeout, chunk_size)
+            yield from iter_items(chunks, ('data', root_field))
+            return
+        payload = {'query': query, 'variables': variables}
+        with self.transport.post(self.graphql_endpoint, payload, timeout=self.timeout, stream=True) as response:
+            yield from iter_items(response.iter_content(chunk_size), ('data', root_field))
+
+    async def subscribe(self, subscription, variables=None, on_message=None):
         """
         Perform a GraphQL subscription using WebSockets.
 
         :param subscription: The GraphQL subscription string.
         :param variables: Optional variables for the subscription.
+        :param on_message: Optional callback receiving each decoded message; messages are printed otherwise.
         """
         async with websockets.connect(self.graphql_endpoint.replace("http", "ws"), subprotocols=["graphql-ws"]) as websocket:
             # Initialize the WebSocket connection
@@ -63,7 +209,10 @@ class DgraphClient:
             try:
                 while not self.stop_event.is_set():
                     response = await websocket.recv()
-                    print(response)
+                    if on_message is None:
+                        print(response)
+                    else:
+                        on_message(json.loads(response))
             except websockets.ConnectionClosed:
                 pass
 
@@ -82,21 +231,183 @@ class DgraphClient:
         """
         await self.subscribe(subscription_query, variables)
 
+class AsyncDgraphClient:
+    """
+    A non-blocking client for Dgraph's GraphQL API built on aiohttp.
+    Queries are coroutines, so many of them can be in flight on one event loop.
+    """
+    def __init__(self, graphql_endpoint='http://localhost:8080/graphql', pool_size=16, timeout=60):
+        """
+        Initialize the AsyncDgraphClient with the provided GraphQL endpoint.
+
+        :param graphql_endpoint: The GraphQL endpoint URL.
+        :param pool_size: Maximum number of simultaneous connections.
+        :param timeout: Total timeout in seconds for each request.
+        """
+        self.graphql_endpoint = graphql_endpoint
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session = None
+
+    def _get_session(self):
+        # The session must be created inside the running event loop
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self.session
+
+    async def query(self, query, variables=None):
+        """
+        Perform a GraphQL query without blocking the event loop.
+
+        :param query: The GraphQL query string.
+        :param variables: Optional variables for the query.
+        :return: The response from the GraphQL API.
+        """
+        session = self._get_session()
+        async with session.post(self.graphql_endpoint, json={'query': query, 'variables': variables}) as response:
+            return await response.json(content_type=None)
+
+    async def close(self):
+        """
+        Close the underlying HTTP session and its connections.
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+# The analyses provided by AnalysisAPI, in report order, with their display titles
+ANALYSES = [
+    ('customer_segmentation', "Customer Segmentation"),
+    ('customer_lifetime_value', "Customer Lifetime Value (CLV) Analysis"),
+    ('churn_analysis', "Churn Analysis"),
+    ('customer_journey_analysis', "Customer Journey Analysis"),
+    ('personalized_marketing', "Personalized Marketing"),
+    ('product_performance_analysis', "Product Performance Analysis"),
+    ('review_sentiment_analysis', "Review Sentiment Analysis"),
+    ('sales_trend_analysis', "Sales Trend Analysis"),
+    ('promotion_effectiveness_analysis', "Promotion Effectiveness Analysis"),
+    ('cross_sell_upsell_analysis', "Cross-Sell and Upsell Analysis"),
+    ('recommendation_effectiveness', "Recommendation Effectiveness"),
+    ('market_basket_analysis', "Market Basket Analysis"),
+    ('inventory_optimization', "Inventory Optimization"),
+    ('demand_forecasting', "Demand Forecasting"),
+]
+
+class _QueryRecorder:
+    """
+    A stand-in client that returns the query text instead of sending it.
+    """
+    def query(self, query, variables=None):
+        return query
+
 class AnalysisAPI:
     """
     A class to interact with various analysis-related GraphQL API endpoints.
     """
-    def __init__(self, client):
+    def __init__(self, client, aggregate=False):
         """
         Initialize the AnalysisAPI with the provided DgraphClient.
+
+        :param client: The DgraphClient the analyses are sent through.
+        :param aggregate: Let Dgraph compute counts, sums, averages and extremes with `*Aggregate`
+                          fields wherever an analysis only needs those, instead of fetching every
+                          related record. Responses then grow with the number of members or products
+                          rather than with the number of orders and reviews.
         """
         self.client = client
+        self.aggregate = aggregate
+
+    def query_document(self, name):
+        """
+        Return the GraphQL query sent by an analysis method, without sending it.
+
+        :param name: The analysis method name, e.g. 'sales_trend_analysis'.
+        """
+        return getattr(AnalysisAPI(_QueryRecorder(), self.aggregate), name)()
+
+    def stream(self, name, root_field=None, page_size=1000, prefetch=True, keyset=False):
+        """
+        Stream the records of an analysis page by page instead of loading the whole collection.
+        Memory use is bounded by the page size regardless of how many records exist.
+
+        :param name: The analysis method name, e.g. 'customer_segmentation'.
+        :param root_field: The root field to walk, required for analyses with several roots (e.g. 'queryOrder').
+        :param page_size: Number of records fetched per request.
+        :param prefetch: Fetch the next page in the background while the current one is consumed.
+        :param keyset: Page with an `@id` filter instead of `offset`.
+        :return: A generator of records.
+        """
+        return paginate(self.client, self.query_document(name), root_field=root_field,
+                        page_size=page_size, prefetch=prefetch, keyset=keyset)
+
+    def stream_response(self, name, root_field=None):
+        """
+        Run an analysis and yield its records while the response body is still being received.
+
+        :param name: The analysis method name, e.g. 'sales_trend_analysis'.
+        :param root_field: The root field to read, required for analyses with several roots.
+        :return: A generator of records.
+        """
+        return self.client.query_stream(self.query_document(name), root_field=root_field)
+
+    def to_columnar(self, name, root_field=None):
+        """
+        Run an analysis and materialize its records as typed columns while the response is received.
+        Ids are dictionary-encoded int32 codes, totals float64, dates datetime64[ms], and nested
+        lists (e.g. order -> products) CSR offsets into a child table; see columnar.ColumnarTable.
+
+        :param name: The analysis method name, e.g. 'market_basket_analysis'.
+        :param root_field: The root field to read, required for analyses with several roots.
+        :return: A ColumnarTable; call `to_arrow()` on it for a pyarrow.Table.
+        """
+        return to_columnar(self.stream_response(name, root_field=root_field))
+
+    def run_batched(self, names):
+        """
+        Run several analyses as a single GraphQL request.
+        Fields shared by the analyses (e.g. `queryOrder { products { productId } }`)
+        are fetched once and the response is split back per analysis.
+
+        :param names: List of analysis method names, e.g. ['market_basket_analysis', 'demand_forecasting'].
+        :return: A dict mapping each analysis name to its response.
+        """
+        batcher = QueryBatcher(self.client)
+        batched_api = AnalysisAPI(batcher, self.aggregate)
+        pending = {name: getattr(batched_api, name)() for name in names}
+        batcher.flush()
+        return {name: result.result() for name, result in pending.items()}
 
     # Customer Behavior Analysis
     def customer_segmentation(self):
         """
         Group customers based on purchasing behavior, demographics, or interactions.
         """
+        if self.aggregate:
+            query = """
+            query CustomerSegmentation {
+                queryMember {
+                    memberId
+                    name
+                    email
+                    ordersAggregate {
+                        count
+                        totalSum
+                        totalAvg
+                    }
+                    reviewsAggregate {
+                        count
+                    }
+                }
+            }
+            """
+            return self.client.query(query)
         query = """
         query CustomerSegmentation {
             queryMember {
@@ -118,6 +429,22 @@ class AnalysisAPI:
         """
         Calculate the projected revenue a customer will generate over their relationship with the business.
         """
+        if self.aggregate:
+            query = """
+            query CustomerLifetimeValue {
+                queryMember {
+                    memberId
+                    ordersAggregate {
+                        count
+                        totalSum
+                        totalAvg
+                        dateMin
+                        dateMax
+                    }
+                }
+            }
+            """
+            return self.client.query(query)
         query = """
         query CustomerLifetimeValue {
             queryMember {
@@ -135,6 +462,25 @@ class AnalysisAPI:
         """
         Identify customers at risk of leaving and understand factors contributing to churn.
         """
+        if self.aggregate:
+            query = """
+            query ChurnAnalysis {
+                queryMember {
+                    memberId
+                    ordersAggregate {
+                        count
+                        dateMin
+                        dateMax
+                    }
+                    reviewsAggregate {
+                        count
+                        ratingAvg
+                        ratingMin
+                    }
+                }
+            }
+            """
+            return self.client.query(query)
         query = """
         query ChurnAnalysis {
             queryMember {
@@ -144,7 +490,9 @@ class AnalysisAPI:
                     date
                 }
                 reviews {
+                    reviewId
                     rating
+                    date
                 }
             }
         }
@@ -196,6 +544,21 @@ class AnalysisAPI:
         """
         Evaluate product sales performance, customer satisfaction, and identify top-performing products.
         """
+        if self.aggregate:
+            query = """
+            query ProductPerformanceAnalysis {
+                queryProduct {
+                    productId
+                    name
+                    price
+                    reviewsAggregate {
+                        count
+                        ratingAvg
+                    }
+                }
+            }
+            """
+            return self.client.query(query)
         query = """
         query ProductPerformanceAnalysis {
             queryProduct {
@@ -246,6 +609,7 @@ class AnalysisAPI:
                     productId
                 }
             }
+        }
         """
         return self.client.query(query)
 
@@ -263,6 +627,7 @@ class AnalysisAPI:
                     productId
                 }
             }
+        }
         """
         return self.client.query(query)
 
@@ -362,10 +727,35 @@ class AnalysisAPI:
         """
         return self.client.query(query)
 
+class AsyncAnalysisAPI(AnalysisAPI):
+    """
+    The asynchronous variant of AnalysisAPI.
+    It must be given an AsyncDgraphClient, in which case every analysis method returns a coroutine.
+    """
+    async def run_all(self, names=None, concurrency=4):
+        """
+        Run several analyses concurrently, with at most `concurrency` queries in flight.
+
+        :param names: Optional list of analysis method names; defaults to every analysis in ANALYSES.
+        :param concurrency: Maximum number of simultaneous queries.
+        :return: A dict mapping each analysis name to its response, in the requested order.
+        """
+        if names is None:
+            names = [name for name, _ in ANALYSES]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_one(name):
+            async with semaphore:
+                return await getattr(self, name)()
+
+        responses = await asyncio.gather(*(run_one(name) for name in names))
+        return dict(zip(names, responses))
+
 # Usage example
 if __name__ == '__main__':
     client = DgraphClient()
-    analysis_api = AnalysisAPI(client)
+    async_client = AsyncDgraphClient()
+    analysis_api = AsyncAnalysisAPI(async_client)
 
     def signal_handler(signal, frame):
         """
@@ -377,48 +767,11 @@ if __name__ == '__main__':
     signal.signal(signal.SIGINT, signal_handler)
 
     async def main():
-        # Example usage
-        response = analysis_api.customer_segmentation()
-        print("Customer Segmentation Response:\n", response, "\n")
-
-        response = analysis_api.customer_lifetime_value()
-        print("Customer Lifetime Value (CLV) Analysis Response:\n", response, "\n")
-
-        response = analysis_api.churn_analysis()
-        print("Churn Analysis Response:\n", response, "\n")
-
-        response = analysis_api.customer_journey_analysis()
-        print("Customer Journey Analysis Response:\n", response, "\n")
-
-        response = analysis_api.personalized_marketing()
-        print("Personalized Marketing Response:\n", response, "\n")
-
-        response = analysis_api.product_performance_analysis()
-        print("Product Performance Analysis Response:\n", response, "\n")
-
-        response = analysis_api.review_sentiment_analysis()
-        print("Review Sentiment Analysis Response:\n", response, "\n")
-
-        response = analysis_api.sales_trend_analysis()
-        print("Sales Trend Analysis Response:\n", response, "\n")
-
-        response = analysis_api.promotion_effectiveness_analysis()
-        print("Promotion Effectiveness Analysis Response:\n", response, "\n")
-
-        response = analysis_api.cross_sell_upsell_analysis()
-        print("Cross-Sell and Upsell Analysis Response:\n", response, "\n")
-
-        response = analysis_api.recommendation_effectiveness()
-        print("Recommendation Effectiveness Response:\n", response, "\n")
-
-        response = analysis_api.market_basket_analysis()
-        print("Market Basket Analysis Response:\n", response, "\n")
-
-        response = analysis_api.inventory_optimization()
-        print("Inventory Optimization Response:\n", response, "\n")
-
-        response = analysis_api.demand_forecasting()
-        print("Demand Forecasting Response:\n", response, "\n")
+        # Example usage: run every analysis concurrently
+        responses = await analysis_api.run_all(concurrency=4)
+        await async_client.close()
+        for name, title in ANALYSES:
+            print("%s Response:\n" % title, responses[name], "\n")
 
         # Start subscription example
         subscription_query = """
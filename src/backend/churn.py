@@ -0,0 +1,328 @@
+# Churn scoring over an incrementally maintained per-member feature store.
+# The store keeps one slot per member in flat NumPy arrays: order count,
+# first and last order day, sums of inter-order gaps and their squares, the
+# longest gap, review count, negative reviews and an exponentially weighted
+# rating average. New orders and reviews are folded in batch with grouped
+# array updates; `update` polls Dgraph for records dated at or after the last
+# one seen. Only the feature rows of members touched since the previous run
+# are recomputed; recency is the one feature that moves with the clock and is
+# refreshed for everyone with a single subtraction. ChurnModel is a small
+# logistic regression over these features.
+
+import warnings
+
+import numpy as np
+from scipy.optimize import minimize
+
+from columnar import ColumnarTable, to_columnar, to_datetime64
+
+_MS_PER_DAY = 86400000.0
+
+ORDERS_SINCE_QUERY = """
+query OrdersSince($since: DateTime) {
+    queryOrder(filter: {date: {ge: $since}}) {
+        orderId
+        date
+        member {
+            memberId
+        }
+    }
+}
+"""
+
+REVIEWS_SINCE_QUERY = """
+query ReviewsSince($since: DateTime) {
+    queryReview(filter: {date: {ge: $since}}) {
+        reviewId
+        rating
+        date
+        member {
+            memberId
+        }
+    }
+}
+"""
+
+def _days(dates):
+    dates = dates.astype('datetime64[ms]')
+    return np.where(np.isnat(dates), np.nan, dates.astype(np.int64) / _MS_PER_DAY)
+
+class ChurnFeatureStore:
+    """
+    Per-member churn features kept in compact arrays and updated incrementally.
+    """
+    FEATURES = ('days_since_last_order', 'order_count', 'mean_gap', 'gap_std', 'max_gap', 'overdue_ratio',
+                'review_count', 'rating_average', 'negative_reviews')
+
+    def __init__(self, rating_weight=0.3, negative_rating=2, capacity=1024):
+        """
+        :param rating_weight: Weight of each new review in the rolling rating average.
+        :param negative_rating: Ratings at or below this count as negative reviews.
+        :param capacity: Initial number of member slots; the arrays double when full.
+        """
+        self.rating_weight = rating_weight
+        self.negative_rating = negative_rating
+        self.member_ids = []
+        self.index = {}
+        self.size = 0
+        self.arrays = {}
+        self.features_cache = np.zeros((0, len(self.FEATURES)))
+        self.watermarks = {'orders': None, 'reviews': None}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        layout = {'order_count': (np.int32, 0), 'first_order': (np.float64, np.nan), 'last_order': (np.float64, np.nan),
+                  'gap_sum': (np.float64, 0), 'gap_squares': (np.float64, 0), 'max_gap': (np.float64, 0),
+                  'review_count': (np.int32, 0), 'negative_reviews': (np.int32, 0),
+                  'rating_sum': (np.float64, 0), 'rating_weights': (np.float64, 0), 'touched': (np.bool_, True)}
+        for name, (dtype, fill) in layout.items():
+            grown = np.full(capacity, fill, dtype=dtype)
+            if name in self.arrays:
+                grown[:self.size] = self.arrays[name][:self.size]
+            self.arrays[name] = grown
+            setattr(self, name, grown)
+
+    def _codes(self, member_ids):
+        # Each distinct member id of the batch is looked up once
+        member_ids = np.asarray(member_ids)
+        unique, inverse = np.unique(member_ids if member_ids.dtype.kind == 'U' else member_ids.astype(str), return_inverse=True)
+        codes = np.empty(len(unique), dtype=np.int64)
+        for position, member_id in enumerate(unique.tolist()):
+            code = self.index.get(member_id)
+            if code is None:
+                code = self.index[member_id] = len(self.member_ids)
+                self.member_ids.append(member_id)
+            codes[position] = code
+        if len(self.member_ids) > len(self.order_count):
+            self._allocate(max(len(self.member_ids), 2 * len(self.order_count)))
+        self.size = len(self.member_ids)
+        return codes[inverse.reshape(-1)]
+
+    def seed(self, members):
+        """
+        Load full history from a `churn_analysis` result (not the aggregate mode, which has no gaps).
+        The order and review watermarks move to the latest records seeded, so `update` only fetches newer ones.
+
+        :param members: A ColumnarTable or `queryMember` records with `orders { orderId date }` and
+                        `reviews { reviewId rating date }`.
+        :raises ValueError: If orders or reviews lack the ids and dates the watermarks are built from.
+        """
+        table = members if isinstance(members, ColumnarTable) else to_columnar(members)
+        codes = self._codes(table.decode('memberId').tolist() if len(table) else [])
+        orders = self._seeded(table, 'orders', ('orderId', 'date'))
+        if orders is not None:
+            self._add_orders(codes[table.parent_index('orders')], orders.column('date'))
+            self._advance('orders', orders.decode('orderId'), orders.column('date'))
+        reviews = self._seeded(table, 'reviews', ('reviewId', 'rating', 'date'))
+        if reviews is not None:
+            self._add_reviews(codes[table.parent_index('reviews')], reviews.column('rating'), reviews.column('date'))
+            self._advance('reviews', reviews.decode('reviewId'), reviews.column('date'))
+
+    @staticmethod
+    def _seeded(table, name, fields):
+        if name not in table.lists or not len(table.child(name)):
+            return None
+        child = table.child(name)
+        missing = [field for field in fields if field not in child.columns]
+        if missing:
+            raise ValueError("Seeded %s lack %s" % (name, ', '.join(missing)))
+        return child
+
+    def add_orders(self, member_ids, dates):
+        """
+        Fold new orders in.
+
+        :param member_ids: The member of each order.
+        :param dates: The date of each order, as datetime64 or ISO 8601 strings.
+        """
+        self._add_orders(self._codes(member_ids), np.array(dates, dtype='datetime64[ms]'))
+
+    def add_reviews(self, member_ids, ratings, dates=None):
+        """
+        Fold new reviews in; with dates, reviews of a batch enter the rolling average in date order.
+        """
+        self._add_reviews(self._codes(member_ids), np.asarray(ratings, dtype=np.float64),
+                          None if dates is None else np.array(dates, dtype='datetime64[ms]'))
+
+    def _add_orders(self, codes, dates):
+        days = _days(dates)
+        valid = ~np.isnan(days)
+        codes, days = codes[valid], days[valid]
+        if not len(codes):
+            return
+        order = np.lexsort((days, codes))
+        codes, days = codes[order], days[order]
+        starts = np.r_[True, codes[1:] != codes[:-1]]
+        # Each order's gap is to the member's previous order: in the batch, or the last one stored
+        previous = np.r_[np.nan, days[:-1]]
+        previous[starts] = np.nan
+        previous = np.fmax(previous, self.last_order[codes])
+        gaps = days - previous
+        # An order older than the member's latest one would split a gap that is no longer known, so it
+        # adds no gap; that member's gap statistics become approximate and recency only moves forward
+        gaps = np.where(gaps >= 0, gaps, np.nan)
+        # Orders are sorted by member, so per-member results come from one reduction per group
+        members = codes[starts]
+        bounds = np.flatnonzero(starts)
+        has_gap = ~np.isnan(gaps)
+        self.order_count[members] += np.diff(np.r_[bounds, len(codes)]).astype(np.int32)
+        self.gap_sum[members] += np.add.reduceat(np.where(has_gap, gaps, 0), bounds)
+        self.gap_squares[members] += np.add.reduceat(np.where(has_gap, gaps ** 2, 0), bounds)
+        self.max_gap[members] = np.fmax(self.max_gap[members], np.fmax.reduceat(gaps, bounds))
+        self.first_order[members] = np.fmin(self.first_order[members], days[bounds])
+        self.last_order[members] = np.fmax(self.last_order[members], np.r_[days[bounds[1:] - 1], days[-1]])
+        self.touched[members] = True
+
+    def _add_reviews(self, codes, ratings, dates=None):
+        valid = ~np.isnan(ratings)
+        codes, ratings = codes[valid], ratings[valid]
+        if not len(codes):
+            return
+        keys = (codes,) if dates is None else (_days(dates[valid]), codes)
+        order = np.lexsort(keys)
+        codes, ratings = codes[order], ratings[order]
+        # Exponentially weighted average: a member's k new reviews decay the stored sums by (1 - w)^k,
+        # and the j-th of them enters with weight w (1 - w)^(k - j)
+        counts = np.bincount(codes, minlength=self.size)
+        group_end = np.cumsum(counts)[codes]
+        decay = 1 - self.rating_weight
+        weights = self.rating_weight * decay ** (group_end - 1 - np.arange(len(codes)))
+        members = np.flatnonzero(counts)
+        factor = decay ** counts[members]
+        self.rating_sum[members] *= factor
+        self.rating_weights[members] *= factor
+        self.rating_sum[:self.size] += np.bincount(codes, weights=weights * ratings, minlength=self.size)
+        self.rating_weights[:self.size] += np.bincount(codes, weights=weights, minlength=self.size)
+        self.review_count[members] += counts[members].astype(np.int32)
+        self.negative_reviews[:self.size] += np.bincount(codes[ratings <= self.negative_rating], minlength=self.size).astype(np.int32)
+        self.touched[members] = True
+
+    def update(self, client):
+        """
+        Fetch and fold in the orders and reviews dated at or after the last ones seen.
+        Records on the watermark date itself are deduplicated by id.
+
+        :param client: A DgraphClient (or anything with `query(query, variables)`).
+        :return: (orders added, reviews added)
+        """
+        orders, order_dates = self._poll(client, 'orders', ORDERS_SINCE_QUERY, 'queryOrder', 'orderId')
+        self.add_orders([order['member']['memberId'] for order in orders], order_dates)
+        reviews, review_dates = self._poll(client, 'reviews', REVIEWS_SINCE_QUERY, 'queryReview', 'reviewId')
+        self.add_reviews([review['member']['memberId'] for review in reviews], [review['rating'] for review in reviews],
+                         review_dates)
+        return len(orders), len(reviews)
+
+    def _poll(self, client, name, query, root_field, id_field):
+        # Watermarks are parsed dates: Dgraph's DateTime strings do not sort as text once their fractions differ
+        watermark = self.watermarks[name]
+        since = str(watermark[0]) + 'Z' if watermark is not None else '1970-01-01T00:00:00Z'
+        response = client.query(query, {'since': since})
+        if response.get('errors'):
+            raise RuntimeError(response['errors'])
+        seen = watermark[1] if watermark is not None else set()
+        records = [record for record in response['data'][root_field] or []
+                   if record[id_field] not in seen and record.get('member') and record.get('date')]
+        dates = np.array([to_datetime64(record['date']) for record in records], dtype='datetime64[ms]')
+        self._advance(name, [record[id_field] for record in records], dates)
+        return records, dates
+
+    def _advance(self, name, ids, dates):
+        # The watermark is the latest date seen and the ids of the records at that date
+        valid = ~np.isnat(dates)
+        if not valid.any():
+            return
+        latest = dates[valid].max()
+        at_latest = {record_id for record_id, date in zip(ids, dates) if date == latest}
+        watermark = self.watermarks[name]
+        if watermark is None or latest > watermark[0]:
+            self.watermarks[name] = (latest, at_latest)
+        elif latest == watermark[0]:
+            self.watermarks[name] = (watermark[0], watermark[1] | at_latest)
+
+    def features(self, now):
+        """
+        Return the feature matrix, one row per member in `member_ids`, columns as in FEATURES.
+        Rows of members untouched since the previous call are reused.
+
+        :param now: The scoring date, as datetime64 or an ISO 8601 string.
+        """
+        size = self.size
+        if len(self.features_cache) < size:
+            grown = np.zeros((size, len(self.FEATURES)))
+            grown[:len(self.features_cache)] = self.features_cache
+            self.features_cache = grown
+        rows = np.flatnonzero(self.touched[:size])
+        if len(rows):
+            count = self.order_count[rows].astype(np.float64)
+            gaps = np.maximum(count - 1, 0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean_gap = np.where(gaps > 0, self.gap_sum[rows] / gaps, np.nan)
+                variance = np.where(gaps > 0, self.gap_squares[rows] / gaps - mean_gap ** 2, np.nan)
+                rating = np.where(self.rating_weights[rows] > 0, self.rating_sum[rows] / self.rating_weights[rows], np.nan)
+            block = self.features_cache[rows]
+            block[:, 1] = count
+            block[:, 2] = mean_gap
+            block[:, 3] = np.sqrt(np.maximum(variance, 0))
+            block[:, 4] = np.where(gaps > 0, self.max_gap[rows], np.nan)
+            block[:, 6] = self.review_count[rows]
+            block[:, 7] = rating
+            block[:, 8] = self.negative_reviews[rows]
+            self.features_cache[rows] = block
+            self.touched[rows] = False
+        features = self.features_cache[:size]
+        features[:, 0] = _days(np.array([now], dtype='datetime64[ms]'))[0] - self.last_order[:size]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            features[:, 5] = features[:, 0] / features[:, 2]
+        return features.copy()
+
+class ChurnModel:
+    """
+    L2-regularized logistic regression over ChurnFeatureStore features.
+    Missing features (e.g. gaps of single-order members) are imputed with the training mean.
+    """
+    def __init__(self, l2=1.0):
+        self.l2 = l2
+        self.mean = None
+        self.scale = None
+        self.coefficients = None
+
+    def _prepare(self, features):
+        return (np.where(np.isnan(features), self.mean, features) - self.mean) / self.scale
+
+    def fit(self, features, churned):
+        """
+        :param features: A ChurnFeatureStore feature matrix observed at some cutoff date.
+        :param churned: 1 for members who then did not order within the churn horizon, else 0.
+        :return: self
+        """
+        with warnings.catch_warnings():
+            # Features no member has yet (e.g. ratings before any review) are all NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            self.mean = np.nan_to_num(np.nanmean(features, axis=0))
+            self.scale = np.nanstd(features, axis=0)
+        self.scale = np.where(np.nan_to_num(self.scale) > 0, self.scale, 1.0)
+        X = np.column_stack([np.ones(len(features)), self._prepare(features)])
+        y = np.asarray(churned, dtype=np.float64)
+
+        def loss(w):
+            z = X @ w
+            penalty = 0.5 * self.l2 * (w[1:] ** 2).sum()
+            gradient = X.T @ (1 / (1 + np.exp(-z)) - y) + self.l2 * np.r_[0, w[1:]]
+            return (np.logaddexp(0, z) - y * z).sum() + penalty, gradient
+        self.coefficients = minimize(loss, np.zeros(X.shape[1]), jac=True, method='L-BFGS-B').x
+        return self
+
+    def predict_proba(self, features):
+        """
+        Return the churn probability of each row.
+        """
+        z = self.coefficients[0] + self._prepare(features) @ self.coefficients[1:]
+        return 1 / (1 + np.exp(-z))
+
+    def score(self, store, now):
+        """
+        Score every member of a store.
+
+        :return: A dict mapping member id to churn probability.
+        """
+        return dict(zip(store.member_ids, self.predict_proba(store.features(now)).tolist()))
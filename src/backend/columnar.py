@@ -0,0 +1,281 @@
+# Columnar materialization of analysis results.
+# Records such as the elements of `queryOrder` or `queryMember` are flattened
+# into typed NumPy arrays as they arrive: numbers become float64/int64
+# columns, dates datetime64[ms], and strings (ids included) are dictionary
+# encoded as int32 codes into one dictionary per field name, so the same
+# product id has the same code wherever it appears. Nested objects become
+# dotted columns (`member.memberId`, `ordersAggregate.count`) and nested
+# lists become child tables with CSR-style offsets, e.g. order -> products.
+# Tables convert to Arrow when pyarrow is installed.
+
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Field types of the schema (see schema/api_schema.graphql); other fields are typed from their values
+FIELD_TYPES = {
+    'memberId': 'String', 'productId': 'String', 'orderId': 'String', 'reviewId': 'String',
+    'name': 'String', 'email': 'String', 'description': 'String', 'category': 'String', 'comment': 'String',
+    'price': 'Float', 'total': 'Float', 'rating': 'Int', 'date': 'DateTime', 'count': 'Int',
+}
+_AGGREGATE_SUFFIXES = ('Sum', 'Avg', 'Min', 'Max')
+
+def _field_type(name, value):
+    base = name.rsplit('.', 1)[-1]
+    if base in FIELD_TYPES:
+        return FIELD_TYPES[base]
+    for suffix in _AGGREGATE_SUFFIXES:
+        # e.g. totalSum, ratingAvg, dateMax
+        if base.endswith(suffix) and base[:-len(suffix)] in FIELD_TYPES:
+            return 'Float' if suffix == 'Avg' else FIELD_TYPES[base[:-len(suffix)]]
+    if isinstance(value, bool) or isinstance(value, str):
+        return 'String'
+    if isinstance(value, int):
+        return 'Int'
+    return 'Float'
+
+def _normalize_date(value):
+    # numpy parses naive ISO 8601 only, so UTC suffixes are dropped and other offsets converted
+    if value.endswith('Z'):
+        return value[:-1]
+    if value.endswith('+00:00'):
+        return value[:-6]
+    if len(value) > 19 and value[-6] in '+-':
+        return datetime.fromisoformat(value).astimezone(timezone.utc).replace(tzinfo=None).isoformat()
+    return value
+
+def to_datetime64(value):
+    """
+    Parse a DateTime as Dgraph prints it (RFC 3339, with a fraction of any length and 'Z' or an offset)
+    into UTC datetime64[ms], so that values compare by time rather than as strings.
+    """
+    return np.datetime64(_normalize_date(value), 'ms')
+
+class StringDictionary:
+    """
+    Maps strings to dense int32 codes, in order of first appearance.
+    """
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def to_numpy(self):
+        return np.array(self.values, dtype=str) if self.values else np.array([], dtype=str)
+
+class _Column:
+    def __init__(self, field_type, rows):
+        self.type = field_type
+        if field_type == 'Float':
+            self.data = array('d', [float('nan')]) * rows
+        elif field_type == 'Int':
+            self.data = array('q', [0]) * rows
+            # The rows before the column's first value are nulls too
+            self.nulls = list(range(rows))
+        elif field_type == 'DateTime':
+            self.data = ['NaT'] * rows
+        else:
+            self.data = array('i', [-1]) * rows
+
+class _TableBuilder:
+    def __init__(self, dictionaries):
+        self.dictionaries = dictionaries
+        self.rows = 0
+        self.columns = {}
+        self.lists = {}
+
+    def append(self, record):
+        self._flatten(record, '')
+        self.rows += 1
+        # Columns or lists missing from this record are padded with nulls
+        for name, column in self.columns.items():
+            if len(column.data) < self.rows:
+                self._append_null(name, column)
+        for offsets, child in self.lists.values():
+            if len(offsets) <= self.rows:
+                offsets.append(child.rows)
+
+    def _flatten(self, record, prefix):
+        for key, value in record.items():
+            name = prefix + key
+            if isinstance(value, dict):
+                self._flatten(value, name + '.')
+            elif isinstance(value, list):
+                entry = self.lists.get(name)
+                if entry is None:
+                    entry = self.lists[name] = (array('q', [0]) * (self.rows + 1), _TableBuilder(self.dictionaries))
+                offsets, child = entry
+                for item in value:
+                    child.append(item if isinstance(item, dict) else {'value': item})
+                offsets.append(child.rows)
+            elif value is not None:
+                column = self.columns.get(name)
+                if column is None:
+                    column = self.columns[name] = _Column(_field_type(name, value), self.rows)
+                if column.type == 'Float':
+                    column.data.append(float(value))
+                elif column.type == 'Int':
+                    column.data.append(int(value))
+                elif column.type == 'DateTime':
+                    column.data.append(_normalize_date(value))
+                else:
+                    column.data.append(self._dictionary(name).encode(value if isinstance(value, str) else str(value)))
+
+    def _append_null(self, name, column):
+        if column.type == 'Float':
+            column.data.append(float('nan'))
+        elif column.type == 'Int':
+            column.nulls.append(len(column.data))
+            column.data.append(0)
+        elif column.type == 'DateTime':
+            column.data.append('NaT')
+        else:
+            column.data.append(-1)
+
+    def _dictionary(self, name):
+        # One dictionary per field name, shared by every table of the result
+        base = name.rsplit('.', 1)[-1]
+        dictionary = self.dictionaries.get(base)
+        if dictionary is None:
+            dictionary = self.dictionaries[base] = StringDictionary()
+        return dictionary
+
+    def build(self, dictionaries):
+        columns = {}
+        encoded = {}
+        for name, column in self.columns.items():
+            if column.type == 'Float':
+                columns[name] = np.frombuffer(column.data, dtype=np.float64).copy()
+            elif column.type == 'Int':
+                values = np.frombuffer(column.data, dtype=np.int64).copy()
+                if column.nulls:
+                    # Integer columns with missing values are widened to float64 so they can hold NaN
+                    values = values.astype(np.float64)
+                    values[column.nulls] = np.nan
+                columns[name] = values
+            elif column.type == 'DateTime':
+                columns[name] = np.array(column.data, dtype='datetime64[ms]')
+            else:
+                columns[name] = np.frombuffer(column.data, dtype=np.int32).copy()
+                encoded[name] = dictionaries[name.rsplit('.', 1)[-1]]
+        lists = {name: (np.frombuffer(offsets, dtype=np.int64).copy(), child.build(dictionaries))
+                 for name, (offsets, child) in self.lists.items()}
+        return ColumnarTable(self.rows, columns, encoded, lists)
+
+class ColumnarTable:
+    """
+    A table of typed NumPy columns.
+
+    - `columns[name]`: float64, int64, datetime64[ms] or, for strings, int32 dictionary codes (-1 is null).
+    - `dictionaries[name]`: for each string column, the NumPy array its codes index into.
+    - `lists[name]`: for each nested list, (offsets, child table); the items of row i are
+      child rows offsets[i]:offsets[i + 1].
+    """
+    def __init__(self, length, columns, dictionaries, lists):
+        self.length = length
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.lists = lists
+
+    def __len__(self):
+        return self.length
+
+    def column(self, name):
+        """
+        Return a column as stored: values, or codes for string columns.
+        """
+        return self.columns[name]
+
+    def decode(self, name):
+        """
+        Return a string column as its values, with None for nulls.
+        """
+        codes = self.columns[name]
+        values = self.dictionaries[name][np.maximum(codes, 0)].astype(object) if len(codes) else np.array([], dtype=object)
+        values[codes < 0] = None
+        return values
+
+    def offsets(self, name):
+        """
+        Return the CSR offsets of a nested list, e.g. 'products'.
+        """
+        return self.lists[name][0]
+
+    def child(self, name):
+        """
+        Return the child table of a nested list, e.g. 'products'.
+        """
+        return self.lists[name][1]
+
+    def parent_index(self, name):
+        """
+        Return, for each row of a child table, the index of the row it belongs to.
+        """
+        offsets = self.lists[name][0]
+        return np.repeat(np.arange(self.length, dtype=np.int64), np.diff(offsets))
+
+    @property
+    def nbytes(self):
+        """
+        Memory held by the arrays of the table, its dictionaries and its child tables.
+        """
+        total = sum(column.nbytes for column in self.columns.values())
+        total += sum(dictionary.nbytes for dictionary in {id(d): d for d in self.dictionaries.values()}.values())
+        return total + sum(offsets.nbytes + child.nbytes for offsets, child in self.lists.values())
+
+    def to_arrow(self):
+        """
+        Convert the table to a pyarrow.Table. String columns become dictionary arrays and
+        nested lists become list<struct> columns (list<dictionary> for single-field items).
+
+        :raises ImportError: If pyarrow is not installed.
+        """
+        if pa is None:
+            raise ImportError("pyarrow is required for Arrow output: pip install pyarrow")
+        return pa.table(self._arrow_arrays())
+
+    def _arrow_arrays(self):
+        arrays = {}
+        for name, values in self.columns.items():
+            if name in self.dictionaries:
+                arrays[name] = pa.DictionaryArray.from_arrays(
+                    pa.array(values, mask=values < 0), pa.array(self.dictionaries[name], type=pa.string()))
+            elif values.dtype.kind == 'M':
+                arrays[name] = pa.array(values, mask=np.isnat(values), type=pa.timestamp('ms', tz='UTC'))
+            else:
+                arrays[name] = pa.array(values, from_pandas=True)
+        for name, (offsets, child) in self.lists.items():
+            child_arrays = child._arrow_arrays()
+            if len(child_arrays) == 1:
+                items = next(iter(child_arrays.values()))
+            else:
+                items = pa.StructArray.from_arrays(list(child_arrays.values()), list(child_arrays))
+            list_type = pa.ListArray if offsets[-1] < 2 ** 31 else pa.LargeListArray
+            arrays[name] = list_type.from_arrays(pa.array(offsets, type=pa.int32() if list_type is pa.ListArray else pa.int64()), items)
+        return arrays
+
+def to_columnar(records):
+    """
+    Flatten records (e.g. the elements of `data.queryOrder`) into a ColumnarTable.
+    Records are consumed one at a time, so a streamed result is never held as nested dicts.
+
+    :param records: An iterable of records.
+    :return: A ColumnarTable.
+    """
+    dictionaries = {}
+    builder = _TableBuilder(dictionaries)
+    for record in records:
+        builder.append(record)
+    return builder.build({name: dictionary.to_numpy() for name, dictionary in dictionaries.items()})
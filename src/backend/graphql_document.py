@@ -0,0 +1,340 @@
+# A small GraphQL document parser and renderer.
+# It understands the subset of GraphQL used by this project: operations,
+# variable definitions, fields with aliases, arguments and directives.
+# Fragments are not supported.
+
+import re
+import json
+
+_TOKEN_RE = re.compile(r'''
+    (?P<ignored>[\s,]+|\#[^\n]*)
+  | (?P<block_string>"""(?:[^"\\]|\\.|"(?!""))*""")
+  | (?P<string>"(?:[^"\\\n]|\\.)*")
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<name>[_A-Za-z][_0-9A-Za-z]*)
+  | (?P<spread>\.\.\.)
+  | (?P<punct>[!$():=@\[\]{}|&])
+''', re.VERBOSE)
+
+_LITERALS = {'true': True, 'false': False, 'null': None}
+
+class GraphQLError(Exception):
+    """
+    Raised when a response carries GraphQL errors and cannot be returned as-is,
+    e.g. in the middle of a streamed result.
+    """
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(error.get('message', str(error)) for error in errors))
+
+class Variable:
+    """
+    A reference to an operation variable, e.g. `$memberId`.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, Variable) and other.name == self.name
+
+    def __repr__(self):
+        return 'Variable(%r)' % self.name
+
+class EnumValue:
+    """
+    An enum literal, e.g. the `total` in `order: {asc: total}`.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, EnumValue) and other.name == self.name
+
+    def __repr__(self):
+        return 'EnumValue(%r)' % self.name
+
+class Field:
+    """
+    A field selection with its alias, arguments, directives and sub-selections.
+    """
+    def __init__(self, name, alias=None, arguments=None, directives=None, selections=None):
+        self.name = name
+        self.alias = alias
+        self.arguments = arguments or {}
+        self.directives = directives or []
+        self.selections = selections
+
+    @property
+    def response_key(self):
+        """
+        The key under which this field appears in the response.
+        """
+        return self.alias or self.name
+
+    def signature(self):
+        """
+        Return a string identifying the field up to its alias and sub-selections.
+        Two fields with the same signature fetch the same data.
+        """
+        return self.name + render_arguments(self.arguments) + render_directives(self.directives)
+
+    def __repr__(self):
+        return 'Field(%r)' % self.response_key
+
+class Operation:
+    """
+    A query, mutation or subscription operation.
+    """
+    def __init__(self, kind='query', name=None, variable_definitions=None, selections=None):
+        self.kind = kind
+        self.name = name
+        self.variable_definitions = variable_definitions or []
+        self.selections = selections or []
+
+class Document:
+    """
+    A parsed GraphQL document.
+    """
+    def __init__(self, operations):
+        self.operations = operations
+
+    def operation(self, name=None):
+        """
+        Return the operation with the given name, or the only operation when name is None.
+        """
+        if name is None:
+            if len(self.operations) != 1:
+                raise ValueError("Document contains %d operations, an operation name is required" % len(self.operations))
+            return self.operations[0]
+        for operation in self.operations:
+            if operation.name == name:
+                return operation
+        raise ValueError("Unknown operation: %s" % name)
+
+class _Parser:
+    def __init__(self, source):
+        self.tokens = []
+        position = 0
+        while position < len(source):
+            match = _TOKEN_RE.match(source, position)
+            if match is None:
+                raise ValueError("Unexpected character %r at position %d" % (source[position], position))
+            position = match.end()
+            if match.lastgroup != 'ignored':
+                self.tokens.append((match.lastgroup, match.group()))
+        self.index = 0
+
+    def peek(self, value=None):
+        if self.index >= len(self.tokens):
+            return None if value is None else False
+        token = self.tokens[self.index]
+        return token if value is None else token[1] == value
+
+    def next(self):
+        if self.index >= len(self.tokens):
+            raise ValueError("Unexpected end of document")
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def expect(self, value):
+        kind, text = self.next()
+        if text != value:
+            raise ValueError("Expected %r but found %r" % (value, text))
+
+    def name(self):
+        kind, text = self.next()
+        if kind != 'name':
+            raise ValueError("Expected a name but found %r" % text)
+        return text
+
+    def document(self):
+        operations = []
+        while self.peek() is not None:
+            operations.append(self.operation())
+        return Document(operations)
+
+    def operation(self):
+        if self.peek('{'):
+            return Operation('query', selections=self.selection_set())
+        kind = self.name()
+        if kind not in ('query', 'mutation', 'subscription'):
+            raise ValueError("Unsupported definition: %s" % kind)
+        name = None
+        if self.peek() and self.peek()[0] == 'name':
+            name = self.name()
+        variable_definitions = []
+        if self.peek('('):
+            self.next()
+            while not self.peek(')'):
+                self.expect('$')
+                variable_name = self.name()
+                self.expect(':')
+                variable_type = self.type_reference()
+                default = None
+                if self.peek('='):
+                    self.next()
+                    default = self.value()
+                variable_definitions.append((variable_name, variable_type, default))
+            self.next()
+        self.directives()
+        return Operation(kind, name, variable_definitions, self.selection_set())
+
+    def type_reference(self):
+        if self.peek('['):
+            self.next()
+            inner = self.type_reference()
+            self.expect(']')
+            text = '[%s]' % inner
+        else:
+            text = self.name()
+        if self.peek('!'):
+            self.next()
+            text += '!'
+        return text
+
+    def selection_set(self):
+        self.expect('{')
+        selections = []
+        while not self.peek('}'):
+            if self.peek('...'):
+                raise ValueError("Fragments are not supported")
+            selections.append(self.field())
+        self.next()
+        return selections
+
+    def field(self):
+        alias, name = None, self.name()
+        if self.peek(':'):
+            self.next()
+            alias, name = name, self.name()
+        arguments = self.arguments()
+        directives = self.directives()
+        selections = self.selection_set() if self.peek('{') else None
+        return Field(name, alias, arguments, directives, selections)
+
+    def arguments(self):
+        arguments = {}
+        if self.peek('('):
+            self.next()
+            while not self.peek(')'):
+                name = self.name()
+                self.expect(':')
+                arguments[name] = self.value()
+            self.next()
+        return arguments
+
+    def directives(self):
+        directives = []
+        while self.peek('@'):
+            self.next()
+            directives.append((self.name(), self.arguments()))
+        return directives
+
+    def value(self):
+        kind, text = self.next()
+        if text == '$':
+            return Variable(self.name())
+        if kind == 'string':
+            return json.loads(text)
+        if kind == 'block_string':
+            return text[3:-3].replace('\\"""', '"""')
+        if kind == 'number':
+            return float(text) if any(c in text for c in '.eE') else int(text)
+        if text == '[':
+            values = []
+            while not self.peek(']'):
+                values.append(self.value())
+            self.next()
+            return values
+        if text == '{':
+            values = {}
+            while not self.peek('}'):
+                name = self.name()
+                self.expect(':')
+                values[name] = self.value()
+            self.next()
+            return values
+        if kind == 'name':
+            if text in _LITERALS:
+                return _LITERALS[text]
+            return EnumValue(text)
+        raise ValueError("Unexpected token %r" % text)
+
+def parse(source):
+    """
+    Parse a GraphQL document.
+
+    :param source: The GraphQL document string.
+    :return: A Document.
+    :raises ValueError: If the document is malformed or uses unsupported syntax.
+    """
+    return _Parser(source).document()
+
+def render_value(value):
+    """
+    Render an argument value as GraphQL source.
+    """
+    if isinstance(value, Variable):
+        return '$' + value.name
+    if isinstance(value, EnumValue):
+        return value.name
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float, str)):
+        return json.dumps(value)
+    if isinstance(value, list):
+        return '[%s]' % ', '.join(render_value(item) for item in value)
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join('%s: %s' % (key, render_value(item)) for key, item in value.items())
+    raise TypeError("Cannot render value of type %s" % type(value).__name__)
+
+def render_arguments(arguments):
+    """
+    Render a field's arguments, e.g. `(first: 10, offset: 20)`.
+    """
+    if not arguments:
+        return ''
+    return '(%s)' % ', '.join('%s: %s' % (name, render_value(value)) for name, value in arguments.items())
+
+def render_directives(directives):
+    """
+    Render a field's directives, e.g. ` @include(if: $flag)`.
+    """
+    return ''.join(' @%s%s' % (name, render_arguments(arguments)) for name, arguments in directives)
+
+def render_selections(selections, indent=1):
+    """
+    Render a selection set, including its surrounding braces.
+    """
+    padding = '  ' * indent
+    lines = ['{']
+    for field in selections:
+        line = padding
+        if field.alias:
+            line += field.alias + ': '
+        line += field.signature()
+        if field.selections is not None:
+            line += ' ' + render_selections(field.selections, indent + 1)
+        lines.append(line)
+    lines.append('  ' * (indent - 1) + '}')
+    return '\n'.join(lines)
+
+def render_operation(operation):
+    """
+    Render an operation as a GraphQL document string.
+    """
+    header = operation.kind
+    if operation.name:
+        header += ' ' + operation.name
+    if operation.variable_definitions:
+        definitions = []
+        for name, variable_type, default in operation.variable_definitions:
+            definition = '$%s: %s' % (name, variable_type)
+            if default is not None:
+                definition += ' = ' + render_value(default)
+            definitions.append(definition)
+        header += '(%s)' % ', '.join(definitions)
+    return header + ' ' + render_selections(operation.selections)
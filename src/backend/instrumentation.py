@@ -0,0 +1,382 @@
+# Per-operation instrumentation for DgraphClient.
+# When a client is given an Instrumentation, every query and mutation,
+# streamed or not, is timed phase by phase (DNS, connect, time to first
+# byte, download, JSON parse), its request and response sizes and errors are
+# recorded, and the resulting QueryTiming is passed to every registered hook. Two hooks are
+# provided: a Prometheus text exporter and an OpenTelemetry-style span
+# callback. Clients without an Instrumentation take the plain code path.
+
+import time
+import socket
+import threading
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.util import connection as connection_util
+
+from graphql_document import parse
+
+PHASES = ('dns', 'connect', 'ttfb', 'download', 'parse')
+
+# The QueryTiming of the request in flight on each thread, filled in by the timed connections
+_active = threading.local()
+
+@lru_cache(maxsize=1024)
+def describe_operation(document):
+    """
+    Return (operation type, operation name) for a GraphQL document.
+    Anonymous operations are named after their first root field, e.g. ('query', 'queryMember').
+    """
+    try:
+        operation = parse(document).operations[0]
+    except (ValueError, IndexError):
+        return 'unknown', 'unknown'
+    if operation.name:
+        return operation.kind, operation.name
+    return operation.kind, operation.selections[0].name if operation.selections else 'anonymous'
+
+class QueryTiming:
+    """
+    The measurements of one GraphQL operation.
+    """
+    def __init__(self, operation_type, operation_name):
+        self.operation_type = operation_type
+        self.operation_name = operation_name
+        self.start_time = time.time()
+        self.duration = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.status_code = None
+        self.errors = 0
+        self.error_type = None
+        self.cache_hit = False
+
+    def to_span(self):
+        """
+        Return the timing as an OpenTelemetry-style span dict.
+        """
+        attributes = {
+            'graphql.operation.type': self.operation_type,
+            'graphql.operation.name': self.operation_name,
+            'http.request.body.size': self.request_bytes,
+            'http.response.body.size': self.response_bytes,
+            'dgraph.cache_hit': self.cache_hit,
+            'dgraph.errors': self.errors,
+        }
+        if self.status_code is not None:
+            attributes['http.response.status_code'] = self.status_code
+        if self.error_type is not None:
+            attributes['error.type'] = self.error_type
+        for phase, seconds in self.phases.items():
+            attributes['dgraph.phase.%s_seconds' % phase] = seconds
+        start = int(self.start_time * 1e9)
+        return {
+            'name': '%s %s' % (self.operation_type, self.operation_name),
+            'kind': 'CLIENT',
+            'start_time_unix_nano': start,
+            'end_time_unix_nano': start + int(self.duration * 1e9),
+            'attributes': attributes,
+            'status': {'code': 'ERROR' if self.errors else 'OK'},
+        }
+
+class Instrumentation:
+    """
+    Times the operations of the DgraphClients it is given to, and passes each QueryTiming to its hooks.
+    A hook is any callable taking a QueryTiming, e.g. a PrometheusExporter or a SpanCallback.
+    """
+    def __init__(self, *hooks):
+        """
+        Initialize the Instrumentation.
+
+        :param hooks: Callables called with the QueryTiming of every operation.
+        """
+        self.hooks = list(hooks)
+
+    def add_hook(self, hook):
+        """
+        Register another hook.
+        """
+        self.hooks.append(hook)
+
+    def emit(self, timing):
+        """
+        Pass a finished QueryTiming to every hook.
+        """
+        for hook in self.hooks:
+            hook(timing)
+
+    def record_cache_hit(self, document):
+        """
+        Record an operation answered from the client's result cache.
+        """
+        timing = QueryTiming(*describe_operation(document))
+        timing.cache_hit = True
+        self.emit(timing)
+
+    def post(self, transport, url, document, variables=None, timeout=None):
+        """
+        Send an operation through an HttpTransport, timing each phase.
+
+        :return: The decoded JSON response.
+        """
+        timing = QueryTiming(*describe_operation(document))
+        started = time.perf_counter()
+        _active.timing = timing
+        try:
+            with transport.post(url, {'query': document, 'variables': variables}, timeout=timeout, stream=True) as response:
+                headers_received = self._headers_received(timing, response, started)
+                content = response.content
+                downloaded = time.perf_counter()
+                timing.response_bytes = len(content)
+                timing.phases['download'] = downloaded - headers_received
+                result = response.json()
+                timing.phases['parse'] = time.perf_counter() - downloaded
+            errors = result.get('errors') if isinstance(result, dict) else None
+            if errors:
+                timing.errors = len(errors)
+            elif response.status_code >= 400:
+                timing.errors = 1
+            return result
+        except Exception as e:
+            timing.errors += 1
+            timing.error_type = type(e).__name__
+            raise
+        finally:
+            _active.timing = None
+            timing.duration = time.perf_counter() - started
+            self.emit(timing)
+
+    def stream(self, transport, url, document, variables=None, timeout=None, chunk_size=65536):
+        """
+        Send an operation through an HttpTransport and yield its response body chunk by chunk, timing each phase.
+        Reading the body counts as download, the time the caller spends on the chunks in between as parse.
+        The timing is emitted once the body is exhausted, or when the caller closes the generator early.
+
+        :return: A generator of bytes.
+        """
+        timing = QueryTiming(*describe_operation(document))
+        started = time.perf_counter()
+        headers_received = None
+        _active.timing = timing
+        try:
+            with transport.post(url, {'query': document, 'variables': variables}, timeout=timeout, stream=True) as response:
+                headers_received = self._headers_received(timing, response, started)
+                if response.status_code >= 400:
+                    timing.errors = 1
+                chunks = response.iter_content(chunk_size)
+                while True:
+                    reading = time.perf_counter()
+                    chunk = next(chunks, None)
+                    timing.phases['download'] += time.perf_counter() - reading
+                    if chunk is None:
+                        break
+                    timing.response_bytes += len(chunk)
+                    yield chunk
+        except Exception as e:
+            timing.errors += 1
+            timing.error_type = type(e).__name__
+            raise
+        finally:
+            _active.timing = None
+            timing.duration = time.perf_counter() - started
+            if headers_received is not None:
+                timing.phases['parse'] = time.perf_counter() - headers_received - timing.phases['download']
+            self.emit(timing)
+
+    @staticmethod
+    def _headers_received(timing, response, started):
+        headers_received = time.perf_counter()
+        _active.timing = None
+        timing.status_code = response.status_code
+        timing.request_bytes = len(response.request.body or b'')
+        # Connections are set up before the request is sent, so what remains until the headers is the TTFB
+        timing.phases['ttfb'] = headers_received - started - timing.phases['dns'] - timing.phases['connect']
+        return headers_received
+
+_create_connection = connection_util.create_connection
+
+def _timed_create_connection(address, *args, **kwargs):
+    """
+    urllib3's create_connection, recording name resolution into the active QueryTiming.
+    The host is resolved once here and each address is connected to, so it is not resolved again.
+    """
+    timing = getattr(_active, 'timing', None)
+    if timing is None:
+        return _create_connection(address, *args, **kwargs)
+    host, port = address
+    started = time.perf_counter()
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)]
+    except socket.gaierror:
+        # Let urllib3 resolve again and raise its own error
+        addresses = [host]
+    timing.phases['dns'] += time.perf_counter() - started
+    for index, resolved in enumerate(addresses):
+        try:
+            return _create_connection((resolved, port), *args, **kwargs)
+        except OSError:
+            if index == len(addresses) - 1:
+                raise
+
+class _TimedConnectionMixin:
+    """
+    Records connection set-up (including TLS) into the active QueryTiming, minus the name resolution within it.
+    """
+    def connect(self):
+        timing = getattr(_active, 'timing', None)
+        if timing is None:
+            return super().connect()
+        dns = timing.phases['dns']
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            timing.phases['connect'] += time.perf_counter() - started - (timing.phases['dns'] - dns)
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+class TimingHTTPAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter whose connections report DNS and connect times to the active QueryTiming.
+    Without an active timing the connections behave exactly like the default ones.
+    HttpTransport only mounts it once an instrumented DgraphClient uses the transport.
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        # urllib3 looks create_connection up on its module at every call, so resolution can be timed around it
+        connection_util.create_connection = _timed_create_connection
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool, 'https': _TimedHTTPSConnectionPool}
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class PrometheusExporter:
+    """
+    A hook aggregating QueryTimings into Prometheus metrics, labelled by operation name and type.
+    """
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, namespace='dgraph_client', buckets=BUCKETS):
+        """
+        Initialize the PrometheusExporter.
+
+        :param namespace: Prefix of every metric name.
+        :param buckets: Upper bounds in seconds of the request duration histogram buckets.
+        """
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, timing):
+        key = (timing.operation_name, timing.operation_type)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {
+                    'requests': 0, 'errors': 0, 'cache_hits': 0, 'request_bytes': 0, 'response_bytes': 0,
+                    'duration_sum': 0.0, 'buckets': [0] * len(self.buckets), 'phases': dict.fromkeys(PHASES, 0.0),
+                }
+            series['requests'] += 1
+            series['errors'] += timing.errors
+            series['cache_hits'] += timing.cache_hit
+            series['request_bytes'] += timing.request_bytes
+            series['response_bytes'] += timing.response_bytes
+            series['duration_sum'] += timing.duration
+            for index, bound in enumerate(self.buckets):
+                if timing.duration <= bound:
+                    series['buckets'][index] += 1
+            for phase, seconds in timing.phases.items():
+                series['phases'][phase] += seconds
+
+    def render(self):
+        """
+        Return every metric in the Prometheus text exposition format.
+        """
+        prefix = self.namespace
+        with self.lock:
+            series = sorted(self.series.items())
+            lines = []
+            for name, kind, help_text, field in [
+                ('requests_total', 'counter', 'GraphQL operations sent, including cache hits.', 'requests'),
+                ('errors_total', 'counter', 'GraphQL and transport errors.', 'errors'),
+                ('cache_hits_total', 'counter', 'Operations answered from the result cache.', 'cache_hits'),
+                ('request_bytes_total', 'counter', 'Request body bytes sent.', 'request_bytes'),
+                ('response_bytes_total', 'counter', 'Response body bytes received.', 'response_bytes'),
+            ]:
+                lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+                lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+                for (operation, operation_type), values in series:
+                    lines.append('%s_%s{operation="%s",type="%s"} %s'
+                                 % (prefix, name, _escape(operation), _escape(operation_type), values[field]))
+            lines.append('# HELP %s_phase_seconds_total Time spent in each phase of the operations.' % prefix)
+            lines.append('# TYPE %s_phase_seconds_total counter' % prefix)
+            for (operation, operation_type), values in series:
+                for phase in PHASES:
+                    lines.append('%s_phase_seconds_total{operation="%s",type="%s",phase="%s"} %r'
+                                 % (prefix, _escape(operation), _escape(operation_type), phase, values['phases'][phase]))
+            lines.append('# HELP %s_request_duration_seconds Duration of the operations.' % prefix)
+            lines.append('# TYPE %s_request_duration_seconds histogram' % prefix)
+            for (operation, operation_type), values in series:
+                labels = 'operation="%s",type="%s"' % (_escape(operation), _escape(operation_type))
+                for bound, count in zip(self.buckets, values['buckets']):
+                    lines.append('%s_request_duration_seconds_bucket{%s,le="%r"} %d' % (prefix, labels, bound, count))
+                lines.append('%s_request_duration_seconds_bucket{%s,le="+Inf"} %d' % (prefix, labels, values['requests']))
+                lines.append('%s_request_duration_seconds_sum{%s} %r' % (prefix, labels, values['duration_sum']))
+                lines.append('%s_request_duration_seconds_count{%s} %d' % (prefix, labels, values['requests']))
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port=9464, host='127.0.0.1'):
+        """
+        Serve the metrics at http://host:port/metrics from a background thread.
+        Only local scrapers can reach them by default; pass e.g. host='0.0.0.0' to expose them on every interface.
+
+        :return: The HTTP server; call shutdown() on it to stop serving.
+        """
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+class SpanCallback:
+    """
+    A hook passing every operation as an OpenTelemetry-style span dict (see QueryTiming.to_span) to a callback.
+    With the OpenTelemetry SDK, the callback can replay it on a tracer, e.g.:
+
+        def export(span):
+            otel_span = tracer.start_span(span['name'], start_time=span['start_time_unix_nano'], attributes=span['attributes'])
+            otel_span.end(end_time=span['end_time_unix_nano'])
+    """
+    def __init__(self, callback):
+        self.callback = callback
+
+    def __call__(self, timing):
+        self.callback(timing.to_span())
@@ -0,0 +1,109 @@
+# Reorder points and safety stock for every product in one pass.
+# Daily demand per product comes from the `inventory_optimization` rows via
+# `demand_series`, reduced to a mean and variance per product. Lead-time
+# demand is treated as normal with mean d * L and variance L * var(d), plus
+# d^2 * var(L) when lead times vary, so safety stock is z * sigma and the
+# reorder point d * L + z * sigma, with z = Phi^-1(service level). Every
+# quantity is a NumPy expression that broadcasts, so one call can evaluate
+# a whole grid of lead times x service levels x products for what-if sweeps.
+# The schema records no stock levels, so turnover and stockouts are the
+# values expected under the policy, not measured history.
+#
+#     optimizer = InventoryOptimizer().fit(AnalysisAPI(client).to_columnar('inventory_optimization'))
+#     plan = optimizer.plan(service_level=0.95, lead_time=7)
+#     grid = optimizer.sweep(lead_times=[3, 7, 14], service_levels=[0.9, 0.95, 0.99])
+
+import numpy as np
+from scipy.stats import norm
+
+from forecasting import DemandSeries, demand_series
+
+class InventoryOptimizer:
+    """
+    A continuous-review (s, Q) policy per product: reorder `order_cycle` days of demand when stock falls to s.
+    """
+    def __init__(self, order_cycle=14, lead_time_std=0.0, days_per_year=365):
+        """
+        :param order_cycle: Days of average demand bought per replenishment order (Q = d * order_cycle).
+        :param lead_time_std: Standard deviation of the lead time, in days.
+        :param days_per_year: Days used to annualize demand for turnover and stockout rates.
+        """
+        self.order_cycle = order_cycle
+        self.lead_time_std = lead_time_std
+        self.days_per_year = days_per_year
+        self.product_ids = None
+
+    def fit(self, demand, window=None):
+        """
+        Estimate each product's daily demand mean and variance.
+
+        :param demand: A DemandSeries, a products x days array, or a ColumnarTable or `queryOrder`
+                       records with `date` and `products { productId }` (the `inventory_optimization` result).
+        :param window: Only use the last `window` days.
+        :return: self
+        """
+        if not isinstance(demand, (DemandSeries, np.ndarray)):
+            demand = demand_series(demand)
+        if isinstance(demand, DemandSeries):
+            self.product_ids, Y = demand.product_ids, demand.demand
+        else:
+            self.product_ids, Y = np.arange(len(demand)), demand.astype(np.float64)
+        if window is not None:
+            Y = Y[:, -window:]
+        self.days = Y.shape[1]
+        self.mean = Y.mean(axis=1)
+        self.variance = Y.var(axis=1, ddof=1) if self.days > 1 else np.zeros(len(Y))
+        return self
+
+    def plan(self, service_level=0.95, lead_time=7):
+        """
+        Compute the policy of every product. Arguments may be scalars or arrays that broadcast against
+        the products axis (the last one), e.g. per-product lead times or a grid from `sweep`.
+
+        :param service_level: Cycle service level: the probability of not running out before an order arrives.
+        :param lead_time: Replenishment lead time in days.
+        :return: A dict of arrays:
+                 - 'lead_time_demand', 'safety_stock', 'reorder_point' and 'order_quantity', in units;
+                 - 'average_inventory' (Q / 2 + safety stock) and 'turnover' (annual demand / average inventory);
+                 - 'stockout_probability' per order cycle, 'stockouts_per_year', 'expected_shortage'
+                   (units short per cycle) and 'fill_rate' (share of demand served from stock).
+        """
+        service_level = np.asarray(service_level, dtype=np.float64)
+        if ((service_level <= 0) | (service_level >= 1)).any():
+            raise ValueError("service_level must be between 0 and 1")
+        lead_time = np.asarray(lead_time, dtype=np.float64)
+        z = norm.ppf(service_level)
+        lead_time_demand = self.mean * lead_time
+        sigma = np.sqrt(lead_time * self.variance + self.mean ** 2 * self.lead_time_std ** 2)
+        safety_stock = z * sigma
+        order_quantity = self.mean * self.order_cycle
+        average_inventory = order_quantity / 2 + safety_stock
+        annual_demand = self.mean * self.days_per_year
+        # Units short per cycle: sigma times the standard normal loss function at z
+        expected_shortage = sigma * (norm.pdf(z) - z * norm.sf(z))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            turnover = np.where(average_inventory > 0, annual_demand / average_inventory, 0.0)
+            orders_per_year = np.where(order_quantity > 0, self.days_per_year / self.order_cycle, 0.0)
+            fill_rate = np.where(order_quantity > 0, 1 - expected_shortage / order_quantity, 1.0)
+        stockout_probability = np.broadcast_to(1 - service_level, safety_stock.shape)
+        return {
+            'lead_time_demand': np.broadcast_to(lead_time_demand, safety_stock.shape),
+            'safety_stock': safety_stock,
+            'reorder_point': lead_time_demand + safety_stock,
+            'order_quantity': np.broadcast_to(order_quantity, safety_stock.shape),
+            'average_inventory': average_inventory,
+            'turnover': turnover,
+            'stockout_probability': stockout_probability,
+            'stockouts_per_year': stockout_probability * orders_per_year,
+            'expected_shortage': expected_shortage,
+            'fill_rate': np.clip(fill_rate, 0, 1),
+        }
+
+    def sweep(self, lead_times, service_levels):
+        """
+        Evaluate every combination of lead time and service level at once.
+
+        :return: The `plan` dict with arrays of shape (lead times, service levels, products).
+        """
+        return self.plan(np.asarray(service_levels, dtype=np.float64)[None, :, None],
+                         np.asarray(lead_times, dtype=np.float64)[:, None, None])
@@ -0,0 +1,214 @@
+# Market basket analysis: frequent itemsets and association rules.
+# Orders are turned into a sparse order x product matrix. Item and pair
+# supports come from column sums and one sparse product X^T X; longer
+# itemsets are mined depth-first (Eclat) over bitsets, one uint64 word per
+# 64 orders, so extending a prefix by every candidate at once is a single
+# AND + popcount over a 2-D array. The search is split by first item across
+# threads; NumPy releases the GIL on these array operations.
+
+import math
+from itertools import combinations
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+from columnar import to_columnar
+
+if hasattr(np, 'bitwise_count'):
+    def _popcount(words):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+else:
+    _BYTE_COUNTS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _popcount(words):
+        return _BYTE_COUNTS[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+def basket_matrix(table, list_field='products', item_field='productId'):
+    """
+    Build the sparse order x product matrix of a columnar `queryOrder { products { productId } }` result.
+
+    :param table: A ColumnarTable, e.g. from AnalysisAPI.to_columnar('market_basket_analysis').
+    :param list_field: The nested list holding the items of each order.
+    :param item_field: The id field of the items.
+    :return: (matrix, items): a CSR matrix with a 1 where an order contains a product,
+             and the product ids of its columns.
+    """
+    child = table.child(list_field)
+    codes = child.column(item_field)
+    items = child.dictionaries[item_field]
+    rows = table.parent_index(list_field)
+    present = codes >= 0
+    matrix = sparse.csr_matrix((np.ones(int(present.sum()), dtype=np.int32), (rows[present], codes[present])),
+                               shape=(len(table), len(items)))
+    # A product listed twice in an order still counts once
+    matrix.data[:] = 1
+    return matrix, items
+
+class AssociationRule:
+    """
+    A rule antecedent -> consequent with its support, confidence and lift.
+    """
+    def __init__(self, antecedent, consequent, count, support, confidence, lift):
+        self.antecedent = antecedent
+        self.consequent = consequent
+        self.count = count
+        self.support = support
+        self.confidence = confidence
+        self.lift = lift
+
+    def to_dict(self):
+        return {'antecedent': list(self.antecedent), 'consequent': list(self.consequent), 'count': self.count,
+                'support': self.support, 'confidence': self.confidence, 'lift': self.lift}
+
+    def __repr__(self):
+        return "AssociationRule(%s -> %s, support=%.4f, confidence=%.4f, lift=%.3f)" % (
+            list(self.antecedent), list(self.consequent), self.support, self.confidence, self.lift)
+
+class MarketBasketEngine:
+    """
+    Mines frequent itemsets and association rules from order baskets.
+    """
+    def __init__(self, min_support=0.01, min_confidence=0.5, max_length=3, workers=None):
+        """
+        :param min_support: Minimum fraction of orders an itemset must appear in.
+        :param min_confidence: Minimum confidence of the rules returned by `rules`.
+        :param max_length: Largest itemset size mined.
+        :param workers: Threads the search is split across (default: ThreadPoolExecutor's default).
+        """
+        self.min_support = min_support
+        self.min_confidence = min_confidence
+        self.max_length = max_length
+        self.workers = workers
+        self.items = None
+        self.orders = 0
+        self.itemsets = {}
+
+    def fit_table(self, table, list_field='products', item_field='productId'):
+        """
+        Mine a columnar result, e.g. AnalysisAPI.to_columnar('market_basket_analysis').
+        """
+        return self.fit(*basket_matrix(table, list_field, item_field))
+
+    def fit_records(self, records):
+        """
+        Mine `queryOrder` records as returned by AnalysisAPI.market_basket_analysis.
+        """
+        return self.fit_table(to_columnar(records))
+
+    def fit(self, matrix, items):
+        """
+        Mine the frequent itemsets of a 0/1 order x product matrix.
+
+        :param matrix: A sparse matrix with one row per order and one column per product.
+        :param items: The product ids of the columns.
+        :return: self
+        """
+        matrix = sparse.csc_matrix(matrix, dtype=np.int32)
+        matrix.eliminate_zeros()
+        matrix.data[:] = 1
+        self.items = np.asarray(items)
+        self.orders = matrix.shape[0]
+        self.min_count = max(1, math.ceil(self.min_support * self.orders))
+        self.itemsets = {}
+
+        counts = np.diff(matrix.indptr)
+        # Frequent items, least frequent first so the deepest searches run on the smallest tidsets
+        frequent = np.flatnonzero(counts >= self.min_count)
+        frequent = frequent[np.argsort(counts[frequent], kind='stable')]
+        for item in frequent:
+            self.itemsets[(int(item),)] = int(counts[item])
+        if self.max_length < 2 or len(frequent) < 2:
+            return self
+
+        columns = matrix[:, frequent]
+        columns.sort_indices()
+        # Co-occurrence counts of every pair of frequent items, kept sparse for large catalogs
+        pairs = sparse.triu(columns.T @ columns, k=1, format='csr')
+        bits = self._bitsets(columns) if self.max_length > 2 else None
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for found in executor.map(lambda first: self._mine_from(first, frequent, pairs, bits), range(len(frequent))):
+                self.itemsets.update(found)
+        return self
+
+    def _key(self, frequent, positions):
+        return tuple(sorted(int(frequent[p]) for p in positions))
+
+    def _bitsets(self, columns):
+        # Row r of column j sets bit r % 64 of word r // 64; rows of a CSC column are sorted and
+        # distinct, so summing the bits of each word equals OR-ing them.
+        words = (self.orders + 63) // 64
+        rows = columns.indices.astype(np.int64)
+        cols = np.repeat(np.arange(columns.shape[1], dtype=np.int64), np.diff(columns.indptr))
+        keys = cols * words + (rows >> 6)
+        values = np.left_shift(np.uint64(1), (rows & 63).astype(np.uint64))
+        bits = np.zeros(columns.shape[1] * words, dtype=np.uint64)
+        if len(keys):
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            bits[keys[starts]] = np.add.reduceat(values, starts)
+        return bits.reshape(columns.shape[1], words)
+
+    def _mine_from(self, first, frequent, pairs, bits):
+        found = {}
+        row = slice(pairs.indptr[first], pairs.indptr[first + 1])
+        frequent_pairs = pairs.data[row] >= self.min_count
+        partners = pairs.indices[row][frequent_pairs]
+        order = np.argsort(partners)
+        partners = partners[order]
+        for second, count in zip(partners, pairs.data[row][frequent_pairs][order]):
+            found[self._key(frequent, (first, second))] = int(count)
+        if bits is not None and len(partners) > 1:
+            # Eclat: the tidsets of {first, x} for every frequent partner x, extended depth-first
+            self._extend((first,), bits[partners] & bits[first], partners, frequent, found)
+        return found
+
+    def _extend(self, prefix, tidsets, candidates, frequent, found):
+        for position in range(len(candidates) - 1):
+            itemset = prefix + (candidates[position],)
+            if len(itemset) >= self.max_length:
+                return
+            joined = tidsets[position + 1:] & tidsets[position]
+            counts = _popcount(joined)
+            keep = np.flatnonzero(counts >= self.min_count)
+            for index in keep:
+                found[self._key(frequent, itemset + (candidates[position + 1 + index],))] = int(counts[index])
+            if len(keep) > 1:
+                self._extend(itemset, joined[keep], candidates[position + 1:][keep], frequent, found)
+
+    def frequent_itemsets(self, min_length=1):
+        """
+        Return the frequent itemsets, most frequent first.
+
+        :param min_length: Smallest itemset size returned.
+        :return: A list of (product ids, count, support).
+        """
+        result = [(tuple(self.items[list(itemset)].tolist()), count, count / self.orders)
+                  for itemset, count in self.itemsets.items() if len(itemset) >= min_length]
+        return sorted(result, key=lambda entry: (-entry[1], entry[0]))
+
+    def rules(self, min_confidence=None, min_lift=None, limit=None):
+        """
+        Derive association rules from the frequent itemsets, ranked by lift, then confidence and support.
+
+        :param min_confidence: Overrides the engine's minimum confidence.
+        :param min_lift: Optional minimum lift, e.g. 1.0 to keep only positively associated rules.
+        :param limit: Optional maximum number of rules returned.
+        :return: A list of AssociationRule.
+        """
+        min_confidence = self.min_confidence if min_confidence is None else min_confidence
+        rules = []
+        for itemset, count in self.itemsets.items():
+            for size in range(1, len(itemset)):
+                for antecedent in combinations(itemset, size):
+                    confidence = count / self.itemsets[antecedent]
+                    if confidence < min_confidence:
+                        continue
+                    consequent = tuple(item for item in itemset if item not in antecedent)
+                    lift = confidence * self.orders / self.itemsets[consequent]
+                    if min_lift is not None and lift < min_lift:
+                        continue
+                    rules.append(AssociationRule(tuple(self.items[list(antecedent)].tolist()),
+                                                 tuple(self.items[list(consequent)].tolist()),
+                                                 count, count / self.orders, confidence, lift))
+        rules.sort(key=lambda rule: (-rule.lift, -rule.confidence, -rule.support, rule.antecedent, rule.consequent))
+        return rules[:limit] if limit is not None else rules
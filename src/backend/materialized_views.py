@@ -0,0 +1,277 @@
+# Materialized views kept up to date from GraphQL subscriptions.
+# A view is seeded once with a full query and then maintained from the
+# subscription feed. Dgraph re-sends the complete result of a subscription
+# whenever it changes, so each snapshot is diffed against the previous one
+# by @id and only the added, changed or removed records are folded into the
+# view's aggregates. Reads are served from memory in O(1).
+
+import json
+import time
+import asyncio
+from collections import Counter, defaultdict
+
+class MaterializedView:
+    """
+    Base class for a view over one query* collection.
+    Subclasses define the selection to fetch and how a record adds to or subtracts from the state.
+    """
+    root_field = None
+    id_field = None
+    selection = None
+
+    def __init__(self, clock=time.time):
+        """
+        Initialize an empty, not yet seeded view.
+
+        :param clock: A function returning the current time in seconds.
+        """
+        self.clock = clock
+        self.records = {}
+        self.last_updated = None
+        self.updates_applied = 0
+        self.reset()
+
+    @property
+    def query(self):
+        """
+        The GraphQL query used to seed the view.
+        """
+        return "query { %s %s }" % (self.root_field, self.selection)
+
+    @property
+    def subscription(self):
+        """
+        The GraphQL subscription used to maintain the view.
+        """
+        return "subscription { %s %s }" % (self.root_field, self.selection)
+
+    def add(self, record):
+        """
+        Fold a record into the state.
+        """
+        raise NotImplementedError
+
+    def remove(self, record):
+        """
+        Take a record back out of the state.
+        """
+        raise NotImplementedError
+
+    def seed(self, records):
+        """
+        Replace the view's contents with a full result set.
+        """
+        self.reset()
+        self.records = {}
+        for record in records:
+            self.records[record[self.id_field]] = record
+            self.add(record)
+        self._touch()
+
+    def reset(self):
+        """
+        Clear the aggregated state before seeding.
+        """
+        raise NotImplementedError
+
+    def state(self):
+        """
+        Return the current aggregated state as plain Python data.
+        """
+        raise NotImplementedError
+
+    def apply_snapshot(self, records):
+        """
+        Apply a new snapshot of the collection, folding in only what changed since the previous one.
+
+        :param records: The records of the snapshot.
+        :return: The number of records added, changed or removed.
+        """
+        snapshot = {record[self.id_field]: record for record in records}
+        changed = 0
+        for record_id, old in list(self.records.items()):
+            new = snapshot.get(record_id)
+            if new is None:
+                self.remove(old)
+                del self.records[record_id]
+                changed += 1
+            elif new != old:
+                self.remove(old)
+                self.add(new)
+                self.records[record_id] = new
+                changed += 1
+        for record_id, new in snapshot.items():
+            if record_id not in self.records:
+                self.add(new)
+                self.records[record_id] = new
+                changed += 1
+        self.updates_applied += changed
+        self._touch()
+        return changed
+
+    def on_message(self, message):
+        """
+        Handle a graphql-ws message from the view's subscription.
+
+        :param message: The message, either as a JSON string or already decoded.
+        """
+        if isinstance(message, str):
+            message = json.loads(message)
+        if message.get('type') == 'data':
+            self.on_payload(message.get('payload'))
+
+    def on_payload(self, payload):
+        """
+        Handle the payload of a subscription data message, e.g. from a SubscriptionManager callback.
+        """
+        data = (payload or {}).get('data') or {}
+        if self.root_field in data:
+            self.apply_snapshot(data[self.root_field] or [])
+
+    def staleness(self):
+        """
+        Seconds since the view last received data, or None if it was never seeded.
+        """
+        if self.last_updated is None:
+            return None
+        return self.clock() - self.last_updated
+
+    def _touch(self):
+        self.last_updated = self.clock()
+
+class SalesPerDayView(MaterializedView):
+    """
+    Order count and sales total per day.
+    """
+    root_field = 'queryOrder'
+    id_field = 'orderId'
+    selection = "{ orderId total date }"
+
+    def reset(self):
+        self.orders = Counter()
+        self.totals = defaultdict(float)
+
+    def add(self, record):
+        day = record['date'][:10]
+        self.orders[day] += 1
+        self.totals[day] += record['total']
+
+    def remove(self, record):
+        day = record['date'][:10]
+        self.orders[day] -= 1
+        self.totals[day] -= record['total']
+        if not self.orders[day]:
+            del self.orders[day]
+            del self.totals[day]
+
+    def get(self, day):
+        """
+        Return {'orders': n, 'total': amount} for a day in YYYY-MM-DD form.
+        """
+        return {'orders': self.orders.get(day, 0), 'total': self.totals.get(day, 0.0)}
+
+    def state(self):
+        return {day: self.get(day) for day in sorted(self.orders)}
+
+class ProductOrderCountView(MaterializedView):
+    """
+    Number of orders containing each product.
+    """
+    root_field = 'queryOrder'
+    id_field = 'orderId'
+    selection = "{ orderId products { productId } }"
+
+    def reset(self):
+        self.counts = Counter()
+
+    def add(self, record):
+        for product in record.get('products') or []:
+            self.counts[product['productId']] += 1
+
+    def remove(self, record):
+        for product in record.get('products') or []:
+            self.counts[product['productId']] -= 1
+            if not self.counts[product['productId']]:
+                del self.counts[product['productId']]
+
+    def get(self, product_id):
+        return self.counts.get(product_id, 0)
+
+    def state(self):
+        return dict(self.counts)
+
+class MemberReviewCountView(MaterializedView):
+    """
+    Number of reviews written by each member.
+    """
+    root_field = 'queryMember'
+    id_field = 'memberId'
+    selection = "{ memberId reviewsAggregate { count } }"
+
+    def reset(self):
+        self.counts = {}
+
+    def add(self, record):
+        self.counts[record['memberId']] = (record.get('reviewsAggregate') or {}).get('count') or 0
+
+    def remove(self, record):
+        self.counts.pop(record['memberId'], None)
+
+    def get(self, member_id):
+        return self.counts.get(member_id, 0)
+
+    def state(self):
+        return dict(self.counts)
+
+class ViewManager:
+    """
+    Registers materialized views, seeds them and keeps them up to date from subscriptions.
+    """
+    def __init__(self, client):
+        """
+        Initialize the ViewManager with the DgraphClient used for seeding and subscriptions.
+        """
+        self.client = client
+        self.views = {}
+
+    def register(self, name, view, seed=True):
+        """
+        Register a view and seed it with a full query.
+
+        :param name: The name the view is read back by.
+        :param view: A MaterializedView instance.
+        :param seed: Whether to run the seeding query now.
+        :return: The view.
+        """
+        self.views[name] = view
+        if seed:
+            response = self.client.query(view.query)
+            view.seed((response.get('data') or {}).get(view.root_field) or [])
+        return view
+
+    def read(self, name):
+        """
+        Return the current state of a view and its staleness in seconds.
+        """
+        view = self.views[name]
+        return {'state': view.state(), 'staleness': view.staleness()}
+
+    async def run(self, manager=None):
+        """
+        Keep every registered view up to date until the client is stopped.
+
+        :param manager: Optional SubscriptionManager; when given, all views share its single
+                        reconnecting connection instead of opening one websocket each.
+        """
+        if manager is None:
+            await asyncio.gather(*(self.client.subscribe(view.subscription, on_message=view.on_message)
+                                   for view in self.views.values()))
+            return
+        subscriptions = [await manager.subscribe(view.subscription, callback=view.on_payload)
+                         for view in self.views.values()]
+        # The callbacks do the work; wait until the manager ends the subscriptions
+        await asyncio.gather(*(_drain(subscription) for subscription in subscriptions))
+
+async def _drain(subscription):
+    async for _ in subscription:
+        pass
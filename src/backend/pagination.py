@@ -0,0 +1,131 @@
+# Paginated streaming of query* collections.
+# Instead of loading an unbounded queryMember/queryOrder result in one
+# response, the collection is walked page by page with `first`/`offset`
+# (or an `@id` keyset filter) and records are yielded one at a time.
+
+import copy
+from concurrent.futures import ThreadPoolExecutor
+
+from graphql_document import GraphQLError, Operation, Variable, EnumValue, parse, render_operation
+
+# The @id field of each type in the schema, used to give pages a stable order
+ID_FIELDS = {
+    'queryMember': 'memberId',
+    'queryProduct': 'productId',
+    'queryOrder': 'orderId',
+    'queryReview': 'reviewId',
+}
+
+def paginate(client, query, variables=None, root_field=None, page_size=1000, prefetch=True, keyset=False):
+    """
+    Stream the records of a query* collection page by page.
+
+    :param client: The DgraphClient used to fetch each page.
+    :param query: A GraphQL query selecting the collection, e.g. `query { queryOrder { orderId } }`.
+    :param variables: Optional variables for the query.
+    :param root_field: The root field to walk; may be omitted when the query has a single root field.
+    :param page_size: Number of records fetched per request.
+    :param prefetch: Fetch the next page in the background while the current one is consumed.
+    :param keyset: Page with an `@id > last seen` filter instead of `offset`, which stays fast deep into the collection.
+    :return: A generator of records.
+    :raises GraphQLError: If a page comes back with errors.
+    """
+    operation = parse(query).operation()
+    field = _select_root(operation, root_field)
+    id_field = ID_FIELDS.get(field.name)
+    if id_field is None:
+        raise ValueError("Cannot paginate %s, expected one of %s" % (field.name, ', '.join(sorted(ID_FIELDS))))
+
+    # The caller's own first/offset bound the overall scan
+    start = _resolve(field.arguments.get('offset'), variables) or 0
+    limit = _resolve(field.arguments.get('first'), variables)
+    # Variables that only fed first/offset are replaced by the page variables
+    replaced = {field.arguments[name].name for name in ('first', 'offset') if isinstance(field.arguments.get(name), Variable)}
+    base_definitions = [definition for definition in operation.variable_definitions if definition[0] not in replaced]
+    base_variables = {name: value for name, value in (variables or {}).items() if name not in replaced}
+    page_field = copy.copy(field)
+    page_field.arguments = {name: value for name, value in field.arguments.items() if name not in ('first', 'offset')}
+    page_field.arguments.setdefault('order', {'asc': EnumValue(id_field)})
+    page_field.arguments['first'] = Variable('pageFirst')
+    if keyset:
+        if page_field.arguments['order'] != {'asc': EnumValue(id_field)}:
+            raise ValueError("Keyset pagination requires ordering by %s" % id_field)
+        if start:
+            raise ValueError("Keyset pagination cannot start from an offset")
+        if id_field not in [child.response_key for child in page_field.selections or []]:
+            raise ValueError("Keyset pagination requires %s in the selection" % id_field)
+    else:
+        page_field.arguments['offset'] = Variable('pageOffset')
+
+    def page_document(after):
+        definitions = base_definitions + [('pageFirst', 'Int', None)]
+        page = page_field
+        if not keyset:
+            definitions.append(('pageOffset', 'Int', None))
+        elif after is not None:
+            # Only fetch ids greater than the last one seen, on top of the caller's own filter
+            definitions.append(('pageAfter', 'String', None))
+            page = copy.copy(page_field)
+            after_filter = {id_field: {'gt': Variable('pageAfter')}}
+            base_filter = page_field.arguments.get('filter')
+            page.arguments = dict(page_field.arguments, filter={'and': [base_filter, after_filter]} if base_filter else after_filter)
+        return render_operation(Operation('query', operation.name, definitions, [page]))
+
+    first_page_query = page_document(None)
+    next_page_query = page_document('') if keyset else first_page_query
+
+    def fetch(offset, after, count):
+        page_variables = dict(base_variables, pageFirst=count)
+        if not keyset:
+            page_variables['pageOffset'] = offset
+        elif after is not None:
+            page_variables['pageAfter'] = after
+        response = client.query(first_page_query if after is None else next_page_query, page_variables)
+        if response.get('errors'):
+            raise GraphQLError(response['errors'])
+        return response['data'][field.response_key] or []
+
+    def page_count(fetched):
+        if limit is None:
+            return page_size
+        return min(page_size, limit - fetched)
+
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        fetched = 0
+        offset = start
+        after = None
+        count = page_count(fetched)
+        pending = executor.submit(fetch, offset, after, count) if executor else None
+        while count > 0:
+            records = pending.result() if executor else fetch(offset, after, count)
+            fetched += len(records)
+            offset += len(records)
+            if records and keyset:
+                after = records[-1][id_field]
+            last_page = len(records) < count
+            count = 0 if last_page else page_count(fetched)
+            if executor and count > 0:
+                pending = executor.submit(fetch, offset, after, count)
+            for record in records:
+                yield record
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+def _resolve(value, variables):
+    if isinstance(value, Variable):
+        return (variables or {}).get(value.name)
+    return value
+
+def _select_root(operation, root_field):
+    if operation.kind != 'query':
+        raise ValueError("Only queries can be paginated, not %ss" % operation.kind)
+    if root_field is None:
+        if len(operation.selections) != 1:
+            raise ValueError("The query has several root fields, choose one with root_field")
+        return operation.selections[0]
+    for field in operation.selections:
+        if root_field in (field.name, field.response_key):
+            return field
+    raise ValueError("The query has no root field %s" % root_field)
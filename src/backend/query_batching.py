@@ -0,0 +1,184 @@
+# Query batching for the Dgraph GraphQL API.
+# Several pending queries are merged into one aliased document with
+# de-duplicated fields, sent in a single round trip, and the response is
+# split back so that every caller receives exactly the shape it asked for.
+
+from graphql_document import Field, Operation, Variable, parse, render_operation
+
+class BatchedResult:
+    """
+    A placeholder for the response of a query that is waiting in a QueryBatcher.
+    """
+    def __init__(self):
+        self._response = None
+        self._done = False
+
+    def done(self):
+        """
+        Return True once the batch containing this query has been sent.
+        """
+        return self._done
+
+    def result(self):
+        """
+        Return the response of the query.
+
+        :raises RuntimeError: If the batch has not been flushed yet.
+        """
+        if not self._done:
+            raise RuntimeError("The batch has not been flushed yet")
+        return self._response
+
+    def _resolve(self, response):
+        self._response = response
+        self._done = True
+
+class QueryBatcher:
+    """
+    A stand-in for DgraphClient that collects queries instead of sending them.
+    Calling flush() merges every pending query into one request.
+
+    Because AnalysisAPI only calls `client.query`, an AnalysisAPI built on a
+    QueryBatcher returns a BatchedResult from each of its analysis methods.
+    """
+    def __init__(self, client):
+        """
+        Initialize the QueryBatcher with the DgraphClient that will send the merged request.
+        """
+        self.client = client
+        self.pending = []
+
+    def query(self, query, variables=None):
+        """
+        Queue a GraphQL query.
+
+        :param query: The GraphQL query string.
+        :param variables: Optional variables for the query.
+        :return: A BatchedResult resolved by the next flush().
+        """
+        operation = parse(query).operation()
+        if operation.kind != 'query':
+            raise ValueError("Only queries can be batched, not %ss" % operation.kind)
+        result = BatchedResult()
+        self.pending.append((operation, variables or {}, result))
+        return result
+
+    def flush(self):
+        """
+        Send every pending query as a single GraphQL request and resolve their results.
+
+        :return: The list of responses, in the order the queries were queued.
+        """
+        pending, self.pending = self.pending, []
+        if not pending:
+            return []
+        document, variables, plans = merge_operations([(operation, values) for operation, values, _ in pending])
+        response = self.client.query(document, variables or None)
+        results = []
+        for (_, _, result), plan in zip(pending, plans):
+            result._resolve(split_response(response, plan))
+            results.append(result.result())
+        return results
+
+def merge_operations(operations):
+    """
+    Merge several query operations into a single aliased document.
+
+    :param operations: A list of (Operation, variables) pairs.
+    :return: A (document, variables, plans) tuple, where plans[i] describes how to
+             recover the response of operations[i] from the merged response.
+    """
+    merged = []
+    merged_variables = {}
+    variable_definitions = []
+    plans = []
+    for index, (operation, variables) in enumerate(operations):
+        # Prefix variables so that callers cannot collide with each other
+        renames = {}
+        for name, variable_type, default in operation.variable_definitions:
+            renames[name] = 'b%d_%s' % (index, name)
+            variable_definitions.append((renames[name], variable_type, default))
+            if name in variables:
+                merged_variables[renames[name]] = variables[name]
+        selections = [_rename_variables(field, renames) for field in operation.selections]
+        plans.append(_merge_selections(merged, selections))
+    names = [operation.name for operation, _ in operations if operation.name]
+    batch = Operation('query', 'Batch_' + '_'.join(names) if names else 'Batch', variable_definitions, merged)
+    return render_operation(batch), merged_variables, plans
+
+def _merge_selections(merged, selections):
+    """
+    Merge `selections` into the `merged` field list in place.
+    Returns a plan: a list of (caller_key, merged_key, child_plan) tuples.
+    """
+    plan = []
+    for field in selections:
+        target = None
+        for candidate in merged:
+            if candidate.signature() == field.signature():
+                target = candidate
+                break
+        if target is None:
+            taken = {candidate.response_key for candidate in merged}
+            alias = field.response_key
+            suffix = 1
+            while alias in taken:
+                alias = '%s_%d' % (field.response_key, suffix)
+                suffix += 1
+            target = Field(field.name, alias if alias != field.name else None, field.arguments, field.directives,
+                           [] if field.selections is not None else None)
+            merged.append(target)
+        child_plan = None
+        if field.selections is not None:
+            child_plan = _merge_selections(target.selections, field.selections)
+        plan.append((field.response_key, target.response_key, child_plan))
+    return plan
+
+def _rename_variables(field, renames):
+    if not renames:
+        return field
+    arguments = {name: _rename_value(value, renames) for name, value in field.arguments.items()}
+    directives = [(name, {key: _rename_value(value, renames) for key, value in args.items()})
+                  for name, args in field.directives]
+    selections = None
+    if field.selections is not None:
+        selections = [_rename_variables(child, renames) for child in field.selections]
+    return Field(field.name, field.alias, arguments, directives, selections)
+
+def _rename_value(value, renames):
+    if isinstance(value, Variable):
+        return Variable(renames.get(value.name, value.name))
+    if isinstance(value, list):
+        return [_rename_value(item, renames) for item in value]
+    if isinstance(value, dict):
+        return {key: _rename_value(item, renames) for key, item in value.items()}
+    return value
+
+def split_response(response, plan):
+    """
+    Extract one caller's response from a merged response.
+
+    :param response: The merged GraphQL response.
+    :param plan: The caller's plan returned by merge_operations.
+    :return: A GraphQL response shaped like the caller's original query.
+    """
+    result = {}
+    data = response.get('data')
+    if data is not None:
+        result['data'] = {caller_key: _project(data.get(merged_key), child_plan)
+                          for caller_key, merged_key, child_plan in plan}
+    merged_keys = {merged_key for _, merged_key, _ in plan}
+    errors = [error for error in response.get('errors', [])
+              if not error.get('path') or error['path'][0] in merged_keys]
+    if errors:
+        result['errors'] = errors
+    if 'extensions' in response:
+        result['extensions'] = response['extensions']
+    return result
+
+def _project(value, plan):
+    if plan is None or value is None:
+        return value
+    if isinstance(value, list):
+        return [_project(item, plan) for item in value]
+    return {caller_key: _project(value.get(merged_key), child_plan) for caller_key, merged_key, child_plan in plan}
@@ -0,0 +1,311 @@
+# Item-to-item recommendations from order co-occurrence and ratings.
+# Members' purchases and reviews form a sparse member x product matrix R.
+# Item similarity is the shrunk cosine of R^T R, cut down to a top-K
+# neighbor index per product. A member is scored by summing the neighbor
+# lists of the products in their history: a few small array reads, served
+# from memory. Whole-base scoring is one sparse product R @ index per chunk
+# of members. RecommendationWriter pushes the results back to Dgraph as
+# `recommendedProducts` edges, writing only the edges that changed.
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+from columnar import ColumnarTable, to_columnar
+
+# The interactions the recommender learns from, one record per member
+INTERACTIONS_QUERY = """
+query RecommenderInteractions {
+    queryMember {
+        memberId
+        orders {
+            products {
+                productId
+            }
+        }
+        reviews {
+            rating
+            product {
+                productId
+            }
+        }
+    }
+}
+"""
+
+def _top(scores, n):
+    # Indices of the n highest positive scores, best first
+    n = min(n, len(scores))
+    if n == 0:
+        return np.array([], dtype=np.int64)
+    top = np.argpartition(-scores, n - 1)[:n]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return top[scores[top] > 0]
+
+class ItemRecommender:
+    """
+    Item-item collaborative filtering over purchases and ratings, with a precomputed top-K neighbor index.
+    """
+    def __init__(self, k=20, rating_weight=1.0, shrinkage=10.0):
+        """
+        :param k: Number of neighbors kept per product.
+        :param rating_weight: Weight of a review relative to a purchase; a 5-star review adds it, a 1-star review subtracts it.
+        :param shrinkage: Added to the cosine denominator, so products seen together only a few times score lower.
+        """
+        self.k = k
+        self.rating_weight = rating_weight
+        self.shrinkage = shrinkage
+        self.members = None
+        self.items = None
+        self.interactions = None
+        self.neighbors = None
+        self.scores = None
+
+    def fit_client(self, client):
+        """
+        Fetch the interactions with INTERACTIONS_QUERY, streaming the response, and fit on them.
+
+        :param client: A DgraphClient.
+        """
+        return self.fit(client.query_stream(INTERACTIONS_QUERY))
+
+    def fit(self, members):
+        """
+        Build the interaction matrix and the neighbor index.
+
+        :param members: A ColumnarTable or records shaped like INTERACTIONS_QUERY's `queryMember`.
+        :return: self
+        """
+        table = members if isinstance(members, ColumnarTable) else to_columnar(members)
+        self.members = table.decode('memberId') if len(table) else np.array([], dtype=object)
+        self.member_index = {member: row for row, member in enumerate(self.members)}
+        self.items = self._items(table)
+        self.product_index = {product: code for code, product in enumerate(self.items.tolist())}
+        shape = (len(table), len(self.items))
+
+        purchases = sparse.csr_matrix(shape, dtype=np.float64)
+        if 'orders' in table.lists and 'products' in table.child('orders').lists:
+            orders = table.child('orders')
+            codes = orders.child('products').column('productId')
+            buyers = table.parent_index('orders')[orders.parent_index('products')]
+            present = codes >= 0
+            purchases = sparse.csr_matrix((np.ones(int(present.sum())), (buyers[present], codes[present])), shape=shape)
+        self.popularity = np.asarray((purchases > 0).sum(axis=0)).ravel()
+        # Repeat purchases count with diminishing returns
+        purchases.data = np.log1p(purchases.data)
+
+        ratings = sparse.csr_matrix(shape, dtype=np.float64)
+        if 'reviews' in table.lists and len(table.child('reviews')):
+            reviews = table.child('reviews')
+            codes = reviews.column('product.productId')
+            rating = reviews.column('rating').astype(np.float64)
+            present = (codes >= 0) & ~np.isnan(rating)
+            reviewers = table.parent_index('reviews')[present]
+            # Mean rating per (member, product), centered on 3 stars and scaled to [-1, 1]
+            keys, inverse = np.unique(reviewers * shape[1] + codes[present], return_inverse=True)
+            mean = np.bincount(inverse, weights=rating[present]) / np.bincount(inverse)
+            ratings = sparse.csr_matrix(((mean - 3) / 2, (keys // shape[1], keys % shape[1])), shape=shape)
+        self.interactions = (purchases + self.rating_weight * ratings).tocsr()
+        self.interactions.eliminate_zeros()
+        self._build_index()
+        return self
+
+    def _items(self, table):
+        for path in (('orders', 'products'), ('reviews',)):
+            child = table
+            for name in path:
+                if name not in child.lists:
+                    break
+                child = child.child(name)
+            else:
+                for field in ('productId', 'product.productId'):
+                    if field in child.dictionaries:
+                        return child.dictionaries[field]
+        return np.array([], dtype=str)
+
+    def _build_index(self):
+        interactions = self.interactions
+        gram = (interactions.T @ interactions).tocsr()
+        norms = np.sqrt(np.maximum(gram.diagonal(), 0))
+        rows = np.repeat(np.arange(gram.shape[0]), np.diff(gram.indptr))
+        gram.data = gram.data / (norms[rows] * norms[gram.indices] + self.shrinkage)
+        gram.setdiag(0)
+        gram.eliminate_zeros()
+
+        self.neighbors = np.full((gram.shape[0], self.k), -1, dtype=np.int32)
+        self.scores = np.zeros((gram.shape[0], self.k), dtype=np.float32)
+        for item in range(gram.shape[0]):
+            start, end = gram.indptr[item], gram.indptr[item + 1]
+            top = _top(gram.data[start:end], self.k)
+            self.neighbors[item, :len(top)] = gram.indices[start:end][top]
+            self.scores[item, :len(top)] = gram.data[start:end][top]
+        present = self.neighbors >= 0
+        self.index = sparse.csr_matrix((self.scores[present].astype(np.float64),
+                                        (np.nonzero(present)[0], self.neighbors[present])), shape=gram.shape)
+
+    def similar_products(self, product_id, n=10):
+        """
+        Return the products most similar to a product, with their similarity.
+
+        :return: A list of (product id, score), best first.
+        """
+        code = self.product_index.get(product_id)
+        if code is None:
+            return []
+        return [(self.items[neighbor].item(), float(score))
+                for neighbor, score in zip(self.neighbors[code][:n], self.scores[code][:n]) if neighbor >= 0]
+
+    def recommend(self, member_id, n=10):
+        """
+        Recommend products a member has not bought or reviewed yet.
+        Members without usable history get the most purchased products.
+
+        :return: A list of product ids, best first.
+        """
+        row = self.member_index.get(member_id)
+        history = np.array([], dtype=np.int32)
+        if row is not None:
+            start, end = self.interactions.indptr[row], self.interactions.indptr[row + 1]
+            history = self.interactions.indices[start:end]
+            recommended = self.recommend_for_items(history, n, self.interactions.data[start:end])
+            if recommended:
+                return recommended
+        return self._popular(history, n)
+
+    def _popular(self, history, n):
+        popularity = self.popularity.astype(np.float64)
+        popularity[history] = 0
+        return self.items[_top(popularity, n)].tolist()
+
+    def recommend_for_items(self, history, n=10, weights=None):
+        """
+        Recommend products to go with a set of products, e.g. a cart for cross-selling.
+
+        :param history: Product ids, or product codes (indices into `items`).
+        :param weights: Optional weight per history item.
+        :return: A list of product ids, best first.
+        """
+        history = np.asarray(history)
+        if history.dtype.kind not in 'iu':
+            known = [product_id in self.product_index for product_id in history]
+            history = np.array([self.product_index[product_id] for product_id in history[known]], dtype=np.int64)
+            weights = None if weights is None else np.asarray(weights)[known]
+        weights = np.ones(len(history)) if weights is None else np.asarray(weights, dtype=np.float64)
+        neighbors = self.neighbors[history]
+        present = neighbors >= 0
+        totals = np.bincount(neighbors[present], weights=(self.scores[history] * weights[:, None])[present],
+                             minlength=len(self.items))
+        totals[history] = 0
+        return self.items[_top(totals, n)].tolist()
+
+    def recommend_all(self, n=10, chunk_size=10000):
+        """
+        Score every member in chunks of one sparse product each.
+        As in `recommend`, members without usable history get the most purchased products.
+
+        :return: A generator of (member id, list of product ids), in member order.
+        """
+        for start in range(0, len(self.members), chunk_size):
+            interactions = self.interactions[start:start + chunk_size]
+            scores = (interactions @ self.index).tocsr()
+            # Products already in a member's history are not recommended again
+            scores = scores - scores.multiply(interactions != 0)
+            scores.eliminate_zeros()
+            for offset in range(scores.shape[0]):
+                begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+                top = _top(scores.data[begin:end], n)
+                if len(top):
+                    yield self.members[start + offset], self.items[scores.indices[begin:end][top]].tolist()
+                else:
+                    history = interactions.indices[interactions.indptr[offset]:interactions.indptr[offset + 1]]
+                    yield self.members[start + offset], self._popular(history, n)
+
+class RecommendationWriter:
+    """
+    Writes recommendations to Dgraph as `recommendedProducts` edges.
+    Each batch reads the members' current recommendations, then sends one mutation that
+    updates only the members whose recommendations changed, adding and removing just the
+    edges that differ.
+    """
+    def __init__(self, client, batch_size=200, workers=4):
+        """
+        :param client: A DgraphClient.
+        :param batch_size: Members per read and per mutation.
+        :param workers: Batches in flight at once.
+        """
+        self.client = client
+        self.batch_size = batch_size
+        self.workers = workers
+
+    def write(self, recommendations):
+        """
+        :param recommendations: A dict or iterable of (member id, list of product ids), e.g. ItemRecommender.recommend_all().
+        :return: A dict with the number of members 'updated' and 'unchanged', and a list of 'errors'.
+        """
+        items = iter(recommendations.items() if isinstance(recommendations, dict) else recommendations)
+        batches = iter(lambda: [pair for _, pair in zip(range(self.batch_size), items)], [])
+        report = {'updated': 0, 'unchanged': 0, 'errors': []}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = []
+            # Keep a bounded number of batches in flight so the input is consumed as a stream
+            for batch in batches:
+                pending.append(executor.submit(self.write_batch, batch))
+                if len(pending) >= self.workers * 2:
+                    self._record(report, pending.pop(0).result())
+            for future in pending:
+                self._record(report, future.result())
+        return report
+
+    @staticmethod
+    def _record(report, outcome):
+        updated, unchanged, errors = outcome
+        report['updated'] += updated
+        report['unchanged'] += unchanged
+        report['errors'].extend(errors)
+
+    def write_batch(self, batch):
+        """
+        Write one batch of (member id, list of product ids).
+
+        :return: (updated, unchanged, errors)
+        """
+        member_ids = [member_id for member_id, _ in batch]
+        response = self.client.query("""
+        query CurrentRecommendations($ids: [String]) {
+            queryMember(filter: {memberId: {in: $ids}}) {
+                memberId
+                recommendedProducts {
+                    productId
+                }
+            }
+        }
+        """, {'ids': member_ids})
+        if response.get('errors'):
+            return 0, 0, response['errors']
+        current = {member['memberId']: {product['productId'] for product in member['recommendedProducts'] or []}
+                   for member in response['data']['queryMember']}
+
+        inputs = []
+        for member_id, product_ids in batch:
+            wanted = set(product_ids)
+            existing = current.get(member_id, set())
+            if wanted == existing:
+                continue
+            update = {'filter': {'memberId': {'eq': member_id}}}
+            if wanted - existing:
+                update['set'] = {'recommendedProducts': [{'productId': product_id} for product_id in sorted(wanted - existing)]}
+            if existing - wanted:
+                update['remove'] = {'recommendedProducts': [{'productId': product_id} for product_id in sorted(existing - wanted)]}
+            inputs.append(update)
+        if not inputs:
+            return 0, len(batch), []
+
+        # Dgraph's updateMember takes one filter, so the batch is sent as aliased updates in one request
+        mutation = "mutation SetRecommendations(%s) {\n%s\n}" % (
+            ', '.join('$m%d: UpdateMemberInput!' % i for i in range(len(inputs))),
+            '\n'.join('  m%d: updateMember(input: $m%d) { numUids }' % (i, i) for i in range(len(inputs))))
+        response = self.client.mutate(mutation, {'m%d' % i: update for i, update in enumerate(inputs)})
+        if response.get('errors'):
+            return 0, 0, response['errors']
+        return len(inputs), len(batch) - len(inputs), []
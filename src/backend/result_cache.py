@@ -0,0 +1,201 @@
+# A TTL + LRU result cache for GraphQL queries.
+# Entries are keyed by the normalized query text and its variables, bounded
+# by their total size in bytes, and invalidated by type when a mutation
+# touches one of the types a cached query read. Each invalidation bumps a
+# generation counter of its types, so a query that was already running when
+# a mutation invalidated its types cannot store its (possibly stale) result.
+
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from graphql_document import parse
+
+# The type each relation field resolves to, per parent type (see schema/api_schema.graphql)
+SCHEMA_EDGES = {
+    'Member': {'orders': 'Order', 'reviews': 'Review', 'recommendedProducts': 'Product'},
+    'Product': {'reviews': 'Review', 'recommendedToMembers': 'Member'},
+    'Order': {'member': 'Member', 'products': 'Product'},
+    'Review': {'member': 'Member', 'product': 'Product'},
+}
+
+_ROOT_FIELD_RE = re.compile(r'^(get|query|aggregate|add|update|delete)(%s)$' % '|'.join(SCHEMA_EDGES))
+_WHITESPACE_RE = re.compile(r'[\s,]+')
+
+def touched_types(document):
+    """
+    Return the set of schema types read by a query, or written by a mutation.
+
+    :param document: The GraphQL query or mutation string.
+    """
+    types = set()
+    for operation in parse(document).operations:
+        for field in operation.selections:
+            match = _ROOT_FIELD_RE.match(field.name)
+            if match is None:
+                continue
+            root_type = match.group(2)
+            types.add(root_type)
+            # A mutation writes its root type; edges it links to are reached through that type's fields
+            if operation.kind != 'mutation':
+                _collect_types(root_type, field.selections or [], types)
+    return types
+
+def _collect_types(parent_type, selections, types):
+    for field in selections:
+        name = field.name[:-len('Aggregate')] if field.name.endswith('Aggregate') else field.name
+        child_type = SCHEMA_EDGES[parent_type].get(name)
+        if child_type is not None:
+            types.add(child_type)
+            if field.selections is not None and not field.name.endswith('Aggregate'):
+                _collect_types(child_type, field.selections, types)
+
+class ResultCache:
+    """
+    An in-memory, thread-safe result cache with TTL expiry and an LRU size bound in bytes.
+    Responses are stored serialized, so callers can freely modify what they get back.
+    """
+    def __init__(self, ttl=60, max_bytes=64 * 1024 * 1024, clock=time.monotonic):
+        """
+        Initialize the ResultCache.
+
+        :param ttl: Seconds an entry stays valid after being stored.
+        :param max_bytes: Upper bound for the total size of the stored responses.
+        :param clock: A function returning the current time in seconds.
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+        self.generations = {}
+        self.epoch = 0
+
+    @staticmethod
+    def key(query, variables=None):
+        """
+        Build the cache key for a query and its variables, ignoring insignificant whitespace.
+        """
+        return _WHITESPACE_RE.sub(' ', query).strip(), json.dumps(variables, sort_keys=True)
+
+    def get(self, query, variables=None):
+        """
+        Return the cached response for a query, or None on a miss.
+        """
+        key = self.key(query, variables)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] <= self.clock():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            payload = entry[0]
+        return json.loads(payload)
+
+    def generation(self, query):
+        """
+        Snapshot the invalidation generation of the types a query reads; take it before sending the query
+        and pass it to `put` with the response.
+        """
+        types = touched_types(query)
+        with self.lock:
+            return self.epoch, {type_name: self.generations.get(type_name, 0) for type_name in types}
+
+    def put(self, query, variables, response, generation=None):
+        """
+        Store a response. Responses carrying errors, or larger than the whole cache, are not stored.
+
+        :param generation: The `generation(query)` taken when the query was sent; if one of its types
+                           was invalidated since, the response may predate that change and is not stored.
+        """
+        if response.get('errors'):
+            return
+        key = self.key(query, variables)
+        payload = json.dumps(response)
+        types = touched_types(query)
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if generation is not None and generation != (self.epoch, {type_name: self.generations.get(type_name, 0)
+                                                                     for type_name in generation[1]}):
+                self.stale_puts += 1
+                return
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (payload, self.clock() + self.ttl, size, types)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, types):
+        """
+        Drop every entry that read one of the given types.
+
+        :param types: An iterable of type names, e.g. ['Order'].
+        :return: The number of entries dropped.
+        """
+        types = set(types)
+        with self.lock:
+            for type_name in types:
+                self.generations[type_name] = self.generations.get(type_name, 0) + 1
+            stale = [key for key, entry in self.entries.items() if entry[3] & types]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def invalidate_mutation(self, mutation):
+        """
+        Drop every entry that read a type written by the given mutation.
+
+        :param mutation: The GraphQL mutation string.
+        :return: The number of entries dropped.
+        """
+        return self.invalidate(touched_types(mutation))
+
+    def clear(self):
+        """
+        Drop every entry.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.epoch += 1
+
+    def stats(self):
+        """
+        Return hit/miss statistics and the current size of the cache.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'stale_puts': self.stale_puts,
+                'entries': len(self.entries),
+                'bytes': self.size,
+            }
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.size -= entry[2]
@@ -0,0 +1,284 @@
+# Precomputed sales rollup cubes for trend dashboards.
+# Orders are aggregated into daily, weekly (ISO, Monday-based) and monthly
+# buckets per product with a single bincount per batch; each order's total is
+# split over its products in proportion to their prices. Category rollups are
+# product cubes summed through a product -> category mapping. New orders are
+# folded in incrementally, either passed directly or polled from Dgraph by
+# date, so trend, year-over-year and seasonal-spike queries read a few
+# kilobytes of cube data instead of re-scanning every order.
+
+import numpy as np
+
+from columnar import ColumnarTable, to_columnar, to_datetime64
+
+ROLLUP_QUERY = """
+query SalesRollup($since: DateTime) {
+    queryOrder(filter: {date: {ge: $since}}) {
+        orderId
+        total
+        date
+        products {
+            productId
+            category
+            price
+        }
+    }
+}
+"""
+
+GRANULARITIES = ('day', 'week', 'month')
+# Periods back to the same period a year earlier; 364 days and 52 weeks keep weekdays aligned
+YEAR = {'day': 364, 'week': 52, 'month': 12}
+
+def _periods(dates, granularity):
+    if granularity == 'month':
+        return dates.astype('datetime64[M]').astype(np.int64)
+    days = dates.astype('datetime64[D]').astype(np.int64)
+    # 1970-01-01 was a Thursday, so shifting by 3 days makes weeks start on Monday
+    return days if granularity == 'day' else (days + 3) // 7
+
+def _period_starts(periods, granularity):
+    if granularity == 'month':
+        return periods.astype('datetime64[M]').astype('datetime64[D]')
+    return (periods if granularity == 'day' else periods * 7 - 3).astype('datetime64[D]')
+
+class SalesCube:
+    """
+    Units and revenue per period and product for one granularity, with order counts and revenue per period.
+    """
+    def __init__(self, granularity):
+        self.granularity = granularity
+        self.origin = None
+        self.units = np.zeros((0, 0))
+        self.revenue = np.zeros((0, 0))
+        self.orders = np.zeros(0)
+        self.order_revenue = np.zeros(0)
+
+    def _fit(self, periods, products):
+        # Grow the arrays to cover the new periods (in either direction) and products
+        low, high = int(periods.min()), int(periods.max())
+        if self.origin is None:
+            self.origin = low
+        start = min(self.origin, low)
+        length = max(self.origin + len(self.orders), high + 1) - start
+        shift = self.origin - start
+        if shift or length > len(self.orders) or products > self.units.shape[1]:
+            width = max(products, self.units.shape[1])
+            for name in ('units', 'revenue'):
+                grown = np.zeros((length, width))
+                old = getattr(self, name)
+                grown[shift:shift + old.shape[0], :old.shape[1]] = old
+                setattr(self, name, grown)
+            for name in ('orders', 'order_revenue'):
+                grown = np.zeros(length)
+                old = getattr(self, name)
+                grown[shift:shift + len(old)] = old
+                setattr(self, name, grown)
+            self.origin = start
+
+    def add(self, order_periods, order_totals, line_orders, line_products, line_revenue, products):
+        self._fit(order_periods, products)
+        rows = order_periods - self.origin
+        self.orders += np.bincount(rows, minlength=len(self.orders))
+        self.order_revenue += np.bincount(rows, weights=order_totals, minlength=len(self.orders))
+        cells = rows[line_orders] * self.units.shape[1] + line_products
+        size = self.units.size
+        self.units += np.bincount(cells, minlength=size).reshape(self.units.shape)
+        self.revenue += np.bincount(cells, weights=line_revenue, minlength=size).reshape(self.units.shape)
+
+    def period_starts(self):
+        """
+        The first day of each period of the cube, as datetime64[D].
+        """
+        if self.origin is None:
+            return np.array([], dtype='datetime64[D]')
+        return _period_starts(np.arange(self.origin, self.origin + len(self.orders)), self.granularity)
+
+class SalesRollup:
+    """
+    Daily, weekly and monthly sales cubes per product and per category, maintained incrementally.
+    """
+    def __init__(self, granularities=GRANULARITIES):
+        self.cubes = {granularity: SalesCube(granularity) for granularity in granularities}
+        self.products = []
+        self.product_index = {}
+        self.categories = []
+        self.category_index = {}
+        self.product_categories = np.zeros(0, dtype=np.int64)
+        self.watermark = None
+        self.seen = set()
+
+    def add_orders(self, orders):
+        """
+        Fold orders in.
+
+        :param orders: A ColumnarTable or `queryOrder` records with `total`, `date` and
+                       `products { productId category price }` (category and price optional).
+        :return: The number of orders added.
+        """
+        table = orders if isinstance(orders, ColumnarTable) else to_columnar(orders)
+        if not len(table) or 'date' not in table.columns:
+            return 0
+        dates = table.column('date')
+        totals = np.nan_to_num(table.column('total')) if 'total' in table.columns else np.zeros(len(table))
+        has_products = 'products' in table.lists and 'productId' in table.child('products').columns
+        if has_products:
+            products = table.child('products')
+            line_orders = table.parent_index('products')
+            line_products = self._product_codes(products)
+            present = line_products >= 0
+            line_orders, line_products = line_orders[present], line_products[present]
+            prices = np.nan_to_num(products.column('price'))[present] if 'price' in products.columns else np.ones(len(line_orders))
+            line_revenue = self._split(totals, line_orders, prices)
+        else:
+            line_orders = line_products = np.zeros(0, dtype=np.int64)
+            line_revenue = np.zeros(0)
+        valid = ~np.isnat(dates)
+        if not valid.all():
+            keep = valid[line_orders]
+            remap = np.cumsum(valid) - 1
+            line_orders, line_products, line_revenue = remap[line_orders[keep]], line_products[keep], line_revenue[keep]
+            dates, totals = dates[valid], totals[valid]
+        if not len(dates):
+            return 0
+        for granularity, cube in self.cubes.items():
+            cube.add(_periods(dates, granularity), totals, line_orders, line_products, line_revenue, len(self.products))
+        return len(dates)
+
+    def _product_codes(self, products):
+        # Translate the result's dictionary codes into the rollup's stable product columns
+        ids = products.dictionaries['productId']
+        categories = products.column('category') if 'category' in products.columns else None
+        mapping = np.empty(len(ids) + 1, dtype=np.int64)
+        mapping[-1] = -1
+        for code, product_id in enumerate(ids.tolist()):
+            column = self.product_index.get(product_id)
+            if column is None:
+                column = self.product_index[product_id] = len(self.products)
+                self.products.append(product_id)
+            mapping[code] = column
+        codes = mapping[products.column('productId')]
+        if len(self.product_categories) < len(self.products):
+            grown = np.full(len(self.products), -1, dtype=np.int64)
+            grown[:len(self.product_categories)] = self.product_categories
+            self.product_categories = grown
+        if categories is not None:
+            names = products.dictionaries['category']
+            known = (codes >= 0) & (categories >= 0)
+            for product, category in sorted(set(zip(codes[known].tolist(), categories[known].tolist()))):
+                name = names[category]
+                index = self.category_index.get(name)
+                if index is None:
+                    index = self.category_index[name] = len(self.categories)
+                    self.categories.append(name)
+                self.product_categories[product] = index
+        return codes
+
+    @staticmethod
+    def _split(totals, line_orders, prices):
+        # Each order's total is shared by its products in proportion to their prices (equally if unpriced)
+        order_prices = np.bincount(line_orders, weights=prices, minlength=len(totals))
+        lines = np.bincount(line_orders, minlength=len(totals))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            share = np.where(order_prices[line_orders] > 0, prices / order_prices[line_orders], 1.0 / lines[line_orders])
+        return totals[line_orders] * share
+
+    def update(self, client):
+        """
+        Fetch and fold in the orders dated at or after the latest one seen; orders on that date are deduplicated by id.
+
+        :param client: A DgraphClient (or anything with `query(query, variables)`).
+        :return: The number of orders added.
+        """
+        # The watermark is a parsed date: Dgraph's DateTime strings do not sort as text once their fractions differ
+        since = str(self.watermark) + 'Z' if self.watermark is not None else '1970-01-01T00:00:00Z'
+        response = client.query(ROLLUP_QUERY, {'since': since})
+        if response.get('errors'):
+            raise RuntimeError(response['errors'])
+        orders = [order for order in response['data']['queryOrder'] or [] if order['orderId'] not in self.seen and order.get('date')]
+        if orders:
+            dates = [to_datetime64(order['date']) for order in orders]
+            latest = max(dates)
+            if self.watermark is None or latest > self.watermark:
+                self.watermark, self.seen = latest, set()
+            self.seen.update(order['orderId'] for order, date in zip(orders, dates) if date >= self.watermark)
+        return self.add_orders(orders)
+
+    def _matrix(self, granularity, measure, by):
+        cube = self.cubes[granularity]
+        values = getattr(cube, measure)
+        if by == 'product':
+            return values, list(self.products)
+        if by == 'category':
+            mapping = self.product_categories[:values.shape[1]]
+            known = mapping >= 0
+            grouped = np.zeros((values.shape[0], len(self.categories)))
+            for category in range(len(self.categories)):
+                grouped[:, category] = values[:, known & (mapping == category)].sum(axis=1)
+            return grouped, list(self.categories)
+        if by is None:
+            return (cube.orders if measure == 'units' else cube.order_revenue)[:, None], ['total']
+        raise ValueError("by must be 'product', 'category' or None")
+
+    def series(self, granularity='day', measure='revenue', by=None, key=None):
+        """
+        Return a time series from a cube.
+
+        :param granularity: 'day', 'week' or 'month'.
+        :param measure: 'revenue' or 'units' (order lines; with by=None, orders).
+        :param by: None for store totals, 'product' or 'category'.
+        :param key: A product id or category; omit for every column.
+        :return: (period start dates, values): values are 1-D for one key, else periods x keys.
+        """
+        values, keys = self._matrix(granularity, measure, by)
+        starts = self.cubes[granularity].period_starts()
+        if by is None:
+            return starts, values[:, 0]
+        if key is not None:
+            return starts, values[:, keys.index(key)] if key in keys else np.zeros(len(starts))
+        return starts, values
+
+    def year_over_year(self, granularity='month', measure='revenue', by=None):
+        """
+        Compare each period with the same period a year earlier.
+
+        :return: (period start dates, keys, current values, values a year earlier, growth ratio);
+                 growth is NaN where the earlier period has no sales or falls before the data.
+        """
+        values, keys = self._matrix(granularity, measure, by)
+        lag = YEAR[granularity]
+        previous = np.full(values.shape, np.nan)
+        if lag < len(values):
+            previous[lag:] = values[:-lag]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            growth = np.where(previous > 0, values / previous - 1, np.nan)
+        return self.cubes[granularity].period_starts(), keys, values, previous, growth
+
+    def seasonal_spikes(self, granularity='week', measure='revenue', by='category', window=8, threshold=2.0, min_value=0.0):
+        """
+        Find periods whose value exceeds `threshold` times the mean of the `window` periods before it.
+
+        :return: A list of (period start date, key, value, baseline), largest ratio first.
+        """
+        values, keys = self._matrix(granularity, measure, by)
+        if len(values) <= window:
+            return []
+        cumulative = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+        baseline = (cumulative[window:-1] - cumulative[:-window - 1]) / window
+        current = values[window:]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Periods without a baseline (e.g. a product's first sales) are not spikes
+            ratio = np.where(baseline > 0, current / baseline, 0.0)
+        spikes = np.argwhere((ratio >= threshold) & (current > min_value))
+        starts = self.cubes[granularity].period_starts()[window:]
+        result = [(starts[row], keys[column], float(current[row, column]), float(baseline[row, column]))
+                  for row, column in spikes]
+        return sorted(result, key=lambda spike: -spike[2] / spike[3])
+
+    @property
+    def nbytes(self):
+        """
+        Memory held by the cubes.
+        """
+        return sum(cube.units.nbytes + cube.revenue.nbytes + cube.orders.nbytes + cube.order_revenue.nbytes
+                   for cube in self.cubes.values())
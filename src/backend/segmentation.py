@@ -0,0 +1,313 @@
+# Customer segmentation in bounded memory.
+# Members are paged from Dgraph with `paginate` and turned, one batch at a
+# time, into feature vectors: purchase frequency, average order value,
+# review activity and the share of each product category in their orders.
+# Mini-batch k-means (Sculley 2010) folds each batch into the cluster
+# centers, and quantile RFM binning keeps a fixed-size reservoir sample for
+# its bin edges, so neither holds more than a batch of members at once.
+# Refreshing later continues from the current centers with the past batches'
+# weight decayed, so segments follow drifting behavior without a full refit.
+
+import itertools
+
+import numpy as np
+
+from columnar import ColumnarTable, to_columnar
+from pagination import paginate
+
+SEGMENTATION_QUERY = """
+query SegmentationFeatures {
+    queryMember {
+        memberId
+        orders {
+            total
+            date
+            products {
+                category
+            }
+        }
+        reviewsAggregate {
+            count
+        }
+    }
+}
+"""
+
+CATEGORIES_QUERY = """
+query ProductCategories {
+    queryProduct {
+        category
+    }
+}
+"""
+
+def fetch_categories(client):
+    """
+    Return the sorted distinct product categories, which fix the category-mix features.
+    """
+    response = client.query(CATEGORIES_QUERY)
+    return sorted({product['category'] for product in response['data']['queryProduct'] if product.get('category')})
+
+def iter_batches(client, batch_size=5000, page_size=1000):
+    """
+    Page through SEGMENTATION_QUERY and yield lists of at most batch_size member records.
+    """
+    records = paginate(client, SEGMENTATION_QUERY, page_size=page_size)
+    return iter(lambda: list(itertools.islice(records, batch_size)), [])
+
+class MemberFeatures:
+    """
+    Feature arrays of one batch of members.
+
+    - `member_ids`, and per member: `orders`, `spend`, `average_order_value`, `reviews`,
+      `recency_days` (NaN without orders) and `category_mix` (one column per category, rows sum to 1 or 0).
+    """
+    def __init__(self, members, categories, now):
+        table = members if isinstance(members, ColumnarTable) else to_columnar(members)
+        size = len(table)
+        self.member_ids = table.decode('memberId') if size else np.array([], dtype=object)
+        self.orders = np.zeros(size)
+        self.spend = np.zeros(size)
+        self.recency_days = np.full(size, np.nan)
+        self.category_mix = np.zeros((size, len(categories)))
+        if 'orders' in table.lists:
+            self._read_orders(table, categories, np.datetime64(now, 'ms'))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.average_order_value = np.where(self.orders > 0, self.spend / self.orders, 0.0)
+        reviews = table.columns.get('reviewsAggregate.count')
+        self.reviews = np.nan_to_num(reviews.astype(np.float64)) if reviews is not None else np.zeros(size)
+
+    def _read_orders(self, table, categories, now):
+        orders = table.child('orders')
+        owner = table.parent_index('orders')
+        size = len(table)
+        self.orders = np.bincount(owner, minlength=size).astype(np.float64)
+        if 'total' in orders.columns:
+            self.spend = np.bincount(owner, weights=np.nan_to_num(orders.column('total')), minlength=size)
+        if 'date' in orders.columns and len(orders):
+            dates = orders.column('date').astype(np.int64).astype(np.float64)
+            dates[np.isnat(orders.column('date'))] = np.nan
+            latest = np.full(size, np.nan)
+            np.fmax.at(latest, owner, dates)
+            self.recency_days = (now.astype(np.int64) - latest) / 86400000.0
+        if 'products' in orders.lists and categories:
+            products = orders.child('products')
+            if 'category' in products.columns:
+                # Map the result's category codes onto the fixed category columns; unknown ones are dropped
+                known = {category: column for column, category in enumerate(categories)}
+                mapping = np.array([known.get(category, -1) for category in products.dictionaries['category']] + [-1])
+                columns = mapping[products.column('category')]
+                buyers = owner[orders.parent_index('products')]
+                present = columns >= 0
+                counts = np.bincount(buyers[present] * len(categories) + columns[present],
+                                     minlength=size * len(categories)).reshape(size, len(categories))
+                totals = counts.sum(axis=1, keepdims=True)
+                self.category_mix = np.divide(counts, totals, out=np.zeros(counts.shape), where=totals > 0)
+
+    def matrix(self):
+        """
+        The clustering features: log order count, log average order value, log review count and the category mix.
+        """
+        return np.column_stack([np.log1p(self.orders), np.log1p(self.average_order_value),
+                                np.log1p(self.reviews), self.category_mix])
+
+class MiniBatchKMeans:
+    """
+    k-means updated one batch at a time, with per-center learning rates of 1 / (points assigned so far).
+    """
+    def __init__(self, clusters=6, seed=0):
+        self.clusters = clusters
+        self.rng = np.random.default_rng(seed)
+        self.centers = None
+        self.counts = None
+        self.mean = None
+        self.scale = None
+
+    def _scaled(self, X):
+        return (X - self.mean) / self.scale
+
+    def partial_fit(self, X):
+        """
+        Fold a batch of feature rows into the centers.
+        The first batch also fixes the feature scaling and seeds the centers with k-means++.
+
+        :return: self
+        """
+        if not len(X):
+            return self
+        if self.centers is None:
+            self.mean = X.mean(axis=0)
+            self.scale = X.std(axis=0)
+            self.scale[self.scale == 0] = 1.0
+            self.centers = self._seed(self._scaled(X))
+            self.counts = np.zeros(len(self.centers))
+        X = self._scaled(X)
+        labels = self._assign(X)
+        batch_counts = np.bincount(labels, minlength=len(self.centers)).astype(np.float64)
+        sums = np.column_stack([np.bincount(labels, weights=X[:, column], minlength=len(self.centers))
+                                for column in range(X.shape[1])])
+        updated = batch_counts > 0
+        self.counts[updated] += batch_counts[updated]
+        # The batch form of Sculley's per-point update c += (x - c) / n
+        self.centers[updated] += (sums[updated] - batch_counts[updated, None] * self.centers[updated]) / self.counts[updated, None]
+        return self
+
+    def _seed(self, X):
+        clusters = min(self.clusters, len(X))
+        centers = [X[self.rng.integers(len(X))]]
+        distances = ((X - centers[0]) ** 2).sum(axis=1)
+        for _ in range(clusters - 1):
+            total = distances.sum()
+            index = self.rng.choice(len(X), p=distances / total) if total > 0 else self.rng.integers(len(X))
+            centers.append(X[index])
+            distances = np.minimum(distances, ((X - X[index]) ** 2).sum(axis=1))
+        return np.array(centers, dtype=np.float64)
+
+    def _assign(self, X):
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2; |x|^2 does not change the argmin
+        return np.argmin((self.centers ** 2).sum(axis=1) - 2 * X @ self.centers.T, axis=1)
+
+    def predict(self, X):
+        """
+        Return the nearest center of each feature row.
+        """
+        return self._assign(self._scaled(X))
+
+    def decay(self, factor):
+        """
+        Scale down the weight of the points seen so far, so the next batches move the centers more.
+        """
+        if self.counts is not None:
+            self.counts *= factor
+
+class RFMBinner:
+    """
+    Quantile binning of recency, frequency and monetary value, with bin edges estimated
+    from a fixed-size reservoir sample of the members seen.
+    """
+    def __init__(self, bins=5, sample_size=100000, seed=0):
+        self.bins = bins
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(seed)
+        self.sample = np.zeros((0, 3))
+        self.seen = 0
+
+    def partial_fit(self, recency, frequency, monetary):
+        """
+        Add a batch of members with orders to the reservoir.
+        """
+        rows = np.column_stack([recency, frequency, monetary])
+        rows = rows[~np.isnan(rows).any(axis=1)]
+        room = self.sample_size - len(self.sample)
+        self.sample = np.vstack([self.sample, rows[:room]])
+        rest = rows[max(room, 0):]
+        if len(rest):
+            # Algorithm R: the i-th member seen replaces a random slot with probability size / i
+            positions = self.seen + max(room, 0) + np.arange(1, len(rest) + 1)
+            slots = (self.rng.random(len(rest)) * positions).astype(np.int64)
+            keep = slots < self.sample_size
+            self.sample[slots[keep]] = rest[keep]
+        self.seen += len(rows)
+        return self
+
+    def edges(self):
+        """
+        The inner bin edges of each of recency, frequency and monetary value.
+        """
+        quantiles = np.linspace(0, 1, self.bins + 1)[1:-1]
+        return np.quantile(self.sample, quantiles, axis=0).T if len(self.sample) else np.zeros((3, self.bins - 1))
+
+    def transform(self, recency, frequency, monetary):
+        """
+        Return the 1..bins score of each member for recency, frequency and monetary value
+        (higher is better, so recent members score high); 0 for members without orders.
+        """
+        edges = self.edges()
+        scores = np.zeros((len(recency), 3), dtype=np.int64)
+        for column, values in enumerate((recency, frequency, monetary)):
+            scores[:, column] = np.searchsorted(edges[column], values, side='right') + 1
+        scores[:, 0] = self.bins + 1 - scores[:, 0]
+        scores[np.isnan(recency)] = 0
+        return scores
+
+class CustomerSegmenter:
+    """
+    Streams members from Dgraph and assigns each a k-means segment and an RFM score.
+    """
+    def __init__(self, client, clusters=6, rfm_bins=5, batch_size=5000, page_size=1000, categories=None, now=None, seed=0):
+        """
+        :param client: A DgraphClient.
+        :param clusters: Number of k-means segments.
+        :param rfm_bins: Number of quantile bins per RFM dimension.
+        :param batch_size: Members per feature batch; bounds memory use.
+        :param page_size: Members per request.
+        :param categories: Product categories of the category-mix features (default: fetched from Dgraph).
+        :param now: Reference date for recency (default: today).
+        """
+        self.client = client
+        self.batch_size = batch_size
+        self.page_size = page_size
+        self.categories = categories
+        self.now = now if now is not None else np.datetime64('today', 'ms')
+        self.seed = seed
+        self.kmeans = MiniBatchKMeans(clusters, seed)
+        self.rfm = RFMBinner(rfm_bins, seed=seed)
+
+    def _batches(self):
+        if self.categories is None:
+            self.categories = fetch_categories(self.client)
+        for batch in iter_batches(self.client, self.batch_size, self.page_size):
+            yield MemberFeatures(batch, self.categories, self.now)
+
+    def fit(self, passes=1, decay=None):
+        """
+        Stream every member through the k-means and RFM models.
+
+        :param passes: Passes over the members; later passes refine the centers.
+        :param decay: Optional factor applied to the centers' past weight before each pass,
+                      e.g. 0.5 when refreshing an already fitted segmenter on newer data.
+        :return: self
+        """
+        for number in range(passes):
+            if decay is not None:
+                self.kmeans.decay(decay)
+            if number == 0:
+                # RFM edges describe the current data, so they are re-estimated rather than accumulated
+                self.rfm = RFMBinner(self.rfm.bins, self.rfm.sample_size, self.seed)
+            for features in self._batches():
+                self.kmeans.partial_fit(features.matrix())
+                if number == 0:
+                    self.rfm.partial_fit(features.recency_days, features.orders, features.spend)
+        return self
+
+    def refresh(self, decay=0.5):
+        """
+        Update the segments from the current data without starting over.
+        """
+        return self.fit(passes=1, decay=decay)
+
+    def segments(self):
+        """
+        Stream every member's assignment.
+
+        :return: A generator of (member id, segment, (R, F, M) scores) tuples.
+        """
+        for features in self._batches():
+            if not len(features.member_ids):
+                continue
+            labels = self.kmeans.predict(features.matrix())
+            scores = self.rfm.transform(features.recency_days, features.orders, features.spend)
+            for member_id, label, score in zip(features.member_ids.tolist(), labels.tolist(), scores.tolist()):
+                yield member_id, label, tuple(score)
+
+    def profiles(self):
+        """
+        Describe each segment's center in the original feature units.
+
+        :return: A list of dicts with 'members' (weight), 'orders', 'average_order_value', 'reviews' and 'category_mix'.
+        """
+        centers = self.kmeans.centers * self.kmeans.scale + self.kmeans.mean
+        return [{'members': float(count), 'orders': float(np.expm1(center[0])),
+                 'average_order_value': float(np.expm1(center[1])), 'reviews': float(np.expm1(center[2])),
+                 'category_mix': dict(zip(self.categories, np.clip(center[3:], 0, None).round(4).tolist()))}
+                for center, count in zip(centers, self.kmeans.counts)]
@@ -0,0 +1,175 @@
+# Incremental parsing of GraphQL JSON responses.
+# The elements of a result array such as `data.queryOrder` are yielded as
+# soon as their bytes arrive, so large responses never have to be held in
+# memory as a whole. ijson (with its C-backed yajl2 backend) is used when it
+# is installed; otherwise a pure-Python scanner built on json.JSONDecoder is used.
+
+import json
+import codecs
+
+from graphql_document import GraphQLError
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+def iter_items(chunks, path):
+    """
+    Yield the elements of the JSON array found at `path` in a streamed document.
+
+    :param chunks: An iterable of bytes chunks, e.g. `response.iter_content(65536)`.
+    :param path: The keys leading to the array, e.g. ('data', 'queryOrder').
+    :return: A generator of array elements.
+    :raises GraphQLError: If the document carries top-level GraphQL errors.
+    """
+    if ijson is not None:
+        return _iter_items_ijson(chunks, path)
+    return _iter_items_python(chunks, path)
+
+def _iter_items_ijson(chunks, path):
+    collector = _ItemCollector('.'.join(path) + '.item')
+    events = ijson.sendable_list()
+    parser = ijson.parse_coro(events, use_float=True)
+    for chunk in chunks:
+        parser.send(chunk)
+        yield from collector.feed(events)
+        del events[:]
+    parser.close()
+    yield from collector.feed(events)
+    if collector.errors:
+        raise GraphQLError(collector.errors)
+
+class _ItemCollector:
+    """
+    Turns ijson parse events into array items and top-level GraphQL errors.
+    An item may span several chunks, so the partially built item is kept between feeds.
+    """
+    def __init__(self, item_prefix):
+        self.item_prefix = item_prefix
+        self.errors = []
+        self.prefix = None
+        self.builder = None
+
+    def feed(self, events):
+        for prefix, event, value in events:
+            if self.builder is not None:
+                self.builder.event(event, value)
+                if prefix == self.prefix and event in ('end_map', 'end_array'):
+                    yield from self._emit(self.builder.value)
+                    self.builder = None
+            elif prefix in (self.item_prefix, 'errors.item'):
+                self.prefix = prefix
+                if event in ('start_map', 'start_array'):
+                    self.builder = ijson.ObjectBuilder()
+                    self.builder.event(event, value)
+                else:
+                    yield from self._emit(value)
+
+    def _emit(self, value):
+        if self.prefix == self.item_prefix:
+            yield value
+        else:
+            self.errors.append(value)
+
+class _Reader:
+    """
+    A character reader over a stream of byte chunks that can decode whole JSON values.
+    """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            return False
+        try:
+            text = self.decoder.decode(next(self.chunks))
+        except StopIteration:
+            text = self.decoder.decode(b'', final=True)
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return None
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("Expected %r in JSON stream" % char)
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and not isinstance(value, (dict, list, str)):
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+def _iter_items_python(chunks, path):
+    reader = _Reader(chunks)
+    errors = []
+    if reader.peek() is not None:
+        yield from _walk_object(reader, path, 0, errors)
+    if errors:
+        raise GraphQLError(errors)
+
+def _walk_object(reader, path, depth, errors):
+    if reader.peek() != '{':
+        reader.value()
+        return
+    reader.expect('{')
+    while True:
+        char = reader.peek()
+        if char == '}':
+            reader.pos += 1
+            return
+        if char == ',':
+            reader.pos += 1
+            continue
+        key = reader.value()
+        reader.expect(':')
+        if key == path[depth]:
+            if depth == len(path) - 1:
+                yield from _walk_array(reader)
+            else:
+                yield from _walk_object(reader, path, depth + 1, errors)
+        elif depth == 0 and key == 'errors':
+            errors.extend(reader.value() or [])
+        else:
+            reader.value()
+
+def _walk_array(reader):
+    if reader.peek() != '[':
+        reader.value()
+        return
+    reader.expect('[')
+    while True:
+        char = reader.peek()
+        if char == ']':
+            reader.pos += 1
+            return
+        if char == ',':
+            reader.pos += 1
+            continue
+        yield reader.value()
@@ -0,0 +1,415 @@
+# Multiplexed, resilient GraphQL subscriptions over a single websocket.
+# Many subscription operations share one `graphql-ws` connection, each with
+# its own operation id. Incoming messages are dispatched to the matching
+# subscription, which can be consumed as an async iterator or via a callback.
+# When the connection drops (or goes quiet past the keep-alive timeout) it is
+# re-opened with jittered exponential backoff and every live subscription is
+# started again. Each subscription buffers into a bounded queue whose overflow
+# policy decides what happens when its consumer falls behind. The reader never
+# waits on a consumer: callbacks, and payloads held back by the 'block'
+# policy, are delivered by a task of their own subscription, so one slow
+# consumer cannot stall the others or the keep-alive. That backlog has the
+# same bound and policy as the queue; under 'block', a subscription whose
+# backlog fills up too is failed and stopped.
+
+import json
+import time
+import random
+import asyncio
+import itertools
+from collections import deque
+
+import websockets
+
+from graphql_document import GraphQLError
+
+_COMPLETE = object()
+
+class QueueFull(Exception):
+    """
+    Raised by BoundedQueue.put_nowait when the queue is full under the 'block' policy.
+    """
+
+class BoundedQueue:
+    """
+    An asyncio queue with a size bound and an overflow policy:
+
+    - 'block': put() waits until the consumer makes room, pushing back on the producer
+      (for a subscription, on its own delivery task rather than on the shared connection,
+      until its backlog is full too).
+    - 'drop_oldest': the oldest queued item is discarded to make room.
+    - 'coalesce_latest': every queued item is discarded in favour of the newest one.
+      Dgraph sends the full result on each change, so the newest payload supersedes the others.
+    """
+    POLICIES = ('block', 'drop_oldest', 'coalesce_latest')
+
+    def __init__(self, maxsize=1000, policy='block'):
+        """
+        Initialize the BoundedQueue.
+
+        :param maxsize: Maximum number of queued items.
+        :param policy: One of POLICIES.
+        """
+        if policy not in self.POLICIES:
+            raise ValueError("Unknown overflow policy %r, expected one of %s" % (policy, ', '.join(self.POLICIES)))
+        self.maxsize = maxsize
+        self.policy = policy
+        # (item, is a control item) pairs; only data items count towards the bound
+        self.items = deque()
+        self.data = 0
+        self.dropped = 0
+        self.readable = asyncio.Event()
+        self.writable = asyncio.Event()
+        self.writable.set()
+
+    def qsize(self):
+        return len(self.items)
+
+    def full(self):
+        return self.data >= self.maxsize
+
+    def put_nowait(self, item, control=False):
+        """
+        Queue an item without waiting, applying the overflow policy when full.
+        The policies only ever discard data items, never queued control items.
+
+        :param control: Control items (errors, completion) bypass the size bound.
+        :raises QueueFull: If the queue is full and the policy is 'block'.
+        """
+        if not control and self.full():
+            if self.policy == 'block':
+                raise QueueFull()
+            if self.policy == 'drop_oldest':
+                oldest = next(index for index, (_, is_control) in enumerate(self.items) if not is_control)
+                del self.items[oldest]
+                self.data -= 1
+                self.dropped += 1
+            else:
+                self.dropped += self.data
+                self.items = deque(entry for entry in self.items if entry[1])
+                self.data = 0
+        self.items.append((item, control))
+        if not control:
+            self.data += 1
+        self.readable.set()
+        if self.full():
+            self.writable.clear()
+
+    async def put(self, item):
+        """
+        Queue an item, waiting for room first under the 'block' policy.
+        """
+        while self.policy == 'block' and self.full():
+            await self.writable.wait()
+        self.put_nowait(item)
+
+    async def get(self):
+        """
+        Remove and return the next item, waiting until one is available.
+        """
+        while not self.items:
+            await self.readable.wait()
+        item, control = self.items.popleft()
+        if not control:
+            self.data -= 1
+        if not self.items:
+            self.readable.clear()
+        if not self.full():
+            self.writable.set()
+        return item
+
+class Backoff:
+    """
+    Exponential backoff with full jitter: the n-th delay is drawn uniformly from [0, min(maximum, initial * factor**n)].
+    """
+    def __init__(self, initial=0.5, maximum=30.0, factor=2.0, rng=None):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.rng = rng or random.Random()
+
+    def delay(self, attempt):
+        """
+        Return the delay in seconds before the given retry attempt (starting at 0).
+        """
+        return self.rng.uniform(0, min(self.maximum, self.initial * self.factor ** attempt))
+
+class Subscription:
+    """
+    A live subscription on a SubscriptionManager connection.
+    Iterate over it with `async for payload in subscription` to receive each result payload.
+    """
+    def __init__(self, manager, operation_id, query, variables=None, callback=None, queue=None):
+        self.manager = manager
+        self.id = operation_id
+        self.query = query
+        self.variables = variables
+        self.callback = callback
+        self.queue = queue or BoundedQueue()
+        self.active = True
+        # Payloads waiting for the delivery task, bounded like the queue
+        self.backlog = BoundedQueue(self.queue.maxsize, self.queue.policy)
+        self.delivery = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.queue.get()
+        if item is _COMPLETE:
+            # Let other iterators waiting on the same subscription finish too
+            self.queue.put_nowait(_COMPLETE, control=True)
+            raise StopAsyncIteration
+        if isinstance(item, GraphQLError):
+            raise item
+        return item
+
+    async def stop(self):
+        """
+        Stop this subscription; the shared connection stays open for the others.
+        """
+        await self.manager.stop(self.id)
+
+    def _deliver(self, payload):
+        # Called from the connection's reader, which must never wait on a consumer: payloads that
+        # cannot be queued right away, and every callback call, go through this subscription's own task
+        if self.callback is None and not self._delivering():
+            try:
+                self.queue.put_nowait(payload)
+                return
+            except QueueFull:
+                pass
+        self._hold(payload)
+
+    def _hold(self, item, control=False):
+        try:
+            self.backlog.put_nowait(item, control)
+        except QueueFull:
+            self._overflow()
+            return
+        if self.delivery is None or self.delivery.done():
+            self.delivery = asyncio.ensure_future(self._drain())
+
+    def _overflow(self):
+        # Under 'block' the consumer is too far behind to keep up: stop only this subscription
+        self.manager.subscriptions.pop(self.id, None)
+        self._fail({'message': 'Subscription consumer fell behind by more than %d payloads' % self.backlog.maxsize})
+        self._complete()
+        asyncio.ensure_future(self.manager._send({'id': self.id, 'type': 'stop'}))
+
+    def _delivering(self):
+        return bool(self.backlog.qsize()) or (self.delivery is not None and not self.delivery.done())
+
+    async def _drain(self):
+        while self.backlog.qsize():
+            item = await self.backlog.get()
+            if item is _COMPLETE or isinstance(item, GraphQLError):
+                self.queue.put_nowait(item, control=True)
+            elif self.callback is None:
+                await self.queue.put(item)
+            else:
+                try:
+                    result = self.callback(item)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    self._fail({'message': 'Subscription callback failed: %r' % e})
+
+    def _control(self, item):
+        # Control items stay behind the payloads still waiting for delivery
+        if self._delivering():
+            self._hold(item, control=True)
+        else:
+            self.queue.put_nowait(item, control=True)
+
+    def _fail(self, errors):
+        self._control(GraphQLError(errors if isinstance(errors, list) else [errors]))
+
+    def _complete(self):
+        if self.active:
+            self.active = False
+            self._control(_COMPLETE)
+
+class SubscriptionManager:
+    """
+    Runs many GraphQL subscriptions over one `graphql-ws` websocket connection,
+    reconnecting and restarting them when the connection is lost.
+    """
+    def __init__(self, graphql_endpoint='http://localhost:8080/graphql', reconnect=True, backoff=None,
+                 keepalive_timeout=60, queue_size=1000, overflow='block', ping_interval=20):
+        """
+        Initialize the SubscriptionManager with the provided GraphQL endpoint.
+
+        :param graphql_endpoint: The GraphQL endpoint URL.
+        :param reconnect: Re-open the connection and restart every subscription when it drops.
+        :param backoff: Optional Backoff used between reconnection attempts.
+        :param keepalive_timeout: Seconds without any message (data or `ka`) after which the connection is considered dead.
+        :param queue_size: Size bound of each subscription's queue, and of the backlog of payloads waiting for it.
+        :param overflow: Overflow policy of each subscription's queue, see BoundedQueue.
+        :param ping_interval: Seconds between websocket ping frames.
+        """
+        self.url = graphql_endpoint.replace("http", "ws", 1)
+        self.reconnect = reconnect
+        self.backoff = backoff or Backoff()
+        self.keepalive_timeout = keepalive_timeout
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.ping_interval = ping_interval
+        self.websocket = None
+        self.reader = None
+        self.closing = False
+        self.subscriptions = {}
+        self.ids = itertools.count(1)
+        self.reconnects = 0
+        self.last_message_at = None
+
+    async def connect(self):
+        """
+        Open the websocket, complete the `connection_init` handshake and start consuming messages.
+        """
+        self.closing = False
+        await self._open()
+        self.reader = asyncio.ensure_future(self._run())
+
+    async def subscribe(self, query, variables=None, callback=None, overflow=None, queue_size=None):
+        """
+        Start a subscription on the shared connection.
+
+        :param query: The GraphQL subscription string.
+        :param variables: Optional variables for the subscription.
+        :param callback: Optional function (or coroutine function) called with each payload
+                         instead of queueing it for iteration.
+        :param overflow: Optional overflow policy overriding the manager default.
+        :param queue_size: Optional queue size overriding the manager default.
+        :return: The Subscription.
+        """
+        if self.reader is None:
+            await self.connect()
+        operation_id = str(next(self.ids))
+        queue = BoundedQueue(queue_size or self.queue_size, overflow or self.overflow)
+        subscription = Subscription(self, operation_id, query, variables, callback, queue)
+        self.subscriptions[operation_id] = subscription
+        await self._start(subscription)
+        return subscription
+
+    async def stop(self, operation_id):
+        """
+        Stop one subscription by id.
+        """
+        subscription = self.subscriptions.pop(operation_id, None)
+        if subscription is None:
+            return
+        subscription._complete()
+        await self._send({'id': operation_id, 'type': 'stop'})
+
+    async def close(self):
+        """
+        Stop every subscription and close the connection.
+        """
+        self.closing = True
+        for operation_id in list(self.subscriptions):
+            await self.stop(operation_id)
+        if self.websocket is not None:
+            await self._send({'type': 'connection_terminate'})
+            await self.websocket.close()
+            self.websocket = None
+        if self.reader is not None:
+            self.reader.cancel()
+            self.reader = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _open(self):
+        websocket = await websockets.connect(self.url, subprotocols=["graphql-ws"], ping_interval=self.ping_interval)
+        await websocket.send(json.dumps({'type': 'connection_init', 'payload': {}}))
+        while True:
+            message = json.loads(await asyncio.wait_for(websocket.recv(), self.keepalive_timeout))
+            if message.get('type') == 'connection_ack':
+                break
+            if message.get('type') == 'connection_error':
+                await websocket.close()
+                raise ConnectionError("Subscription connection rejected: %s" % message.get('payload'))
+        self.websocket = websocket
+        self.last_message_at = time.monotonic()
+
+    async def _send(self, message):
+        if self.websocket is None:
+            return
+        try:
+            await self.websocket.send(json.dumps(message))
+        except websockets.ConnectionClosed:
+            # The run loop notices the closed connection and restarts the subscriptions
+            pass
+
+    async def _start(self, subscription):
+        await self._send({
+            'id': subscription.id,
+            'type': 'start',
+            'payload': {
+                'query': subscription.query,
+                'variables': subscription.variables
+            }
+        })
+
+    async def _run(self):
+        while True:
+            try:
+                while True:
+                    raw = await asyncio.wait_for(self.websocket.recv(), self.keepalive_timeout)
+                    self.last_message_at = time.monotonic()
+                    self._dispatch(raw)
+            except (websockets.ConnectionClosed, asyncio.TimeoutError, OSError):
+                pass
+            if self.closing or not self.reconnect:
+                break
+            await self._reopen()
+            if self.closing:
+                break
+            for subscription in list(self.subscriptions.values()):
+                await self._start(subscription)
+        # The connection is gone for good, so no subscription will receive anything more
+        for subscription in self.subscriptions.values():
+            subscription._complete()
+
+    async def _reopen(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+            self.websocket = None
+        attempt = 0
+        while not self.closing:
+            await asyncio.sleep(self.backoff.delay(attempt))
+            try:
+                await self._open()
+                self.reconnects += 1
+                return
+            except (OSError, ConnectionError, asyncio.TimeoutError, websockets.WebSocketException):
+                attempt += 1
+
+    def _dispatch(self, raw):
+        try:
+            message = json.loads(raw)
+        except ValueError as e:
+            message = e
+        if not isinstance(message, dict):
+            # The message cannot be attributed to one subscription, so all of them hear about it
+            for subscription in self.subscriptions.values():
+                subscription._fail({'message': 'Invalid subscription message: %s' % message})
+            return
+        message_type = message.get('type')
+        if message_type == 'ka':
+            return
+        subscription = self.subscriptions.get(message.get('id'))
+        if subscription is None:
+            return
+        if message_type == 'data':
+            subscription._deliver(message.get('payload'))
+        elif message_type == 'error':
+            subscription._fail(message.get('payload'))
+        elif message_type == 'complete':
+            self.subscriptions.pop(subscription.id, None)
+            subscription._complete()
@@ -0,0 +1,405 @@
+# End-to-end benchmark of the bulk loader, every AnalysisAPI analysis and the subscription path
+# ------------------------------------------------------------------
+# Each scale runs in its own worker process against a fresh stub Dgraph server
+# (src/tests/dgraph_stub_server.py, also in its own process), so the memory
+# figures are the client's alone. Each stage reports how far its RSS peaked
+# above the RSS it started with, so one stage's peak is not attributed to the
+# next. Results are written as JSON, and a previous results file can be passed
+# with --compare to flag regressions.
+#
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests websockets aiohttp ijson numpy
+# python src/benchmarks/bench_analysis_engine.py --scales 1000,100000 --out results.json
+# python src/benchmarks/bench_analysis_engine.py --scales 1000,100000 --out new.json --compare results.json
+# deactivate
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import resource
+import threading
+import subprocess
+
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Add the backend and examples directories to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from analysis_engine import ANALYSES, AnalysisAPI, DgraphClient, HttpTransport
+from subscriptions import SubscriptionManager
+from create_mock_data import DgraphDataInserter
+from generate_synthetic_data import SyntheticDataGenerator
+
+STUB_SERVER = os.path.abspath(os.path.join(os.path.dirname(__file__), '../tests/dgraph_stub_server.py'))
+
+# Whether a larger value of each metric is an improvement or a regression
+HIGHER_IS_BETTER = {'throughput_per_s'}
+LOWER_IS_BETTER = {'p50_ms', 'p95_ms', 'p99_ms', 'bytes_sent', 'bytes_received', 'peak_rss_delta_kb', 'errors'}
+
+class ByteCounter:
+    """
+    Counts the request and response body bytes of every request made through a requests.Session.
+    """
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+
+    def attach(self, session):
+        session.hooks['response'].append(self._count)
+        return session
+
+    def _count(self, response, *args, **kwargs):
+        body = response.request.body or b''
+        self.sent += len(body)
+        self.received += len(response.content)
+
+class TimedInserter(DgraphDataInserter):
+    """
+    DgraphDataInserter that records the latency of every batch it sends.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    def send_batch(self, type_name, inputs):
+        started = time.perf_counter()
+        outcome = super().send_batch(type_name, inputs)
+        self.latencies.append(time.perf_counter() - started)
+        return outcome
+
+def _proc_status_kb(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return None
+
+def current_rss_kb():
+    """
+    Resident set size of this process now, in kilobytes, or None if it cannot be read.
+    """
+    if os.path.exists('/proc/self/status'):
+        return _proc_status_kb('VmRSS')
+    if psutil is not None:
+        return psutil.Process().memory_info().rss // 1024
+    return None
+
+def _reset_peak_rss():
+    # Linux resets the VmHWM high-water mark to the current RSS when "5" is written to clear_refs
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return _proc_status_kb('VmHWM') is not None
+    except OSError:
+        return False
+
+def _max_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+class StageMemory:
+    """
+    Measures how far the RSS of this process peaks above its level at the start of a stage.
+
+    On Linux the kernel's high-water mark is reset when the stage starts. Elsewhere a
+    background thread samples the current RSS (with psutil); without psutil the growth
+    of the process-wide peak is used, which misses peaks lower than an earlier one.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start = self.peak = 0
+        self.kernel_peak = False
+        self.sampler = None
+        self.done = threading.Event()
+
+    def __enter__(self):
+        self.kernel_peak = _reset_peak_rss()
+        self.start = current_rss_kb()
+        if self.start is None:
+            self.start = _max_rss_kb()
+        self.peak = self.start
+        if not self.kernel_peak and current_rss_kb() is not None:
+            self.sampler = threading.Thread(target=self._sample, daemon=True)
+            self.sampler.start()
+        return self
+
+    def _sample(self):
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, current_rss_kb())
+
+    def __exit__(self, *exc_info):
+        if self.kernel_peak:
+            self.peak = max(self.peak, _proc_status_kb('VmHWM'))
+        elif self.sampler is not None:
+            self.done.set()
+            self.sampler.join()
+            self.peak = max(self.peak, current_rss_kb())
+        else:
+            self.peak = max(self.peak, _max_rss_kb())
+
+    @property
+    def delta_kb(self):
+        return max(self.peak - self.start, 0)
+
+def summarize(latencies, elapsed, operations, counter=None, errors=0, memory=None):
+    """
+    Build the result of one benchmark stage.
+
+    :param latencies: Per-operation latencies in seconds.
+    :param elapsed: Wall-clock duration of the stage in seconds.
+    :param operations: Number of operations (records, requests or updates) completed.
+    :param counter: Optional ByteCounter that counted the bytes of the stage.
+    :param errors: Number of failed operations.
+    :param memory: The StageMemory that measured the stage.
+    """
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if len(latencies) else (0.0, 0.0, 0.0)
+    result = {
+        'operations': operations,
+        'elapsed_s': round(elapsed, 4),
+        'throughput_per_s': round(operations / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'errors': errors,
+        'peak_rss_delta_kb': memory.delta_kb if memory is not None else 0,
+    }
+    if counter is not None:
+        result['bytes_sent'] = counter.sent
+        result['bytes_received'] = counter.received
+    return result
+
+def bench_bulk_load(endpoint, generator, batch_size, workers):
+    """
+    Load the generated data set through the bulk inserter; throughput is in records per second.
+    """
+    counter = ByteCounter()
+    inserter = TimedInserter(endpoint, batch_size=batch_size, workers=workers)
+    counter.attach(inserter.session)
+    with StageMemory() as memory:
+        started = time.perf_counter()
+        reports = generator.insert(inserter)
+        elapsed = time.perf_counter() - started
+    inserted = sum(report.inserted for report in reports.values())
+    failed = sum(len(failure[1]) for report in reports.values() for failure in report.failures)
+    return summarize(inserter.latencies, elapsed, inserted, counter, errors=failed, memory=memory)
+
+def bench_analyses(endpoint, names, repeat, aggregate=False):
+    """
+    Run every analysis `repeat` times in sequence; throughput is in requests per second.
+    """
+    results = {}
+    for name in names:
+        counter = ByteCounter()
+        transport = HttpTransport()
+        counter.attach(transport.session)
+        analysis_api = AnalysisAPI(DgraphClient(endpoint, transport=transport), aggregate=aggregate)
+        latencies = []
+        errors = 0
+        with StageMemory() as memory:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                request_started = time.perf_counter()
+                response = getattr(analysis_api, name)()
+                latencies.append(time.perf_counter() - request_started)
+                errors += bool(response.get('errors'))
+                del response
+            elapsed = time.perf_counter() - started
+        results[name] = summarize(latencies, elapsed, repeat, counter, errors, memory)
+        transport.close()
+    return results
+
+def bench_subscription(endpoint, updates):
+    """
+    Measure the delay between a mutation being sent and the subscription delivering the changed result.
+    """
+    subscription_query = "subscription { aggregateOrder { count totalSum } }"
+    mutation = """
+    mutation AddOrder($input: [AddOrderInput!]!) {
+      addOrder(input: $input) { numUids }
+    }
+    """
+    client = DgraphClient(endpoint, transport=HttpTransport())
+
+    async def run():
+        latencies = []
+        received = 0
+        async with SubscriptionManager(endpoint) as manager:
+            subscription = await manager.subscribe(subscription_query)
+            payload = await subscription.__anext__()
+            received += len(json.dumps(payload))
+            count = payload['data']['aggregateOrder']['count']
+            loop = asyncio.get_running_loop()
+            started = time.perf_counter()
+            for index in range(updates):
+                order = {'orderId': 'bench-subscription-%d' % index, 'member': {'memberId': '1'},
+                         'products': [{'productId': '1'}], 'total': 1.0, 'date': '2024-01-01T00:00:00Z'}
+                sent = time.perf_counter()
+                await loop.run_in_executor(None, client.mutate, mutation, {'input': [order]})
+                # Wait for the snapshot that includes the new order
+                while True:
+                    payload = await asyncio.wait_for(subscription.__anext__(), 60)
+                    received += len(json.dumps(payload))
+                    if payload['data']['aggregateOrder']['count'] > count:
+                        break
+                count = payload['data']['aggregateOrder']['count']
+                latencies.append(time.perf_counter() - sent)
+            elapsed = time.perf_counter() - started
+        return latencies, elapsed, received
+
+    with StageMemory() as memory:
+        latencies, elapsed, received = asyncio.run(run())
+    result = summarize(latencies, elapsed, len(latencies), memory=memory)
+    result['bytes_received'] = received
+    return result
+
+def start_stub_server(latency):
+    """
+    Start the stub Dgraph server in its own process and return (process, endpoint).
+    """
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen([sys.executable, STUB_SERVER, '--port', str(port), '--latency', str(latency)],
+                               stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("The stub server did not start")
+            time.sleep(0.05)
+    return process, 'http://127.0.0.1:%d/graphql' % port
+
+def run_scale(orders, args):
+    """
+    Run every stage at one scale and return its results.
+    """
+    generator = SyntheticDataGenerator(members=max(orders // 10, 10), products=max(orders // 200, 50),
+                                       orders=orders, seed=args.seed)
+    names = args.analyses.split(',') if args.analyses else [name for name, _ in ANALYSES]
+    process, endpoint = start_stub_server(args.latency)
+    try:
+        return {
+            'bulk_load': bench_bulk_load(endpoint, generator, args.batch_size, args.workers),
+            'analyses': bench_analyses(endpoint, names, args.repeat, args.aggregate),
+            'subscription': bench_subscription(endpoint, args.updates),
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+def flatten(results):
+    """
+    Yield (scale, stage, metric, value) for every metric in a results document.
+    """
+    for scale, stages in results['scales'].items():
+        for stage, result in stages.items():
+            entries = result.items() if stage == 'analyses' else [(None, result)]
+            for name, metrics in entries:
+                label = stage if name is None else '%s.%s' % (stage, name)
+                for metric, value in metrics.items():
+                    yield scale, label, metric, value
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Compare two results documents and return the regressions.
+
+    :param baseline: The results of the reference run.
+    :param current: The results of the new run.
+    :param threshold: Relative change beyond which a metric counts as regressed (0.1 is 10%).
+    :return: A list of (scale, stage, metric, baseline value, current value, relative change).
+    """
+    reference = {(scale, stage, metric): value for scale, stage, metric, value in flatten(baseline)}
+    regressions = []
+    for scale, stage, metric, value in flatten(current):
+        old = reference.get((scale, stage, metric))
+        if old is None or metric not in HIGHER_IS_BETTER | LOWER_IS_BETTER:
+            continue
+        if old == 0:
+            change = float('inf') if value > 0 else 0.0
+        else:
+            change = (value - old) / old
+        if (metric in HIGHER_IS_BETTER and change < -threshold) or (metric in LOWER_IS_BETTER and change > threshold):
+            regressions.append((scale, stage, metric, old, value, change))
+    return regressions
+
+def print_results(results):
+    for scale, stages in results['scales'].items():
+        print("\n== %s orders ==" % scale)
+        rows = [('bulk_load', stages['bulk_load']), ('subscription', stages['subscription'])]
+        rows += sorted(stages['analyses'].items())
+        print("%-34s %12s %10s %10s %10s %12s %8s" % ('stage', 'ops/s', 'p50 ms', 'p95 ms', 'p99 ms', 'bytes in', 'errors'))
+        for label, result in rows:
+            print("%-34s %12.1f %10.2f %10.2f %10.2f %12d %8d" % (
+                label, result['throughput_per_s'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                result.get('bytes_received', 0), result['errors']))
+        print("largest RSS growth of a stage: %d KB" % max(result['peak_rss_delta_kb'] for _, result in rows))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the bulk loader, the analyses and subscriptions against a stub Dgraph server.')
+    parser.add_argument('--scales', default='1000,100000,1000000', help='Comma-separated numbers of orders')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of each analysis per scale')
+    parser.add_argument('--updates', type=int, default=20, help='Mutations sent through the subscription path')
+    parser.add_argument('--analyses', help='Comma-separated analysis names; all of them by default')
+    parser.add_argument('--aggregate', action='store_true', help='Run the analyses with aggregation pushdown')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of latency injected by the stub server')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Results JSON of a previous run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative change flagged as a regression')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        # Worker mode: run one scale and report it on stdout
+        print(json.dumps(run_scale(args.worker, args)))
+        sys.exit(0)
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'arguments': {key: value for key, value in vars(args).items() if key not in ('out', 'compare', 'worker')},
+        },
+        'scales': {},
+    }
+    for scale in [int(value) for value in args.scales.split(',')]:
+        command = [sys.executable, os.path.abspath(__file__), '--worker', str(scale)] + [
+            argument for key in ('repeat', 'updates', 'latency', 'batch_size', 'workers', 'seed', 'analyses')
+            if getattr(args, key) is not None
+            for argument in ('--' + key.replace('_', '-'), str(getattr(args, key)))] + (['--aggregate'] if args.aggregate else [])
+        print("Running %d orders..." % scale, file=sys.stderr)
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE).stdout
+        results['scales'][str(scale)] = json.loads(output)
+
+    print_results(results)
+    if args.out:
+        with open(args.out, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(json.load(file), results, args.threshold)
+        for scale, stage, metric, old, new, change in regressions:
+            print("REGRESSION %s orders, %s, %s: %s -> %s (%+.1f%%)" % (scale, stage, metric, old, new, change * 100))
+        if regressions:
+            sys.exit(1)
+        print("No regressions beyond %.0f%%" % (args.threshold * 100))
@@ -0,0 +1,91 @@
+# Benchmark requests/second of DgraphClient.query with and without the pooled transport
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests websockets
+# python src/benchmarks/bench_http_pooling.py --requests 2000 --threads 8
+# deactivate
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+from analysis_engine import DgraphClient, HttpTransport
+
+RESPONSE_BODY = json.dumps({
+    'data': {'queryMember': [{'memberId': str(i), 'name': 'Member %d' % i} for i in range(20)]}
+}).encode()
+
+class StubGraphQLHandler(BaseHTTPRequestHandler):
+    """
+    Minimal HTTP/1.1 handler that answers every POST with a fixed GraphQL response.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        StubGraphQLHandler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(RESPONSE_BODY)))
+        self.end_headers()
+        self.wfile.write(RESPONSE_BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+class UnpooledClient(DgraphClient):
+    """
+    DgraphClient that opens a fresh connection per request, as the original implementation did.
+    """
+    def query(self, query, variables=None):
+        response = requests.post(self.graphql_endpoint, json={'query': query, 'variables': variables})
+        return response.json()
+
+def run(client, total_requests, threads):
+    """
+    Issue total_requests queries from the given number of threads and return requests/second.
+    """
+    query = "query { queryMember { memberId name } }"
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda _: client.query(query), range(total_requests)))
+    return total_requests / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare pooled and unpooled DgraphClient throughput.')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubGraphQLHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = 'http://127.0.0.1:%d/graphql' % server.server_address[1]
+
+    results = {}
+    for label, client in [
+        ('unpooled', UnpooledClient(endpoint)),
+        ('pooled', DgraphClient(endpoint, transport=HttpTransport(pool_maxsize=args.threads))),
+    ]:
+        StubGraphQLHandler.connections = 0
+        rps = run(client, args.requests, args.threads)
+        results[label] = {'requests_per_second': round(rps, 1), 'connections_opened': StubGraphQLHandler.connections}
+        print("%-9s %10.1f req/s  %6d connections" % (label, rps, StubGraphQLHandler.connections))
+
+    print("Speedup: %.2fx" % (results['pooled']['requests_per_second'] / results['unpooled']['requests_per_second']))
+    server.shutdown()
@@ -16,9 +16,11 @@ class DgraphClient:
     DgraphClient manages interactions with the Dgraph GraphQL API.
     It includes methods for querying, mutating, and subscribing to the GraphQL endpoint.
     """
-    def __init__(self, graphql_endpoint='http://localhost:8080/graphql'):
+    def __init__(self, graphql_endpoint='http://localhost:8080/graphql', cache=None):
         self.graphql_endpoint = graphql_endpoint
         self.stop_event = asyncio.Event()
+        # Optional result cache shared with the query side (see src/backend/result_cache.py)
+        self.cache = cache
 
     def query(self, query, variables=None):
         """
@@ -40,6 +42,9 @@ class DgraphClient:
         :return: JSON response from the API.
         """
         response = requests.post(self.graphql_endpoint, json={'query': mutation, 'variables': variables})
+        if self.cache is not None:
+            # Drop cached query results that read the Order/Review/... types this mutation writes
+            self.cache.invalidate_mutation(mutation)
         return response.json()
 
     async def subscribe(self, subscription, variables=None):
@@ -13,10 +13,39 @@
 # deactivate
 
 
+import time
 import uuid
 import json
+import itertools
 import requests
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from requests.adapters import HTTPAdapter
+
+class BulkInsertReport:
+    """
+    The outcome of a bulk insert.
+    
+    Attributes:
+    inserted (int): Number of records in batches that were committed.
+    batches (int): Number of batches sent.
+    retries (int): Number of batch attempts that were retried.
+    failures (list): One (batch_index, records, error) tuple per batch that failed after all retries.
+    """
+
+    def __init__(self):
+        self.inserted = 0
+        self.batches = 0
+        self.retries = 0
+        self.failures = []
+
+    @property
+    def failed(self):
+        return sum(len(records) for _, records, _ in self.failures)
+
+    def __repr__(self):
+        return 'BulkInsertReport(inserted=%d, batches=%d, retries=%d, failed=%d)' % (
+            self.inserted, self.batches, self.retries, self.failed)
 
 class DgraphDataInserter:
     """
@@ -30,16 +59,34 @@ class DgraphDataInserter:
     insert_product(product_id, name, description, price, category): Inserts a product into the database.
     insert_order(order_id, member_id, product_ids, total, date): Inserts an order into the database.
     insert_review(review_id, rating, comment, member_id, product_id, date): Inserts a review into the database.
+    insert_members_bulk(members): Inserts many members in batched, parallel mutations.
+    insert_products_bulk(products): Inserts many products in batched, parallel mutations.
+    insert_orders_bulk(orders): Inserts many orders in batched, parallel mutations.
+    insert_reviews_bulk(reviews): Inserts many reviews in batched, parallel mutations.
     """
 
-    def __init__(self, graphql_endpoint='http://localhost:8080/graphql'):
+    def __init__(self, graphql_endpoint='http://localhost:8080/graphql', batch_size=500, workers=4, max_retries=3, timeout=60):
         """
         Initializes the DgraphDataInserter with the GraphQL endpoint.
         
         Parameters:
         graphql_endpoint (str): The endpoint URL for the Dgraph GraphQL API.
+        batch_size (int): Number of records sent per mutation by the bulk methods.
+        workers (int): Number of batches the bulk methods send in parallel.
+        max_retries (int): Number of times a failed batch is retried.
+        timeout (float): Seconds to wait for each bulk request before it counts as failed and is retried.
         """
         self.graphql_endpoint = graphql_endpoint
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.retry_delay = 0.5
+        # Bulk batches are sent over pooled keep-alive connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
     def insert_member(self, member_id, name, email):
         """
@@ -203,6 +250,192 @@ class DgraphDataInserter:
         return response.json()
 
 
+    @staticmethod
+    def member_input(member_id, name, email):
+        """
+        Builds the AddMemberInput object for one member, as used by the bulk methods.
+        """
+        return {"memberId": member_id, "name": name, "email": email}
+
+    @staticmethod
+    def product_input(product_id, name, description, price, category):
+        """
+        Builds the AddProductInput object for one product, as used by the bulk methods.
+        """
+        return {"productId": product_id, "name": name, "description": description, "price": price, "category": category}
+
+    @staticmethod
+    def order_input(order_id, member_id, product_ids, total, date):
+        """
+        Builds the AddOrderInput object for one order, as used by the bulk methods.
+        """
+        return {
+            "orderId": order_id,
+            "member": {"memberId": member_id},
+            "products": [{"productId": pid} for pid in product_ids],
+            "total": total,
+            "date": date.isoformat() if isinstance(date, datetime) else date
+        }
+
+    @staticmethod
+    def review_input(review_id, rating, comment, member_id, product_id, date):
+        """
+        Builds the AddReviewInput object for one review, as used by the bulk methods.
+        """
+        return {
+            "reviewId": review_id,
+            "rating": rating,
+            "comment": comment,
+            "member": {"memberId": member_id},
+            "product": {"productId": product_id},
+            "date": date.isoformat() if isinstance(date, datetime) else date
+        }
+
+    def insert_members_bulk(self, members, batch_size=None, on_batch=None):
+        """
+        Inserts many members using batched addMember mutations sent in parallel.
+        
+        Parameters:
+        members (iterable): (member_id, name, email) tuples, or dicts with those keyword names.
+        batch_size (int): Optional number of records per mutation, overriding the default.
+        on_batch (callable): Optional function called with (records, error) as each batch completes.
+        
+        Returns:
+        BulkInsertReport: The number of inserted records and the batches that failed.
+        """
+        return self._insert_bulk('Member', self.member_input, members, batch_size, on_batch)
+
+    def insert_products_bulk(self, products, batch_size=None, on_batch=None):
+        """
+        Inserts many products using batched addProduct mutations sent in parallel.
+        
+        Parameters:
+        products (iterable): (product_id, name, description, price, category) tuples, or dicts with those keyword names.
+        batch_size (int): Optional number of records per mutation, overriding the default.
+        on_batch (callable): Optional function called with (records, error) as each batch completes.
+        
+        Returns:
+        BulkInsertReport: The number of inserted records and the batches that failed.
+        """
+        return self._insert_bulk('Product', self.product_input, products, batch_size, on_batch)
+
+    def insert_orders_bulk(self, orders, batch_size=None, on_batch=None):
+        """
+        Inserts many orders using batched addOrder mutations sent in parallel.
+        The referenced members and products must already exist.
+        
+        Parameters:
+        orders (iterable): (order_id, member_id, product_ids, total, date) tuples, or dicts with those keyword names.
+        batch_size (int): Optional number of records per mutation, overriding the default.
+        on_batch (callable): Optional function called with (records, error) as each batch completes.
+        
+        Returns:
+        BulkInsertReport: The number of inserted records and the batches that failed.
+        """
+        return self._insert_bulk('Order', self.order_input, orders, batch_size, on_batch)
+
+    def insert_reviews_bulk(self, reviews, batch_size=None, on_batch=None):
+        """
+        Inserts many reviews using batched addReview mutations sent in parallel.
+        The referenced members and products must already exist.
+        
+        Parameters:
+        reviews (iterable): (review_id, rating, comment, member_id, product_id, date) tuples, or dicts with those keyword names.
+        batch_size (int): Optional number of records per mutation, overriding the default.
+        on_batch (callable): Optional function called with (records, error) as each batch completes.
+        
+        Returns:
+        BulkInsertReport: The number of inserted records and the batches that failed.
+        """
+        return self._insert_bulk('Review', self.review_input, reviews, batch_size, on_batch)
+
+    def send_batch(self, type_name, inputs):
+        """
+        Sends one batch of inputs as a single add mutation, retrying transient failures.
+        Only failures where the batch cannot have been applied (connection errors, HTTP 502, 503
+        and 504) are retried; a retry answered with "already exists" counts as committed.
+        
+        Parameters:
+        type_name (str): The schema type, e.g. 'Order'.
+        inputs (list): The Add<Type>Input objects of the batch.
+        
+        Returns:
+        tuple: (error, retries), where error is None if the batch was committed.
+        """
+        # Only numUids is selected, so the response stays small whatever the batch size
+        mutation = """
+        mutation Add%(type)ss($input: [Add%(type)sInput!]!) {
+          add%(type)s(input: $input) {
+            numUids
+          }
+        }
+        """ % {'type': type_name}
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+            try:
+                response = self.session.post(self.graphql_endpoint, json={'query': mutation, 'variables': {'input': inputs}},
+                                             timeout=self.timeout)
+            except requests.ConnectionError as e:
+                # Includes connect timeouts: the batch most likely never reached Dgraph
+                error = str(e)
+                continue
+            except requests.RequestException as e:
+                # e.g. a read timeout: the mutation may have been applied, so it is not resent
+                return str(e), attempt
+            if response.status_code in (502, 503, 504):
+                error = 'HTTP %d' % response.status_code
+                continue
+            try:
+                body = response.json()
+            except ValueError:
+                # e.g. an HTML error page from a proxy; the mutation may have been applied, so it is not resent
+                return 'HTTP %d: response is not JSON' % response.status_code, attempt
+            if not isinstance(body, dict):
+                return 'HTTP %d: unexpected response' % response.status_code, attempt
+            if body.get('errors'):
+                if attempt and all('already exists' in str(entry.get('message')) for entry in body['errors']):
+                    # An earlier attempt was committed but its response was lost
+                    return None, attempt
+                # GraphQL errors (e.g. invalid input) are not transient, so the batch is not retried
+                return body['errors'], attempt
+            return None, attempt
+        return error, self.max_retries
+
+    def _insert_bulk(self, type_name, build_input, records, batch_size, on_batch=None):
+        batch_size = batch_size or self.batch_size
+        report = BulkInsertReport()
+        rows = iter(records)
+        batches = iter(lambda: list(itertools.islice(rows, batch_size)), [])
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {}
+            # Keep a bounded number of batches in flight so the input is consumed as a stream
+            for index, batch in enumerate(batches):
+                inputs = [build_input(**record) if isinstance(record, dict) else build_input(*record) for record in batch]
+                pending[executor.submit(self.send_batch, type_name, inputs)] = (index, batch)
+                if len(pending) >= self.workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._record(report, pending.pop(future), future.result(), on_batch)
+            for future in list(pending):
+                self._record(report, pending.pop(future), future.result(), on_batch)
+        return report
+
+    @staticmethod
+    def _record(report, batch_info, outcome, on_batch):
+        index, batch = batch_info
+        error, retries = outcome
+        if on_batch is not None:
+            on_batch(batch, error)
+        report.batches += 1
+        report.retries += retries
+        if error is None:
+            report.inserted += len(batch)
+        else:
+            report.failures.append((index, batch, error))
+
+
 def standard_example(dgraph_data_inserter):
     # Example of inserting a member
     print(dgraph_data_inserter.insert_member('1', 'Alice', 'alice@example.com'))
@@ -231,8 +464,7 @@ def create_10_members(dgraph_data_inserter):
         ('10', 'Jack', 'jack@example.com')
     ]
 
-    for member_id, name, email in members:
-        dgraph_data_inserter.insert_member(member_id, name, email)
+    print(dgraph_data_inserter.insert_members_bulk(members))
 
 def create_20_products(dgraph_data_inserter):
     # Insert 20 products
@@ -259,8 +491,7 @@ def create_20_products(dgraph_data_inserter):
         ('20', 'Hand Cream', 'A nourishing hand cream', 7.99, 'Skincare')
     ]
 
-    for product_id, name, description, price, category in products:
-        dgraph_data_inserter.insert_product(product_id, name, description, price, category)
+    print(dgraph_data_inserter.insert_products_bulk(products))
 
 def create_15_orders(dgraph_data_inserter):
     # Insert 15 orders
@@ -282,8 +513,7 @@ def create_15_orders(dgraph_data_inserter):
         ('15', '5', ['13', '15', '17'], 67.97, datetime.now())
     ]
 
-    for order_id, member_id, product_ids, total, date in orders:
-        dgraph_data_inserter.insert_order(order_id, member_id, product_ids, total, date)
+    print(dgraph_data_inserter.insert_orders_bulk(orders))
 
 def create_25_reviews(dgraph_data_inserter):
     # Insert 25 reviews
@@ -315,8 +545,7 @@ def create_25_reviews(dgraph_data_inserter):
         ('25', 5, 'Love it!', '5', '5', datetime.now())
     ]
 
-    for review_id, rating, comment, member_id, product_id, date in reviews:
-        dgraph_data_inserter.insert_review(review_id, rating, comment, member_id, product_id, date)
+    print(dgraph_data_inserter.insert_reviews_bulk(reviews))
 
 # Usage
 if __name__ == '__main__':
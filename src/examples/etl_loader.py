@@ -0,0 +1,307 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests
+# deactivate
+
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+from create_mock_data import DgraphDataInserter
+
+# The types each type references, and where the references are found in its records.
+# A reference is (field name, tuple position, referenced type, is a list).
+DEPENDENCIES = {
+    'Member': [],
+    'Product': [],
+    'Order': [('member_id', 1, 'Member', False), ('product_ids', 2, 'Product', True)],
+    'Review': [('member_id', 3, 'Member', False), ('product_id', 4, 'Product', False)],
+}
+
+# The id field of each type's records, and the insert method that loads them
+ID_FIELDS = {'Member': 'member_id', 'Product': 'product_id', 'Order': 'order_id', 'Review': 'review_id'}
+BULK_METHODS = {
+    'Member': 'insert_members_bulk',
+    'Product': 'insert_products_bulk',
+    'Order': 'insert_orders_bulk',
+    'Review': 'insert_reviews_bulk',
+}
+
+def load_order(dependencies=DEPENDENCIES):
+    """
+    Group types into dependency levels: every type only references types of earlier levels.
+
+    Parameters:
+    dependencies (dict): The references of each type, as in DEPENDENCIES.
+
+    Returns:
+    list: Lists of type names, e.g. [['Member', 'Product'], ['Order', 'Review']].
+    """
+    remaining = {type_name: {ref[2] for ref in refs} for type_name, refs in dependencies.items()}
+    levels = []
+    while remaining:
+        level = sorted(type_name for type_name, refs in remaining.items() if not refs & set(remaining))
+        if not level:
+            raise ValueError("Circular dependency between %s" % ', '.join(sorted(remaining)))
+        levels.append(level)
+        for type_name in level:
+            del remaining[type_name]
+    return levels
+
+def _field(record, name, position):
+    return record[name] if isinstance(record, dict) else record[position]
+
+def _record_id(record, type_name):
+    return _field(record, ID_FIELDS[type_name], 0)
+
+class _Waiter:
+    """
+    A held-back record and the number of its references that are not committed yet.
+    """
+    __slots__ = ('record', 'missing', 'queue')
+
+    def __init__(self, record, missing, queue):
+        self.record = record
+        self.missing = missing
+        self.queue = queue
+
+class _ReleaseQueue:
+    """
+    The records of one dependent type that are ready to send, rejected, or still held back.
+    """
+    def __init__(self, rejected):
+        self.ready = deque()
+        self.rejected = rejected
+        self.held = 0
+
+class _CommitTracker:
+    """
+    Tracks which ids of each type are committed, failed, or still on their way.
+
+    Held-back records are indexed by each (type, id) they still wait for, so a
+    commit releases exactly the records it completes instead of rescanning them all.
+    """
+    def __init__(self):
+        self.committed = {type_name: set() for type_name in DEPENDENCIES}
+        self.failed = {type_name: set() for type_name in DEPENDENCIES}
+        self.finished = set()
+        self.waiters = {}
+        self.condition = threading.Condition()
+
+    def record(self, type_name, ids, ok):
+        with self.condition:
+            (self.committed if ok else self.failed)[type_name].update(ids)
+            for ref_id in ids:
+                for waiter in self.waiters.pop((type_name, ref_id), ()):
+                    self._satisfy(waiter) if ok else self._fail(waiter)
+            self.condition.notify_all()
+
+    def finish(self, type_name):
+        with self.condition:
+            self.finished.add(type_name)
+            # The load of that type is over: whatever still waits on it will never be committed
+            for key in [key for key in self.waiters if key[0] == type_name]:
+                for waiter in self.waiters.pop(key):
+                    self._fail(waiter)
+            self.condition.notify_all()
+
+    def hold(self, record, refs, queue):
+        """
+        Queue a record for release once all its references (a list of (type, id)) are committed.
+        """
+        with self.condition:
+            missing = set()
+            for type_name, ref_id in refs:
+                if ref_id in self.committed[type_name]:
+                    continue
+                if ref_id in self.failed[type_name] or type_name in self.finished:
+                    queue.rejected.append((record, 'referenced record failed to load'))
+                    return
+                missing.add((type_name, ref_id))
+            if not missing:
+                queue.ready.append(record)
+                return
+            waiter = _Waiter(record, len(missing), queue)
+            queue.held += 1
+            for key in missing:
+                self.waiters.setdefault(key, []).append(waiter)
+
+    @staticmethod
+    def _satisfy(waiter):
+        if waiter.missing:
+            waiter.missing -= 1
+            if not waiter.missing:
+                waiter.queue.held -= 1
+                waiter.queue.ready.append(waiter.record)
+
+    @staticmethod
+    def _fail(waiter):
+        # A waiter is rejected once, on its first failed reference
+        if waiter.missing:
+            waiter.missing = 0
+            waiter.queue.held -= 1
+            waiter.queue.rejected.append((waiter.record, 'referenced record failed to load'))
+
+    def take(self, queue, block):
+        """
+        Remove and return the ready records of a queue; with block, wait until there is one or none is held.
+        """
+        with self.condition:
+            if block:
+                self.condition.wait_for(lambda: queue.ready or not queue.held)
+            ready = list(queue.ready)
+            queue.ready.clear()
+            return ready
+
+class EtlLoader:
+    """
+    Loads members, products, orders and reviews in dependency order.
+
+    Independent types are loaded in parallel, and each order or review is sent
+    as soon as the member and products it references are committed, rather than
+    after the whole parent load finishes. References are checked against an
+    in-memory id set (the incoming streams plus, optionally, the ids already in
+    Dgraph), so dangling references are rejected before any network call.
+
+    Methods:
+    load(members, products, orders, reviews): Runs the pipeline and returns a report per type.
+    """
+
+    def __init__(self, inserter=None, prefetch_existing=True, max_pending=100000, page_size=10000):
+        """
+        Initializes the EtlLoader.
+
+        Parameters:
+        inserter (DgraphDataInserter): The inserter used for the bulk loads.
+        prefetch_existing (bool): Whether ids already stored in Dgraph count as valid references.
+        max_pending (int): Maximum number of records held back while waiting for their references.
+        page_size (int): Page size used when prefetching existing ids.
+        """
+        self.inserter = inserter or DgraphDataInserter()
+        self.prefetch_existing = prefetch_existing
+        self.max_pending = max_pending
+        self.page_size = page_size
+
+    def fetch_existing_ids(self, type_name):
+        """
+        Fetches every id of a type already stored in Dgraph, page by page.
+
+        Parameters:
+        type_name (str): The schema type, e.g. 'Member'.
+
+        Returns:
+        set: The ids.
+
+        Raises:
+        requests.RequestException: If a request fails or returns an HTTP error.
+        RuntimeError: If Dgraph answers with GraphQL errors or no data.
+        """
+        id_field = type_name[0].lower() + type_name[1:] + 'Id'
+        query = "query($first: Int, $offset: Int) { query%s(first: $first, offset: $offset) { %s } }" % (type_name, id_field)
+        ids = set()
+        offset = 0
+        while True:
+            response = self.inserter.session.post(self.inserter.graphql_endpoint, json={
+                'query': query, 'variables': {'first': self.page_size, 'offset': offset}}, timeout=self.inserter.timeout)
+            response.raise_for_status()
+            body = response.json()
+            if body.get('errors') or body.get('data') is None:
+                raise RuntimeError('Fetching existing %s ids failed: %s' % (type_name, body.get('errors') or 'no data'))
+            rows = body['data'].get('query' + type_name) or []
+            ids.update(row[id_field] for row in rows)
+            if len(rows) < self.page_size:
+                return ids
+            offset += len(rows)
+
+    def load(self, members=(), products=(), orders=(), reviews=()):
+        """
+        Loads the four record streams into Dgraph.
+
+        Parameters:
+        members, products, orders, reviews (iterable): Records in the format accepted by
+            the matching DgraphDataInserter bulk method. Members and products are read
+            fully up front to build the id set; orders and reviews are streamed.
+
+        Returns:
+        dict: For each type, {'report': BulkInsertReport, 'rejected': [(record, reason), ...]}.
+        """
+        streams = {'Member': members, 'Product': products, 'Order': orders, 'Review': reviews}
+        tracker = _CommitTracker()
+        known = {type_name: set() for type_name in DEPENDENCIES}
+        # Referenced types are read up front so their ids can be checked before anything is sent
+        for type_name in sorted({ref[2] for refs in DEPENDENCIES.values() for ref in refs}):
+            streams[type_name] = list(streams[type_name])
+            known[type_name].update(_record_id(record, type_name) for record in streams[type_name])
+            if self.prefetch_existing:
+                existing = self.fetch_existing_ids(type_name)
+                known[type_name].update(existing)
+                tracker.record(type_name, existing, True)
+
+        results = {type_name: {'report': None, 'rejected': []} for type_name in DEPENDENCIES}
+
+        def run(type_name):
+            records = streams[type_name]
+            if DEPENDENCIES[type_name]:
+                records = self._release(type_name, records, known, tracker, results[type_name]['rejected'])
+            method = getattr(self.inserter, BULK_METHODS[type_name])
+
+            def on_batch(batch, error):
+                tracker.record(type_name, [_record_id(record, type_name) for record in batch], error is None)
+
+            try:
+                results[type_name]['report'] = method(records, on_batch=on_batch)
+            finally:
+                tracker.finish(type_name)
+
+        # Every level is started at once: dependent types wait per record, not per level
+        types = [type_name for level in load_order() for type_name in level]
+        with ThreadPoolExecutor(max_workers=len(types)) as executor:
+            for future in [executor.submit(run, type_name) for type_name in types]:
+                future.result()
+        return results
+
+    def _release(self, type_name, records, known, tracker, rejected):
+        """
+        Yields the records whose references are committed, holding back the others.
+        """
+        references = DEPENDENCIES[type_name]
+
+        def refs_of(record):
+            refs = []
+            for name, position, ref_type, is_list in references:
+                value = _field(record, name, position)
+                refs.extend((ref_type, ref_id) for ref_id in (value if is_list else [value]))
+            return refs
+
+        queue = _ReleaseQueue(rejected)
+        for record in records:
+            refs = refs_of(record)
+            dangling = [ref for ref in refs if ref[1] not in known[ref[0]]]
+            if dangling:
+                rejected.append((record, 'unknown %s %s' % dangling[0]))
+                continue
+            tracker.hold(record, refs, queue)
+            yield from tracker.take(queue, block=queue.held >= self.max_pending)
+        while True:
+            ready = tracker.take(queue, block=True)
+            if not ready:
+                return
+            yield from ready
+
+
+# Usage
+if __name__ == '__main__':
+    from datetime import datetime
+
+    loader = EtlLoader(DgraphDataInserter(batch_size=1000, workers=8))
+    results = loader.load(
+        members=[('1', 'Alice', 'alice@example.com'), ('2', 'Bob', 'bob@example.com')],
+        products=[('1', 'Lipstick', 'A red lipstick', 15.99, 'Beauty')],
+        orders=[('1', '1', ['1'], 15.99, datetime.now()), ('2', '3', ['1'], 15.99, datetime.now())],
+        reviews=[('1', 5, 'Great product!', '2', '1', datetime.now())],
+    )
+    for type_name, result in results.items():
+        print(type_name, result['report'], result['rejected'])
@@ -0,0 +1,315 @@
+# Generate realistic synthetic members, products, orders and reviews at scale
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests numpy
+# python generate_synthetic_data.py --members 1000000 --products 50000 --orders 10000000 --out data/
+# python generate_synthetic_data.py --members 10000 --products 500 --orders 100000 --endpoint http://localhost:8080/graphql
+# deactivate
+
+import os
+import gzip
+import json
+import time
+import argparse
+
+import numpy as np
+
+from create_mock_data import DgraphDataInserter
+
+FIRST_NAMES = np.array(['Alice', 'Bob', 'Charlie', 'David', 'Eve', 'Frank', 'Grace', 'Hannah', 'Ivan', 'Judy',
+                        'Karen', 'Leo', 'Mia', 'Noah', 'Olivia', 'Paul', 'Quinn', 'Rosa', 'Sam', 'Tina'])
+LAST_NAMES = np.array(['Smith', 'Johnson', 'Brown', 'Garcia', 'Miller', 'Davis', 'Lopez', 'Wilson', 'Anderson', 'Lee',
+                       'Walker', 'Young', 'King', 'Wright', 'Scott', 'Green', 'Baker', 'Adams', 'Nelson', 'Hill'])
+
+# Category, share of the catalog, and median price
+CATEGORIES = [('Beauty', 0.30, 18.0), ('Skincare', 0.25, 25.0), ('Haircare', 0.15, 14.0),
+              ('Fragrance', 0.10, 55.0), ('Accessories', 0.20, 9.0)]
+ADJECTIVES = np.array(['Red', 'Matte', 'Hydrating', 'Velvet', 'Organic', 'Glow', 'Silk', 'Classic', 'Fresh', 'Deluxe'])
+NOUNS = np.array(['Lipstick', 'Mascara', 'Serum', 'Cream', 'Shampoo', 'Perfume', 'Brush', 'Palette', 'Cleanser', 'Mist'])
+
+COMMENTS = {
+    1: np.array(['Terrible, do not buy!', 'Broke after one use.', 'Very disappointed.']),
+    2: np.array(['Not what I expected.', 'Not satisfied.', 'Below average.']),
+    3: np.array(['It is okay.', 'Average product.', 'It is alright.']),
+    4: np.array(['Very good.', 'Quite good for the price.', 'Pretty good.']),
+    5: np.array(['Excellent product!', 'Love it!', 'Best I have ever used!']),
+}
+
+# Relative order volume per weekday, Monday first
+WEEKDAY_WEIGHTS = np.array([0.95, 0.9, 0.95, 1.0, 1.1, 1.3, 1.2])
+
+# Stream codes mixed into the per-chunk seeds, so every stream and chunk has its own random state
+_MEMBERS, _PRODUCTS, _ORDERS, _REVIEWS, _CATALOG = range(5)
+
+class SyntheticDataGenerator:
+    """
+    A seeded, vectorized generator of realistic shop data.
+
+    Member activity and product popularity follow power laws, basket sizes follow
+    a truncated Zipf distribution, order dates follow weekly and yearly seasonality
+    with a growth trend, and ratings are skewed towards high scores around a
+    per-product quality. Records are produced chunk by chunk with NumPy, and every
+    chunk has its own seed, so each stream can be generated independently and the
+    output only depends on the seed and the chunk size.
+
+    The records are tuples in the format of the DgraphDataInserter bulk methods.
+
+    Methods:
+    members(), products(), orders(), reviews(): Stream the records of one type.
+    write_ndjson(directory, compress=False): Writes the four types to NDJSON files.
+    insert(inserter): Streams the four types into a DgraphDataInserter.
+    """
+
+    def __init__(self, members=1000, products=200, orders=10000, review_rate=0.3, seed=0,
+                 start_date='2023-01-01', days=365, chunk_size=100000, popularity_exponent=1.1,
+                 activity_shape=1.5, basket_exponent=2.5, max_basket_size=20, growth=0.3):
+        """
+        Initializes the SyntheticDataGenerator.
+
+        Parameters:
+        members (int): Number of members.
+        products (int): Number of products.
+        orders (int): Number of orders.
+        review_rate (float): Probability that an ordered product gets reviewed.
+        seed (int): Seed of the whole data set.
+        start_date (str): First order date, in YYYY-MM-DD form.
+        days (int): Number of days the orders are spread over.
+        chunk_size (int): Number of records generated per vectorized step.
+        popularity_exponent (float): Zipf exponent of product popularity; higher is more skewed.
+        activity_shape (float): Pareto shape of member activity; lower is more skewed.
+        basket_exponent (float): Zipf exponent of the number of products per order.
+        max_basket_size (int): Largest number of distinct products in one order.
+        growth (float): Relative increase of the daily order volume over the whole period.
+        """
+        self.counts = {'Member': members, 'Product': products, 'Order': orders}
+        self.review_rate = review_rate
+        self.seed = seed
+        self.start = np.datetime64(start_date, 's')
+        self.days = days
+        self.chunk_size = chunk_size
+        self.basket_exponent = basket_exponent
+        self.max_basket_size = min(max_basket_size, products)
+        self._build_catalog(popularity_exponent, activity_shape, growth)
+
+    def _rng(self, stream, index=0):
+        return np.random.default_rng([self.seed, stream, index])
+
+    def _build_catalog(self, popularity_exponent, activity_shape, growth):
+        # Per-member and per-product attributes that the orders and reviews depend on
+        rng = self._rng(_CATALOG)
+        products = self.counts['Product']
+        shares = np.array([share for _, share, _ in CATEGORIES])
+        self.product_categories = rng.choice(len(CATEGORIES), products, p=shares / shares.sum())
+        medians = np.array([median for _, _, median in CATEGORIES])
+        self.product_prices = np.round(medians[self.product_categories] * rng.lognormal(0, 0.5, products), 2)
+        self.product_quality = np.clip(rng.normal(4.1, 0.6, products), 1.5, 5.0)
+        # The most popular products are spread over the catalog rather than being the first ids
+        popularity = np.empty(products)
+        popularity[rng.permutation(products)] = 1.0 / np.arange(1, products + 1) ** popularity_exponent
+        self.product_cdf = _cdf(popularity)
+        self.member_cdf = _cdf(rng.pareto(activity_shape, self.counts['Member']) + 1.0)
+        # Daily order volume: growth trend, yearly peak around the holidays, busier weekends
+        dates = self.start.astype('datetime64[D]') + np.arange(self.days)
+        day_of_year = (dates - dates.astype('datetime64[Y]')).astype(int)
+        weekday = (dates.astype(int) + 3) % 7
+        trend = 1.0 + growth * np.arange(self.days) / max(self.days - 1, 1)
+        yearly = 1.0 + 0.3 * np.cos(2 * np.pi * (day_of_year - 350) / 365.25)
+        self.day_cdf = _cdf(trend * yearly * WEEKDAY_WEIGHTS[weekday])
+
+    def _chunks(self, type_name):
+        total = self.counts[type_name]
+        for index, start in enumerate(range(0, total, self.chunk_size)):
+            yield index, start, min(self.chunk_size, total - start)
+
+    def members(self):
+        """
+        Streams (member_id, name, email) tuples.
+        """
+        for index, start, count in self._chunks('Member'):
+            rng = self._rng(_MEMBERS, index)
+            first = FIRST_NAMES[rng.integers(len(FIRST_NAMES), size=count)].tolist()
+            last = LAST_NAMES[rng.integers(len(LAST_NAMES), size=count)].tolist()
+            for member_id, first_name, last_name in zip(range(start + 1, start + count + 1), first, last):
+                yield (str(member_id), '%s %s' % (first_name, last_name),
+                       '%s.%s%d@example.com' % (first_name.lower(), last_name.lower(), member_id))
+
+    def products(self):
+        """
+        Streams (product_id, name, description, price, category) tuples.
+        """
+        for index, start, count in self._chunks('Product'):
+            rng = self._rng(_PRODUCTS, index)
+            adjectives = ADJECTIVES[rng.integers(len(ADJECTIVES), size=count)].tolist()
+            nouns = NOUNS[rng.integers(len(NOUNS), size=count)].tolist()
+            categories = self.product_categories[start:start + count].tolist()
+            prices = self.product_prices[start:start + count].tolist()
+            for offset, (adjective, noun, category, price) in enumerate(zip(adjectives, nouns, categories, prices)):
+                category_name = CATEGORIES[category][0]
+                yield (str(start + offset + 1), '%s %s' % (adjective, noun),
+                       'A %s %s from our %s range' % (adjective.lower(), noun.lower(), category_name.lower()),
+                       price, category_name)
+
+    def _order_chunk(self, index, start, count):
+        """
+        Generates one chunk of orders as arrays: the buyer, the basket offsets and products, totals and times.
+        """
+        rng = self._rng(_ORDERS, index)
+        buyers = np.searchsorted(self.member_cdf, rng.random(count), side='right')
+        sizes = np.minimum(rng.zipf(self.basket_exponent, count), self.max_basket_size)
+        baskets = np.repeat(np.arange(count), sizes)
+        items = np.searchsorted(self.product_cdf, rng.random(len(baskets)), side='right')
+        # Drop products drawn twice for the same order; every basket keeps at least its first product
+        order = np.lexsort((items, baskets))
+        baskets, items = baskets[order], items[order]
+        keep = np.ones(len(items), dtype=bool)
+        keep[1:] = (baskets[1:] != baskets[:-1]) | (items[1:] != items[:-1])
+        baskets, items = baskets[keep], items[keep]
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(baskets, minlength=count), out=offsets[1:])
+        totals = np.round(np.add.reduceat(self.product_prices[items], offsets[:-1]), 2)
+        days = np.searchsorted(self.day_cdf, rng.random(count), side='right')
+        times = self.start + days.astype('timedelta64[D]') + rng.integers(86400, size=count).astype('timedelta64[s]')
+        return buyers, offsets, baskets, items, totals, times
+
+    def orders(self):
+        """
+        Streams (order_id, member_id, product_ids, total, date) tuples, dates in ISO 8601 form.
+        """
+        for index, start, count in self._chunks('Order'):
+            buyers, offsets, _, items, totals, times = self._order_chunk(index, start, count)
+            product_ids = [str(product) for product in (items + 1).tolist()]
+            bounds = offsets.tolist()
+            for offset, (buyer, total, date) in enumerate(zip((buyers + 1).tolist(), totals.tolist(),
+                                                              times.astype(str).tolist())):
+                yield (str(start + offset + 1), str(buyer), product_ids[bounds[offset]:bounds[offset + 1]], total, date)
+
+    def reviews(self):
+        """
+        Streams (review_id, rating, comment, member_id, product_id, date) tuples.
+        Each ordered product is reviewed by its buyer with probability review_rate, some days after the order.
+        """
+        for index, start, count in self._chunks('Order'):
+            buyers, offsets, baskets, items, _, times = self._order_chunk(index, start, count)
+            rng = self._rng(_REVIEWS, index)
+            lines = np.flatnonzero(rng.random(len(items)) < self.review_rate)
+            products = items[lines]
+            reviewed = baskets[lines]
+            ratings = np.clip(np.rint(rng.normal(self.product_quality[products], 0.9)), 1, 5).astype(int)
+            comments = np.empty(len(lines), dtype=object)
+            for rating, choices in COMMENTS.items():
+                mask = ratings == rating
+                comments[mask] = choices[rng.integers(len(choices), size=int(mask.sum()))]
+            delays = rng.exponential(7 * 86400, len(lines)).astype('timedelta64[s]')
+            dates = (times[reviewed] + delays).astype(str).tolist()
+            # The id combines the order id and the product's position in the basket, so it is unique across chunks
+            positions = (lines - offsets[reviewed] + 1).tolist()
+            for basket, position, rating, comment, buyer, product, date in zip(
+                    reviewed.tolist(), positions, ratings.tolist(), comments.tolist(),
+                    (buyers[reviewed] + 1).tolist(), (products + 1).tolist(), dates):
+                yield ('%d-%d' % (start + basket + 1, position), rating, comment, str(buyer), str(product), date)
+
+    def streams(self):
+        """
+        Returns the record streams of the four types, in load order.
+        """
+        return [('Member', self.members()), ('Product', self.products()),
+                ('Order', self.orders()), ('Review', self.reviews())]
+
+    def write_ndjson(self, directory, compress=False):
+        """
+        Writes members.ndjson, products.ndjson, orders.ndjson and reviews.ndjson to a directory.
+        Each line is a dict with the keyword names of the DgraphDataInserter bulk methods, see read_ndjson.
+
+        Parameters:
+        directory (str): The output directory, created if needed.
+        compress (bool): Whether to gzip the files (adds a .gz suffix).
+
+        Returns:
+        dict: The number of records written per type.
+        """
+        os.makedirs(directory, exist_ok=True)
+        written = {}
+        for type_name, records in self.streams():
+            fields = FIELDS[type_name]
+            path = os.path.join(directory, '%ss.ndjson%s' % (type_name.lower(), '.gz' if compress else ''))
+            with (gzip.open if compress else open)(path, 'wt') as file:
+                written[type_name] = 0
+                for record in records:
+                    file.write(json.dumps(dict(zip(fields, record))) + '\n')
+                    written[type_name] += 1
+        return written
+
+    def insert(self, inserter):
+        """
+        Streams the four types into Dgraph, each one after the types it references.
+
+        Parameters:
+        inserter (DgraphDataInserter): The inserter used for the bulk loads.
+
+        Returns:
+        dict: The BulkInsertReport of each type.
+        """
+        methods = {'Member': inserter.insert_members_bulk, 'Product': inserter.insert_products_bulk,
+                   'Order': inserter.insert_orders_bulk, 'Review': inserter.insert_reviews_bulk}
+        return {type_name: methods[type_name](records) for type_name, records in self.streams()}
+
+# The keyword names of the records of each type, as accepted by the DgraphDataInserter bulk methods
+FIELDS = {
+    'Member': ('member_id', 'name', 'email'),
+    'Product': ('product_id', 'name', 'description', 'price', 'category'),
+    'Order': ('order_id', 'member_id', 'product_ids', 'total', 'date'),
+    'Review': ('review_id', 'rating', 'comment', 'member_id', 'product_id', 'date'),
+}
+
+def read_ndjson(path):
+    """
+    Streams the records of an NDJSON file written by SyntheticDataGenerator.write_ndjson.
+
+    Parameters:
+    path (str): The file path; files ending in .gz are decompressed.
+
+    Returns:
+    iterator: Dicts that can be passed straight to the DgraphDataInserter bulk methods.
+    """
+    with (gzip.open if path.endswith('.gz') else open)(path, 'rt') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+def _cdf(weights):
+    cdf = np.cumsum(weights, dtype=np.float64)
+    cdf /= cdf[-1]
+    # Guard against rounding so that searchsorted never returns len(weights)
+    cdf[-1] = np.inf
+    return cdf
+
+
+# Usage
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic shop data into Dgraph or NDJSON files.')
+    parser.add_argument('--members', type=int, default=10000)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--review-rate', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start-date', default='2023-01-01')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--out', help='Write NDJSON files to this directory instead of inserting into Dgraph')
+    parser.add_argument('--compress', action='store_true', help='Gzip the NDJSON files')
+    parser.add_argument('--endpoint', default='http://localhost:8080/graphql')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    generator = SyntheticDataGenerator(members=args.members, products=args.products, orders=args.orders,
+                                       review_rate=args.review_rate, seed=args.seed, start_date=args.start_date,
+                                       days=args.days, chunk_size=args.chunk_size)
+    started = time.perf_counter()
+    if args.out:
+        results = generator.write_ndjson(args.out, compress=args.compress)
+    else:
+        results = generator.insert(DgraphDataInserter(args.endpoint, batch_size=args.batch_size, workers=args.workers))
+    for type_name, result in results.items():
+        print(type_name, result)
+    print('Done in %.1fs' % (time.perf_counter() - started))
@@ -0,0 +1,806 @@
+# A local stand-in for Dgraph's GraphQL endpoint, for offline tests and benchmarks.
+# InMemoryDgraph serves the project's Member/Product/Order/Review schema (see
+# schema/api_schema.graphql) from an in-memory graph and executes the
+# query*/get*/aggregate*/add*/update*/delete* operations with Dgraph's
+# filter/order/first/offset arguments and *Aggregate fields. It can be used
+# in-process as a client stand-in, or behind DgraphStubServer, which serves it
+# over HTTP and `graphql-ws` subscriptions on localhost with optional injected latency.
+#
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests aiohttp
+# python src/tests/dgraph_stub_server.py --port 8080 --latency 0.005
+# deactivate
+
+import os
+import re
+import sys
+import json
+import math
+import random
+import asyncio
+import argparse
+import itertools
+import threading
+from datetime import datetime, timezone
+
+from aiohttp import web, WSMsgType
+
+# Add the backend and examples directories to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from graphql_document import parse, Variable, EnumValue
+from create_mock_data import DgraphDataInserter
+
+# Field types of each schema type; list edges are written as [Type]
+SCHEMA = {
+    'Member': {'memberId': 'String', 'name': 'String', 'email': 'String',
+               'orders': '[Order]', 'reviews': '[Review]', 'recommendedProducts': '[Product]'},
+    'Product': {'productId': 'String', 'name': 'String', 'description': 'String', 'price': 'Float',
+                'category': 'String', 'reviews': '[Review]', 'recommendedToMembers': '[Member]'},
+    'Order': {'orderId': 'String', 'member': 'Member', 'products': '[Product]', 'total': 'Float', 'date': 'DateTime'},
+    'Review': {'reviewId': 'String', 'rating': 'Int', 'comment': 'String', 'member': 'Member',
+               'product': 'Product', 'date': 'DateTime'},
+}
+ID_FIELDS = {'Member': 'memberId', 'Product': 'productId', 'Order': 'orderId', 'Review': 'reviewId'}
+REQUIRED = {
+    'Member': ['memberId'],
+    'Product': ['productId', 'name', 'price'],
+    'Order': ['orderId', 'member', 'products', 'total', 'date'],
+    'Review': ['reviewId', 'rating', 'member', 'product', 'date'],
+}
+
+# @hasInverse pairs, in both directions
+INVERSES = {
+    ('Member', 'orders'): ('Order', 'member'),
+    ('Member', 'reviews'): ('Review', 'member'),
+    ('Member', 'recommendedProducts'): ('Product', 'recommendedToMembers'),
+    ('Product', 'reviews'): ('Review', 'product'),
+}
+INVERSES.update({inverse: edge for edge, inverse in list(INVERSES.items())})
+
+SCALARS = ('String', 'Int', 'Float', 'DateTime')
+_ROOT_FIELD_RE = re.compile(r'^(get|query|aggregate|add|update|delete)(%s)$' % '|'.join(SCHEMA))
+_TERM_RE = re.compile(r'\w+')
+
+# The bulk-insert record format of each type, as (type, input builder)
+RECORD_INPUTS = {
+    'members': ('Member', DgraphDataInserter.member_input),
+    'products': ('Product', DgraphDataInserter.product_input),
+    'orders': ('Order', DgraphDataInserter.order_input),
+    'reviews': ('Review', DgraphDataInserter.review_input),
+}
+
+class StubError(Exception):
+    """
+    Raised for invalid operations; reported as a GraphQL error in the response.
+    """
+
+class _Node:
+    __slots__ = ('type', 'uid', 'fields')
+
+    def __init__(self, type_name, uid):
+        self.type = type_name
+        self.uid = uid
+        self.fields = {}
+
+def _field_type(type_name, field_name):
+    field_type = SCHEMA[type_name].get(field_name)
+    if field_type is None:
+        raise StubError('Cannot query field "%s" on type "%s".' % (field_name, type_name))
+    return field_type.strip('[]'), field_type.startswith('[')
+
+def _to_datetime(value):
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            raise StubError('Invalid DateTime value %r' % (value,))
+    return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed.astimezone(timezone.utc)
+
+def _coerce(scalar, value):
+    if value is None:
+        return None
+    if scalar == 'DateTime':
+        return _to_datetime(value)
+    if scalar == 'Int':
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise StubError('Int cannot represent non-integer value %r' % (value,))
+        return value
+    if scalar == 'Float':
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise StubError('Float cannot represent non-numeric value %r' % (value,))
+        return float(value)
+    return str(value)
+
+def _output(value):
+    if isinstance(value, datetime):
+        return value.isoformat().replace('+00:00', 'Z')
+    return value
+
+def _bind(value, variables):
+    # Replace variable references and enum literals in an argument value
+    if isinstance(value, Variable):
+        return variables.get(value.name)
+    if isinstance(value, EnumValue):
+        return value.name
+    if isinstance(value, list):
+        return [_bind(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: _bind(item, variables) for key, item in value.items()}
+    return value
+
+class InMemoryDgraph:
+    """
+    An in-memory graph executing the project's GraphQL operations the way Dgraph does.
+    `query` and `mutate` mirror DgraphClient, so an instance can stand in for the client in-process.
+    """
+    def __init__(self):
+        """
+        Initialize an empty graph.
+        """
+        self.nodes = {type_name: {} for type_name in SCHEMA}
+        self.uids = itertools.count(1)
+        self.lock = threading.RLock()
+        self.listeners = []
+        self.journal = None
+        self.created = None
+
+    def query(self, query, variables=None):
+        """
+        Execute a query and return the response dict.
+        """
+        return self.execute(query, variables)
+
+    def mutate(self, mutation, variables=None):
+        """
+        Execute a mutation and return the response dict.
+        """
+        return self.execute(mutation, variables)
+
+    def execute(self, document, variables=None, operation_name=None):
+        """
+        Execute a GraphQL operation.
+
+        :param document: The GraphQL document string.
+        :param variables: Optional variables for the operation.
+        :param operation_name: The operation to run when the document has several.
+        :return: The response dict, with 'data' or 'errors'.
+        """
+        try:
+            operation = parse(document).operation(operation_name)
+        except ValueError as e:
+            return {'errors': [{'message': str(e)}], 'data': None}
+        bound = {name: _bind(default, {}) for name, _, default in operation.variable_definitions}
+        bound.update(variables or {})
+        with self.lock:
+            try:
+                if operation.kind == 'mutation':
+                    data = self._mutate(operation.selections, bound)
+                else:
+                    data = {field.response_key: self._resolve_root(field, bound) for field in operation.selections}
+            except StubError as e:
+                return {'errors': [{'message': str(e)}], 'data': None}
+        if operation.kind == 'mutation':
+            for listener in list(self.listeners):
+                listener()
+        return {'data': data}
+
+    def load(self, members=(), products=(), orders=(), reviews=()):
+        """
+        Add records in the DgraphDataInserter bulk format (tuples or keyword dicts), bypassing GraphQL.
+        Useful to seed large graphs, e.g. from SyntheticDataGenerator.
+
+        :return: The number of nodes created.
+        """
+        created = 0
+        streams = {'members': members, 'products': products, 'orders': orders, 'reviews': reviews}
+        with self.lock:
+            for name, records in streams.items():
+                type_name, build_input = RECORD_INPUTS[name]
+                inputs = [build_input(**record) if isinstance(record, dict) else build_input(*record)
+                          for record in records]
+                created += self._transaction(lambda: self._add(type_name, inputs, upsert=False))[1]
+        for listener in list(self.listeners):
+            listener()
+        return created
+
+    def count(self, type_name):
+        """
+        Return the number of nodes of a type.
+        """
+        return len(self.nodes[type_name])
+
+    # Queries
+
+    def _resolve_root(self, field, variables):
+        match = _ROOT_FIELD_RE.match(field.name)
+        if match is None or match.group(1) in ('add', 'update', 'delete'):
+            raise StubError('Cannot query field "%s" on type "Query".' % field.name)
+        kind, type_name = match.groups()
+        arguments = _bind(field.arguments, variables)
+        if kind == 'aggregate':
+            self._check_aggregate(type_name, field.selections)
+            nodes = self._filter(type_name, self.nodes[type_name].values(), arguments.get('filter'))
+            return self._aggregate(type_name, nodes, field.selections)
+        self._check_selections(type_name, field.selections)
+        if kind == 'get':
+            id_field = ID_FIELDS[type_name]
+            node = self.nodes[type_name].get(arguments.get(id_field, arguments.get('id')))
+            return None if node is None else self._render(node, field.selections, variables)
+        nodes = self._select(type_name, self.nodes[type_name].values(), arguments)
+        return [self._render(node, field.selections, variables) for node in nodes]
+
+    def _check_selections(self, type_name, selections):
+        # Reject unknown fields up front, as Dgraph validates the whole document before executing it
+        if selections is None:
+            raise StubError('Field of type "%s" must have a selection of subfields.' % type_name)
+        for field in selections:
+            if field.name == '__typename':
+                continue
+            if field.name.endswith('Aggregate'):
+                target, is_list = _field_type(type_name, field.name[:-len('Aggregate')])
+                if not is_list:
+                    raise StubError('Cannot query field "%s" on type "%s".' % (field.name, type_name))
+                self._check_aggregate(target, field.selections)
+                continue
+            target, _ = _field_type(type_name, field.name)
+            if target in SCALARS:
+                if field.selections is not None:
+                    raise StubError('Field "%s" must not have a selection since type "%s" has no subfields.'
+                                    % (field.name, target))
+            else:
+                self._check_selections(target, field.selections)
+
+    def _check_aggregate(self, type_name, selections):
+        for field in selections or []:
+            if field.name not in ('count', '__typename') and self._aggregate_field(type_name, field.name) is None:
+                raise StubError('Cannot query field "%s" on type "%sAggregateResult".' % (field.name, type_name))
+
+    @staticmethod
+    def _aggregate_field(type_name, name):
+        match = re.match(r'^(\w+?)(Min|Max|Sum|Avg)$', name)
+        if match is None or SCHEMA[type_name].get(match.group(1)) not in SCALARS:
+            return None
+        if match.group(2) in ('Sum', 'Avg') and SCHEMA[type_name][match.group(1)] not in ('Int', 'Float'):
+            return None
+        return match.groups()
+
+    def _render(self, node, selections, variables):
+        result = {}
+        for field in selections:
+            key = field.response_key
+            if field.name == '__typename':
+                result[key] = node.type
+            elif field.name.endswith('Aggregate'):
+                target, _ = _field_type(node.type, field.name[:-len('Aggregate')])
+                edges = node.fields.get(field.name[:-len('Aggregate')], {}).values()
+                filter = _bind(field.arguments, variables).get('filter')
+                result[key] = self._aggregate(target, self._filter(target, edges, filter), field.selections)
+            else:
+                target, is_list = _field_type(node.type, field.name)
+                value = node.fields.get(field.name)
+                if target in SCALARS:
+                    result[key] = _output(value)
+                elif is_list:
+                    edges = self._select(target, (value or {}).values(), _bind(field.arguments, variables))
+                    result[key] = [self._render(edge, field.selections, variables) for edge in edges]
+                else:
+                    result[key] = None if value is None else self._render(value, field.selections, variables)
+        return result
+
+    def _select(self, type_name, nodes, arguments):
+        nodes = self._filter(type_name, nodes, arguments.get('filter'))
+        if arguments.get('order'):
+            nodes = self._order(nodes, arguments['order'])
+        offset = arguments.get('offset') or 0
+        first = arguments.get('first')
+        return nodes[offset:] if first is None else nodes[offset:offset + first]
+
+    def _filter(self, type_name, nodes, filter):
+        if not filter:
+            return list(nodes)
+        return [node for node in nodes if self._matches(type_name, node, filter)]
+
+    def _matches(self, type_name, node, filter):
+        for key, condition in filter.items():
+            if condition is None:
+                continue
+            if key == 'and':
+                conditions = condition if isinstance(condition, list) else [condition]
+                if not all(self._matches(type_name, node, item) for item in conditions):
+                    return False
+            elif key == 'or':
+                conditions = condition if isinstance(condition, list) else [condition]
+                if not any(self._matches(type_name, node, item) for item in conditions):
+                    return False
+            elif key == 'not':
+                if self._matches(type_name, node, condition):
+                    return False
+            elif key == 'has':
+                for name in condition if isinstance(condition, list) else [condition]:
+                    if not node.fields.get(name):
+                        return False
+            else:
+                target, is_list = _field_type(type_name, key)
+                value = node.fields.get(key)
+                if target in SCALARS:
+                    if not _compare(target, value, condition):
+                        return False
+                else:
+                    # Filtering on a related node matches when any of the related nodes does
+                    related = (value or {}).values() if is_list else [value] if value is not None else []
+                    if not any(self._matches(target, other, condition) for other in related):
+                        return False
+        return True
+
+    @staticmethod
+    def _order(nodes, order):
+        levels = []
+        while order:
+            direction = 'desc' if 'desc' in order else 'asc'
+            levels.append((order[direction], direction == 'desc'))
+            order = order.get('then')
+        nodes = list(nodes)
+        # Stable sorts from the last level to the first; nodes without a value go last at each level
+        for name, descending in reversed(levels):
+            present = [node for node in nodes if node.fields.get(name) is not None]
+            missing = [node for node in nodes if node.fields.get(name) is None]
+            present.sort(key=lambda node: node.fields[name], reverse=descending)
+            nodes = present + missing
+        return nodes
+
+    def _aggregate(self, type_name, nodes, selections):
+        result = {}
+        for field in selections or []:
+            if field.name == '__typename':
+                result[field.response_key] = type_name + 'AggregateResult'
+                continue
+            if field.name == 'count':
+                result[field.response_key] = len(nodes)
+                continue
+            name, function = self._aggregate_field(type_name, field.name)
+            values = [node.fields[name] for node in nodes if node.fields.get(name) is not None]
+            if not values:
+                result[field.response_key] = None
+            elif function == 'Min':
+                result[field.response_key] = _output(min(values))
+            elif function == 'Max':
+                result[field.response_key] = _output(max(values))
+            elif function == 'Sum':
+                result[field.response_key] = math.fsum(values) if isinstance(values[0], float) else sum(values)
+            else:
+                result[field.response_key] = math.fsum(values) / len(values)
+        return result
+
+    # Mutations
+
+    def _mutate(self, selections, variables):
+        data = {}
+        for field in selections:
+            match = _ROOT_FIELD_RE.match(field.name)
+            if match is None or match.group(1) not in ('add', 'update', 'delete'):
+                raise StubError('Cannot query field "%s" on type "Mutation".' % field.name)
+            kind, type_name = match.groups()
+            arguments = _bind(field.arguments, variables)
+            payload_field = type_name[0].lower() + type_name[1:]
+            for payload in field.selections or []:
+                if payload.name == payload_field:
+                    self._check_selections(type_name, payload.selections)
+                elif payload.name not in ('numUids', 'msg', '__typename'):
+                    raise StubError('Cannot query field "%s" on type "%s%sPayload".' % (payload.name, kind.title(), type_name))
+            if kind == 'add':
+                inputs = arguments.get('input') or []
+                nodes, created = self._transaction(lambda: self._add(
+                    type_name, inputs if isinstance(inputs, list) else [inputs], arguments.get('upsert')))
+            elif kind == 'update':
+                nodes, created = self._transaction(lambda: self._update(type_name, arguments.get('input') or {}))
+            else:
+                nodes = self._filter(type_name, self.nodes[type_name].values(), arguments.get('filter'))
+            result = {}
+            # Deleted nodes are rendered before they are removed, as Dgraph returns their last state
+            for payload in field.selections or []:
+                if payload.name == payload_field:
+                    selected = self._select(type_name, nodes, _bind(payload.arguments, variables))
+                    result[payload.response_key] = [self._render(node, payload.selections, variables) for node in selected]
+                elif payload.name == '__typename':
+                    result[payload.response_key] = '%s%sPayload' % (kind.title(), type_name)
+            if kind == 'delete':
+                self._transaction(lambda: [self._delete(node) for node in nodes])
+                created = len(nodes)
+            for payload in field.selections or []:
+                if payload.name == 'numUids':
+                    result[payload.response_key] = created
+                elif payload.name == 'msg':
+                    result[payload.response_key] = 'Deleted' if kind == 'delete' else None
+            data[field.response_key] = result
+        return data
+
+    def _transaction(self, apply):
+        # Every change to an existing node is journaled so a failing mutation leaves the graph untouched;
+        # nodes created by the mutation only need to be unindexed
+        self.journal = []
+        self.created = set()
+        try:
+            return apply()
+        except Exception:
+            for undo in reversed(self.journal):
+                undo()
+            raise
+        finally:
+            self.journal = None
+            self.created = None
+
+    def _add(self, type_name, inputs, upsert):
+        nodes = []
+        created = 0
+        for item in inputs:
+            id_field = ID_FIELDS[type_name]
+            node = self.nodes[type_name].get(item.get(id_field))
+            if node is not None:
+                if not upsert:
+                    raise StubError('id %s already exists for field %s inside type %s'
+                                    % (item.get(id_field), id_field, type_name))
+                created += self._set(node, {key: value for key, value in item.items() if key != id_field})
+            else:
+                node, count = self._create(type_name, item)
+                created += count
+            nodes.append(node)
+        return nodes, created
+
+    def _update(self, type_name, input):
+        nodes = self._filter(type_name, self.nodes[type_name].values(), input.get('filter'))
+        for node in nodes:
+            if input.get('set'):
+                self._set(node, input['set'])
+            if input.get('remove'):
+                self._remove(node, input['remove'])
+        return nodes, len(nodes)
+
+    def _create(self, type_name, item):
+        id_field = ID_FIELDS[type_name]
+        for name in REQUIRED[type_name]:
+            if item.get(name) in (None, []):
+                raise StubError('Field `%s` is required for a new %s' % (name, type_name))
+        node = _Node(type_name, '0x%x' % next(self.uids))
+        node.fields[id_field] = _coerce('String', item[id_field])
+        self.nodes[type_name][node.fields[id_field]] = node
+        self.created.add(node.uid)
+        self.journal.append(lambda: self.nodes[type_name].pop(node.fields[id_field], None))
+        created = 1 + self._set(node, {key: value for key, value in item.items() if key != id_field})
+        return node, created
+
+    def _set(self, node, values):
+        created = 0
+        for name, value in values.items():
+            target, is_list = _field_type(node.type, name)
+            if name == ID_FIELDS[node.type]:
+                raise StubError('Updating the @id field %s is not supported' % name)
+            if target in SCALARS:
+                self._assign(node, name, _coerce(target, value))
+                continue
+            references = value if isinstance(value, list) else [value]
+            if not is_list and node.fields.get(name) is not None and value is None:
+                self._detach(node, name, node.fields[name])
+            for reference in references:
+                if reference is None:
+                    continue
+                other, count = self._reference(target, reference)
+                created += count
+                self._attach(node, name, other)
+        return created
+
+    def _remove(self, node, values):
+        for name, value in values.items():
+            target, is_list = _field_type(node.type, name)
+            if target in SCALARS:
+                if value is None or node.fields.get(name) == _coerce(target, value):
+                    self._assign(node, name, None)
+                continue
+            for reference in value if isinstance(value, list) else [value]:
+                other = self.nodes[target].get((reference or {}).get(ID_FIELDS[target]))
+                if other is not None:
+                    self._detach(node, name, other)
+
+    def _reference(self, type_name, reference):
+        if not isinstance(reference, dict):
+            raise StubError('Expected an object referencing a %s, got %r' % (type_name, reference))
+        node = self.nodes[type_name].get(reference.get(ID_FIELDS[type_name]))
+        if node is not None:
+            return node, 0
+        return self._create(type_name, reference)
+
+    def _assign(self, node, name, value):
+        old = node.fields.get(name)
+        node.fields[name] = value
+        if node.uid not in self.created:
+            self.journal.append(lambda: node.fields.__setitem__(name, old))
+
+    def _attach(self, node, name, other):
+        self._attach_one(node, name, other)
+        inverse = INVERSES.get((node.type, name))
+        if inverse is not None:
+            self._attach_one(other, inverse[1], node)
+
+    def _attach_one(self, node, name, other):
+        if SCHEMA[node.type][name].startswith('['):
+            # List edges are dicts keyed by uid: ordered, and O(1) to add or remove
+            edges = node.fields.setdefault(name, {})
+            if other.uid not in edges:
+                edges[other.uid] = other
+                if node.uid not in self.created:
+                    self.journal.append(lambda: edges.pop(other.uid, None))
+            return
+        current = node.fields.get(name)
+        if current is other:
+            return
+        if current is not None:
+            self._detach(node, name, current)
+        self._assign(node, name, other)
+
+    def _detach(self, node, name, other):
+        for source, field, target in [(node, name, other)] + (
+                [(other, INVERSES[(node.type, name)][1], node)] if (node.type, name) in INVERSES else []):
+            value = source.fields.get(field)
+            if isinstance(value, dict):
+                if target.uid in value:
+                    del value[target.uid]
+                    self.journal.append(lambda value=value, target=target: value.__setitem__(target.uid, target))
+            elif value is target:
+                self._assign(source, field, None)
+
+    def _delete(self, node):
+        for name, field_type in SCHEMA[node.type].items():
+            value = node.fields.get(name)
+            if field_type.startswith('['):
+                for other in list((value or {}).values()):
+                    self._detach(node, name, other)
+            elif field_type.strip('[]') not in SCALARS and value is not None:
+                self._detach(node, name, value)
+        # Edges without an inverse (e.g. Order.products) are only known from the other side
+        for type_name, fields in SCHEMA.items():
+            for name, field_type in fields.items():
+                if field_type.strip('[]') == node.type and (type_name, name) not in INVERSES:
+                    for other in self.nodes[type_name].values():
+                        if node.uid in (other.fields.get(name) or {}):
+                            self._detach(other, name, node)
+        id_value = node.fields[ID_FIELDS[node.type]]
+        del self.nodes[node.type][id_value]
+        self.journal.append(lambda: self.nodes[node.type].__setitem__(id_value, node))
+
+def _compare(scalar, value, condition):
+    if not isinstance(condition, dict):
+        raise StubError('Invalid filter condition %r' % (condition,))
+    for operator, operand in condition.items():
+        if operand is None:
+            continue
+        if operator in ('anyofterms', 'allofterms', 'anyoftext', 'alloftext'):
+            terms = set(_TERM_RE.findall(str(value or '').lower()))
+            wanted = set(_TERM_RE.findall(str(operand).lower()))
+            if not (terms & wanted if operator.startswith('any') else wanted and wanted <= terms):
+                return False
+            continue
+        if operator == 'regexp':
+            match = re.match(r'^/(.*)/([a-z]*)$', str(operand), re.DOTALL)
+            pattern, flags = match.groups() if match else (str(operand), '')
+            if value is None or not re.search(pattern, str(value), re.IGNORECASE if 'i' in flags else 0):
+                return False
+            continue
+        if value is None:
+            return False
+        if operator in ('eq', 'in'):
+            candidates = operand if isinstance(operand, list) else [operand]
+            if value not in [_coerce_operand(scalar, candidate) for candidate in candidates]:
+                return False
+        elif operator == 'between':
+            if not _coerce_operand(scalar, operand['min']) <= value <= _coerce_operand(scalar, operand['max']):
+                return False
+        elif operator in ('lt', 'le', 'gt', 'ge'):
+            operand = _coerce_operand(scalar, operand)
+            if not {'lt': value < operand, 'le': value <= operand, 'gt': value > operand, 'ge': value >= operand}[operator]:
+                return False
+        else:
+            raise StubError('Unsupported filter operator %s' % operator)
+    return True
+
+def _coerce_operand(scalar, operand):
+    if scalar == 'DateTime':
+        return _to_datetime(operand)
+    if scalar in ('Int', 'Float'):
+        return float(operand)
+    return str(operand)
+
+class DgraphStubServer:
+    """
+    Serves an InMemoryDgraph on localhost, over HTTP (POST /graphql) and `graphql-ws` subscriptions
+    on the same endpoint, from a background thread.
+    """
+    def __init__(self, graph=None, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, keepalive_interval=10.0, seed=None):
+        """
+        Initialize the DgraphStubServer.
+
+        :param graph: The InMemoryDgraph to serve; a new, empty one by default.
+        :param host: The interface to listen on.
+        :param port: The port to listen on; 0 picks a free port.
+        :param latency: Seconds added to every HTTP request before it is answered.
+        :param jitter: Up to this many extra seconds, drawn uniformly, added to the latency.
+        :param keepalive_interval: Seconds between `ka` messages on subscription connections.
+        :param seed: Optional seed for the jitter.
+        """
+        self.graph = graph or InMemoryDgraph()
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.keepalive_interval = keepalive_interval
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.loop = None
+        self.thread = None
+        self.runner = None
+        # The live operations of each subscription connection, by websocket
+        self.connections = {}
+
+    @property
+    def url(self):
+        """
+        The GraphQL endpoint URL, e.g. http://127.0.0.1:8080/graphql.
+        """
+        return 'http://%s:%d/graphql' % (self.host, self.port)
+
+    def start(self):
+        """
+        Start serving in a background thread and wait until the server is listening.
+        """
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        self.thread = threading.Thread(target=self._serve, args=(started,), daemon=True)
+        self.thread.start()
+        started.wait()
+        self.graph.listeners.append(self._on_mutation)
+        return self
+
+    def stop(self):
+        """
+        Close every connection and stop the server.
+        """
+        if self.loop is None:
+            return
+        self.graph.listeners.remove(self._on_mutation)
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+
+    def drop_connections(self):
+        """
+        Close every subscription connection, e.g. to exercise client reconnection.
+        """
+        asyncio.run_coroutine_threadsafe(self._close_connections(), self.loop).result()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _serve(self, started):
+        asyncio.set_event_loop(self.loop)
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_route('*', '/graphql', self._handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, self.host, self.port)
+        self.loop.run_until_complete(site.start())
+        self.port = self.runner.addresses[0][1]
+        started.set()
+        self.loop.run_forever()
+
+    async def _shutdown(self):
+        await self._close_connections()
+        await self.runner.cleanup()
+
+    async def _close_connections(self):
+        for websocket in list(self.connections):
+            await websocket.close()
+
+    async def _handle(self, request):
+        if request.headers.get('Upgrade', '').lower() == 'websocket':
+            return await self._subscriptions(request)
+        if request.method != 'POST':
+            return web.json_response({'errors': [{'message': 'Only POST is supported'}]}, status=405)
+        self.requests += 1
+        try:
+            body = await request.json()
+        except ValueError:
+            return web.json_response({'errors': [{'message': 'Invalid JSON body'}]}, status=400)
+        delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        response = self.graph.execute(body.get('query') or '', body.get('variables'), body.get('operationName'))
+        return web.json_response(response)
+
+    async def _subscriptions(self, request):
+        websocket = web.WebSocketResponse(protocols=('graphql-ws',))
+        await websocket.prepare(request)
+        operations = self.connections[websocket] = {}
+        keepalive = None
+        try:
+            async for message in websocket:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                message = json.loads(message.data)
+                message_type = message.get('type')
+                if message_type == 'connection_init':
+                    await websocket.send_json({'type': 'connection_ack'})
+                    keepalive = asyncio.ensure_future(self._keepalive(websocket))
+                elif message_type == 'start':
+                    payload = message.get('payload') or {}
+                    operation = {'query': payload.get('query') or '', 'variables': payload.get('variables'),
+                                 'operation_name': payload.get('operationName'), 'last': None}
+                    operations[message['id']] = operation
+                    await self._publish(websocket, message['id'], operation)
+                elif message_type == 'stop':
+                    if operations.pop(message.get('id'), None) is not None:
+                        await websocket.send_json({'id': message['id'], 'type': 'complete'})
+                elif message_type == 'connection_terminate':
+                    break
+        finally:
+            self.connections.pop(websocket, None)
+            if keepalive is not None:
+                keepalive.cancel()
+            await websocket.close()
+        return websocket
+
+    async def _keepalive(self, websocket):
+        while not websocket.closed:
+            await websocket.send_json({'type': 'ka'})
+            await asyncio.sleep(self.keepalive_interval)
+
+    async def _publish(self, websocket, operation_id, operation):
+        # Like Dgraph, the full result is sent again only when it changed
+        response = self.graph.execute(operation['query'], operation['variables'], operation['operation_name'])
+        if response == operation['last']:
+            return
+        operation['last'] = response
+        if response.get('errors'):
+            await websocket.send_json({'id': operation_id, 'type': 'error', 'payload': response['errors']})
+        else:
+            await websocket.send_json({'id': operation_id, 'type': 'data', 'payload': response})
+
+    def _on_mutation(self):
+        self.loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self._refresh()))
+
+    async def _refresh(self):
+        for websocket, operations in list(self.connections.items()):
+            for operation_id, operation in list(operations.items()):
+                try:
+                    await self._publish(websocket, operation_id, operation)
+                except ConnectionError:
+                    break
+
+# Usage
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve an in-memory Dgraph GraphQL stand-in on localhost.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Maximum extra random seconds per request')
+    parser.add_argument('--orders', type=int, default=0, help='Seed the graph with this many synthetic orders')
+    args = parser.parse_args()
+
+    graph = InMemoryDgraph()
+    if args.orders:
+        from generate_synthetic_data import SyntheticDataGenerator
+        generator = SyntheticDataGenerator(members=max(args.orders // 10, 1), products=max(args.orders // 100, 20), orders=args.orders)
+        graph.load(generator.members(), generator.products(), generator.orders(), generator.reviews())
+
+    server = DgraphStubServer(graph, args.host, args.port, args.latency, args.jitter).start()
+    print('Serving %s (Ctrl+C to stop)' % server.url)
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
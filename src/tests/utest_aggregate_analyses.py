@@ -0,0 +1,76 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests aiohttp numpy
+# python -m unittest utest_aggregate_analyses.py
+# deactivate
+
+import os
+import sys
+import json
+import unittest
+
+# Add the backend and examples directories to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from dgraph_stub_server import InMemoryDgraph
+from analysis_engine import AnalysisAPI
+from generate_synthetic_data import SyntheticDataGenerator
+
+class TestAggregatePushdown(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        generator = SyntheticDataGenerator(members=50, products=20, orders=1000, seed=3)
+        cls.graph = InMemoryDgraph()
+        cls.graph.load(generator.members(), generator.products(), generator.orders(), generator.reviews())
+        cls.full = AnalysisAPI(cls.graph)
+        cls.pushed = AnalysisAPI(cls.graph, aggregate=True)
+
+    def test_segmentation_counts_match(self):
+        full = {member['memberId']: member for member in self.full.customer_segmentation()['data']['queryMember']}
+        for member in self.pushed.customer_segmentation()['data']['queryMember']:
+            expected = full[member['memberId']]
+            self.assertEqual(member['ordersAggregate']['count'], len(expected['orders']))
+            self.assertEqual(member['reviewsAggregate']['count'], len(expected['reviews']))
+
+    def test_lifetime_value_and_churn_metrics_match(self):
+        full = {member['memberId']: member['orders'] for member in self.full.customer_lifetime_value()['data']['queryMember']}
+        for member in self.pushed.customer_lifetime_value()['data']['queryMember']:
+            orders = full[member['memberId']]
+            aggregate = member['ordersAggregate']
+            self.assertEqual(aggregate['count'], len(orders))
+            if orders:
+                self.assertAlmostEqual(aggregate['totalSum'], sum(order['total'] for order in orders))
+                self.assertEqual(aggregate['dateMax'], max(order['date'] for order in orders))
+        churn = self.pushed.churn_analysis()
+        self.assertNotIn('errors', churn)
+        self.assertIn('ratingAvg', churn['data']['queryMember'][0]['reviewsAggregate'])
+
+    def test_product_performance_runs(self):
+        # Product has no orders edge, so the aggregate mode only pushes down the review metrics
+        response = self.pushed.product_performance_analysis()
+        self.assertNotIn('errors', response)
+        full = {product['productId']: product for product in self.graph.query("""
+        query { queryProduct { productId reviews { rating } } }
+        """)['data']['queryProduct']}
+        for product in response['data']['queryProduct']:
+            ratings = [review['rating'] for review in full[product['productId']]['reviews']]
+            self.assertEqual(product['reviewsAggregate']['count'], len(ratings))
+            if ratings:
+                self.assertAlmostEqual(product['reviewsAggregate']['ratingAvg'], sum(ratings) / len(ratings))
+
+    def test_response_is_smaller(self):
+        full = len(json.dumps(self.full.customer_segmentation()))
+        pushed = len(json.dumps(self.pushed.customer_segmentation()))
+        self.assertLess(pushed, full / 2)
+
+    def test_query_document_follows_the_mode(self):
+        self.assertIn('ordersAggregate', self.pushed.query_document('churn_analysis'))
+        self.assertNotIn('ordersAggregate', self.full.query_document('churn_analysis'))
+        # Analyses that need the individual records are unchanged
+        self.assertEqual(self.pushed.query_document('market_basket_analysis'),
+                         self.full.query_document('market_basket_analysis'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install aiohttp
+# python -m unittest utest_async_analysis_api.py
+# deactivate
+
+import os
+import sys
+import asyncio
+import unittest
+from aiohttp import web
+
+# Add the src directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+from analysis_engine import ANALYSES, AsyncDgraphClient, AsyncAnalysisAPI
+
+class TestAsyncAnalysisAPI(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        async def graphql(request):
+            # Track how many queries the server is handling at the same time
+            body = await request.json()
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.05)
+            self.in_flight -= 1
+            return web.json_response({'data': {'echo': body['query'].split()[1]}})
+
+        app = web.Application()
+        app.router.add_post('/graphql', graphql)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+
+        self.client = AsyncDgraphClient('http://127.0.0.1:%d/graphql' % port)
+        self.analysis_api = AsyncAnalysisAPI(self.client)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.runner.cleanup()
+
+    async def test_single_analysis(self):
+        response = await self.analysis_api.market_basket_analysis()
+
+        self.assertEqual(response, {'data': {'echo': 'MarketBasketAnalysis'}})
+
+    async def test_run_all_returns_every_analysis_in_order(self):
+        responses = await self.analysis_api.run_all(concurrency=len(ANALYSES))
+
+        self.assertEqual(list(responses), [name for name, _ in ANALYSES])
+        self.assertEqual(responses['churn_analysis'], {'data': {'echo': 'ChurnAnalysis'}})
+        self.assertGreater(self.max_in_flight, 1)
+
+    async def test_run_all_respects_concurrency_limit(self):
+        await self.analysis_api.run_all(concurrency=3)
+
+        self.assertEqual(self.max_in_flight, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install responses
+# python -m unittest utest_bulk_insert.py
+# deactivate
+
+import os
+import sys
+import json
+import unittest
+import requests
+import responses
+from datetime import datetime
+
+# Add the examples directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from create_mock_data import DgraphDataInserter
+
+class TestBulkInsert(unittest.TestCase):
+    def setUp(self):
+        self.inserter = DgraphDataInserter('http://localhost:8080/graphql', batch_size=10, workers=3, max_retries=2)
+        self.inserter.retry_delay = 0
+        self.batches = []
+
+    def _accept(self, request):
+        body = json.loads(request.body)
+        self.batches.append(body['variables']['input'])
+        return 200, {}, json.dumps({'data': {'addMember': {'numUids': len(body['variables']['input'])}}})
+
+    @responses.activate
+    def test_records_are_chunked_into_batches(self):
+        responses.add_callback(responses.POST, 'http://localhost:8080/graphql', callback=self._accept)
+        members = (('m%d' % i, 'Member %d' % i, 'm%d@example.com' % i) for i in range(35))
+
+        report = self.inserter.insert_members_bulk(members)
+
+        self.assertEqual(report.inserted, 35)
+        self.assertEqual(report.batches, 4)
+        self.assertEqual(report.failures, [])
+        self.assertEqual(sorted(len(batch) for batch in self.batches), [5, 10, 10, 10])
+        self.assertIn('addMember(input: $input)', json.loads(responses.calls[0].request.body)['query'])
+
+    @responses.activate
+    def test_transient_failures_are_retried(self):
+        responses.add(responses.POST, 'http://localhost:8080/graphql', status=503)
+        responses.add_callback(responses.POST, 'http://localhost:8080/graphql', callback=self._accept)
+        orders = [{'order_id': '1', 'member_id': '1', 'product_ids': ['1', '2'], 'total': 24.98, 'date': datetime(2024, 1, 1)}]
+
+        report = self.inserter.insert_orders_bulk(orders)
+
+        self.assertEqual(report.inserted, 1)
+        self.assertEqual(report.retries, 1)
+        self.assertEqual(self.batches[0][0]['products'], [{'productId': '1'}, {'productId': '2'}])
+        self.assertEqual(self.batches[0][0]['date'], '2024-01-01T00:00:00')
+
+    @responses.activate
+    def test_committed_batch_with_lost_response_is_not_a_failure(self):
+        committed = set()
+
+        def commit_once(request):
+            ids = [member['memberId'] for member in json.loads(request.body)['variables']['input']]
+            if committed & set(ids):
+                return 200, {}, json.dumps({'errors': [{'message': 'id %s already exists for field memberId' % ids[0]}]})
+            committed.update(ids)
+            # Committed, but the connection drops before the response arrives
+            raise requests.ConnectionError('Connection aborted')
+
+        responses.add_callback(responses.POST, 'http://localhost:8080/graphql', callback=commit_once)
+
+        report = self.inserter.insert_members_bulk([('m1', 'Member 1', 'm1@example.com')])
+
+        self.assertEqual((report.inserted, report.failed, report.retries), (1, 0, 1))
+        self.assertEqual(committed, {'m1'})
+
+    @responses.activate
+    def test_read_timeouts_and_server_errors_are_not_resent(self):
+        responses.add(responses.POST, 'http://localhost:8080/graphql', body=requests.ReadTimeout('Read timed out'))
+        responses.add(responses.POST, 'http://localhost:8080/graphql', status=500, json={'errors': [{'message': 'internal'}]})
+
+        first = self.inserter.insert_members_bulk([('m1', 'Member 1', 'm1@example.com')])
+        second = self.inserter.insert_members_bulk([('m2', 'Member 2', 'm2@example.com')])
+
+        self.assertIn('Read timed out', first.failures[0][2])
+        self.assertEqual(second.failures[0][2], [{'message': 'internal'}])
+        self.assertEqual((first.retries, second.retries, len(responses.calls)), (0, 0, 2))
+
+    @responses.activate
+    def test_failed_batches_are_reported(self):
+        responses.add(responses.POST, 'http://localhost:8080/graphql',
+                      json={'errors': [{'message': 'id 1 already exists for field productId'}]}, status=200)
+        products = [('1', 'Lipstick', 'A red lipstick', 15.99, 'Beauty')]
+
+        report = self.inserter.insert_products_bulk(products)
+
+        self.assertEqual(report.inserted, 0)
+        self.assertEqual(report.failed, 1)
+        index, records, error = report.failures[0]
+        self.assertEqual((index, records), (0, products))
+        self.assertIn('already exists', error[0]['message'])
+        # GraphQL errors are not transient, so the batch is sent once
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_non_json_responses_fail_the_batch(self):
+        responses.add(responses.POST, 'http://localhost:8080/graphql', body='<html>Bad gateway</html>', status=200)
+        members = [('m%d' % i, 'Member %d' % i, 'm%d@example.com' % i) for i in range(15)]
+
+        report = self.inserter.insert_members_bulk(members)
+
+        self.assertEqual((report.batches, report.inserted, report.failed), (2, 0, 15))
+        self.assertIn('not JSON', report.failures[0][2])
+
+    @responses.activate
+    def test_requests_time_out(self):
+        responses.add_callback(responses.POST, 'http://localhost:8080/graphql', callback=self._accept)
+        self.inserter.timeout = 5
+        self.inserter.insert_members_bulk([('m1', 'Member 1', 'm1@example.com')])
+        self.assertEqual(responses.calls[0].request.req_kwargs['timeout'], 5)
+
+if __name__ == '__main__':
+    unittest.main()
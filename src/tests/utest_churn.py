@@ -0,0 +1,165 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests aiohttp ijson numpy scipy
+# python -m unittest utest_churn.py
+# deactivate
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# Add the backend and examples directories to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from dgraph_stub_server import InMemoryDgraph
+from analysis_engine import AnalysisAPI
+from generate_synthetic_data import SyntheticDataGenerator
+from churn import ChurnFeatureStore, ChurnModel
+from columnar import to_datetime64
+
+NOW = '2024-03-01'
+FEATURES = ChurnFeatureStore.FEATURES
+
+class TestChurnFeatureStore(unittest.TestCase):
+    def test_features(self):
+        store = ChurnFeatureStore(rating_weight=0.5)
+        store.add_orders(['1', '1', '1', '2'], ['2024-01-01', '2024-01-11', '2024-01-31', '2024-02-20'])
+        store.add_reviews(['1', '1'], [5, 1], ['2024-01-02', '2024-02-01'])
+        features = dict(zip(FEATURES, store.features(NOW)[0]))
+        self.assertEqual(features['days_since_last_order'], 30)
+        self.assertEqual(features['order_count'], 3)
+        self.assertEqual(features['mean_gap'], 15)
+        self.assertEqual(features['gap_std'], 5)
+        self.assertEqual(features['max_gap'], 20)
+        self.assertEqual(features['overdue_ratio'], 2)
+        # Bias-corrected weights: 0.25 for the 5-star review, 0.5 for the later 1-star one
+        self.assertAlmostEqual(features['rating_average'], (0.25 * 5 + 0.5 * 1) / 0.75)
+        self.assertEqual(features['negative_reviews'], 1)
+        single = dict(zip(FEATURES, store.features(NOW)[1]))
+        self.assertTrue(np.isnan(single['mean_gap']))
+        self.assertTrue(np.isnan(single['rating_average']))
+
+    def test_incremental_updates_match_a_full_load(self):
+        rng = np.random.default_rng(0)
+        members = rng.integers(0, 50, 2000).astype(str)
+        dates = np.datetime64('2024-01-01') + np.sort(rng.integers(0, 365, 2000)).astype('timedelta64[D]')
+        ratings = rng.integers(1, 6, 2000)
+        full = ChurnFeatureStore()
+        full.add_orders(members, dates)
+        full.add_reviews(members, ratings, dates)
+        incremental = ChurnFeatureStore(capacity=4)
+        for start in range(0, 2000, 300):
+            batch = slice(start, start + 300)
+            incremental.add_orders(members[batch], dates[batch])
+            incremental.add_reviews(members[batch], ratings[batch], dates[batch])
+        order = [incremental.index[member_id] for member_id in full.member_ids]
+        np.testing.assert_allclose(incremental.features(NOW)[order], full.features(NOW), equal_nan=True)
+
+    def test_only_touched_members_are_recomputed(self):
+        store = ChurnFeatureStore()
+        store.add_orders(['1', '2'], ['2024-01-01', '2024-01-05'])
+        store.features(NOW)
+        self.assertFalse(store.touched[:store.size].any())
+        store.add_orders(['2'], ['2024-02-05'])
+        self.assertEqual(list(store.touched[:store.size]), [False, True])
+        features = store.features('2024-03-05')
+        self.assertEqual(list(features[:, 0]), [64, 29])
+
+    def test_update_polls_new_records(self):
+        generator = SyntheticDataGenerator(members=30, products=10, orders=300, seed=6)
+        graph = InMemoryDgraph()
+        graph.load(generator.members(), generator.products(), generator.orders(), generator.reviews())
+        store = ChurnFeatureStore()
+        orders, reviews = store.update(graph)
+        self.assertEqual(orders, 300)
+        expected = {member['memberId']: len(member['orders'])
+                    for member in AnalysisAPI(graph).churn_analysis()['data']['queryMember'] if member['orders']}
+        self.assertEqual({member_id: int(store.order_count[code]) for member_id, code in store.index.items()}, expected)
+
+        self.assertEqual(store.update(graph), (0, 0))
+        store.features(NOW)
+        latest = store.watermarks['orders'][0]
+        product_id = next(iter(generator.products()))[0]
+        graph.mutate("""
+        mutation($input: [AddOrderInput!]!) { addOrder(input: $input) { numUids } }
+        """, {'input': [{'orderId': 'new', 'member': {'memberId': store.member_ids[0]}, 'products': [{'productId': product_id}],
+                         'total': 10.0, 'date': str(latest)}]})
+        self.assertEqual(store.update(graph), (1, 0))
+        self.assertEqual(list(np.flatnonzero(store.touched[:store.size])), [0])
+
+    def test_seed_then_update_adds_nothing_twice(self):
+        generator = SyntheticDataGenerator(members=30, products=10, orders=300, seed=6)
+        graph = InMemoryDgraph()
+        graph.load(generator.members(), generator.products(), generator.orders(), generator.reviews())
+        store = ChurnFeatureStore()
+        store.seed(AnalysisAPI(graph).churn_analysis()['data']['queryMember'])
+        polled = ChurnFeatureStore()
+        polled.update(graph)
+        self.assertEqual(int(store.order_count.sum()), 300)
+        self.assertEqual(store.watermarks['orders'][0], polled.watermarks['orders'][0])
+        self.assertEqual(store.watermarks['reviews'][0], polled.watermarks['reviews'][0])
+
+        self.assertEqual(store.update(graph), (0, 0))
+        order = [store.index[member_id] for member_id in polled.member_ids]
+        np.testing.assert_allclose(store.features(NOW)[order], polled.features(NOW), equal_nan=True)
+
+        with self.assertRaises(ValueError):
+            ChurnFeatureStore().seed([{'memberId': '1', 'reviews': [{'rating': 5}]}])
+
+    def test_watermark_compares_dates_not_strings(self):
+        # Dgraph prints fractions of any length, and '...:00Z' > '...:00.5Z' as strings
+        orders = [{'orderId': '1', 'member': {'memberId': 'a'}, 'date': '2024-01-01T00:00:00.5Z'},
+                  {'orderId': '2', 'member': {'memberId': 'a'}, 'date': '2024-01-01T00:00:00Z'}]
+        client = DatedRecords(orders)
+        store = ChurnFeatureStore()
+        self.assertEqual(store.update(client), (2, 0))
+        self.assertEqual(store.watermarks['orders'][0], np.datetime64('2024-01-01T00:00:00.500'))
+        self.assertEqual(client.since[-1], '1970-01-01T00:00:00Z')
+        orders.append({'orderId': '3', 'member': {'memberId': 'a'}, 'date': '2024-01-01T00:00:01Z'})
+        self.assertEqual(store.update(client), (1, 0))
+        self.assertEqual(client.since[-2], '2024-01-01T00:00:00.500Z')
+        self.assertEqual(store.update(client), (0, 0))
+        self.assertEqual(int(store.order_count[0]), 3)
+
+class DatedRecords:
+    """
+    Answers the polling queries with the orders dated at or after $since.
+    """
+    def __init__(self, orders):
+        self.orders = orders
+        self.since = []
+
+    def query(self, query, variables):
+        self.since.append(variables['since'])
+        since = to_datetime64(variables['since'])
+        root = 'queryOrder' if 'queryOrder' in query else 'queryReview'
+        records = self.orders if root == 'queryOrder' else []
+        return {'data': {root: [record for record in records if to_datetime64(record['date']) >= since]}}
+
+class TestChurnModel(unittest.TestCase):
+    def test_recent_regular_buyers_score_lower(self):
+        rng = np.random.default_rng(1)
+        store = ChurnFeatureStore()
+        churned = []
+        for member in range(400):
+            gap = rng.uniform(5, 30)
+            stopped = rng.random() < 0.4
+            last = rng.uniform(120, 180) if stopped else rng.uniform(300, 365)
+            days = np.arange(0, last, gap)
+            store.add_orders([str(member)] * len(days), np.datetime64('2023-01-01') + days.astype('timedelta64[D]'))
+            churned.append(stopped)
+        features = store.features('2024-01-01')
+        model = ChurnModel().fit(features, churned)
+        risk = model.predict_proba(features)
+        churned = np.array(churned)
+        self.assertGreater(risk[churned].mean(), 0.8)
+        self.assertLess(risk[~churned].mean(), 0.2)
+        scores = model.score(store, '2024-01-01')
+        self.assertEqual(len(scores), 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests aiohttp ijson numpy pyarrow
+# python -m unittest utest_columnar.py
+# deactivate
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# Add the backend and examples directories to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from dgraph_stub_server import InMemoryDgraph, DgraphStubServer
+from analysis_engine import DgraphClient, AnalysisAPI
+from generate_synthetic_data import SyntheticDataGenerator
+import columnar
+from columnar import to_columnar
+
+ORDERS = [
+    {'orderId': '1', 'member': {'memberId': 'm1'}, 'total': 15.99, 'date': '2024-01-05T10:00:00Z',
+     'products': [{'productId': 'p1'}, {'productId': 'p2'}]},
+    {'orderId': '2', 'member': None, 'total': None, 'date': '2024-02-10T12:00:00+02:00', 'products': []},
+    {'orderId': '3', 'member': {'memberId': 'm2'}, 'total': 25, 'products': [{'productId': 'p2'}]},
+]
+
+class TestToColumnar(unittest.TestCase):
+    def setUp(self):
+        self.table = to_columnar(ORDERS)
+
+    def test_scalar_columns_are_typed(self):
+        self.assertEqual(len(self.table), 3)
+        self.assertEqual(self.table.column('orderId').dtype, np.int32)
+        self.assertEqual(list(self.table.decode('orderId')), ['1', '2', '3'])
+        self.assertEqual(list(self.table.decode('member.memberId')), ['m1', None, 'm2'])
+        total = self.table.column('total')
+        self.assertEqual(total.dtype, np.float64)
+        self.assertEqual(total[0], 15.99)
+        self.assertTrue(np.isnan(total[1]))
+        np.testing.assert_array_equal(self.table.column('date'), np.array(
+            ['2024-01-05T10:00:00', '2024-02-10T10:00:00', 'NaT'], dtype='datetime64[ms]'))
+
+    def test_nested_lists_use_offsets_and_shared_dictionaries(self):
+        self.assertEqual(list(self.table.offsets('products')), [0, 2, 2, 3])
+        products = self.table.child('products')
+        self.assertEqual(list(products.column('productId')), [0, 1, 1])
+        self.assertEqual(list(products.decode('productId')), ['p1', 'p2', 'p2'])
+        self.assertEqual(list(self.table.parent_index('products')), [0, 0, 2])
+
+    def test_aggregate_fields_are_flattened(self):
+        table = to_columnar([
+            {'memberId': '1', 'ordersAggregate': {'count': 2, 'totalSum': 40.5, 'dateMax': '2024-03-01T00:00:00Z'}},
+            {'memberId': '2', 'ordersAggregate': None},
+        ])
+        self.assertEqual(list(table.column('ordersAggregate.count')[:1]), [2])
+        self.assertTrue(np.isnan(table.column('ordersAggregate.count')[1]))
+        self.assertEqual(table.column('ordersAggregate.totalSum').dtype, np.float64)
+        self.assertEqual(table.column('ordersAggregate.dateMax').dtype, np.dtype('datetime64[ms]'))
+
+    def test_int_column_first_seen_after_nulls(self):
+        table = to_columnar([{'ratingMin': None}, {'ratingMin': 3}, {'ratingMin': None}])
+        np.testing.assert_array_equal(table.column('ratingMin'), [np.nan, 3, np.nan])
+        members = to_columnar([{'reviewsAggregate': {'ratingMin': None}}, {'reviewsAggregate': {'ratingMin': 4}}])
+        np.testing.assert_array_equal(members.column('reviewsAggregate.ratingMin'), [np.nan, 4])
+
+    @unittest.skipIf(columnar.pa is None, "pyarrow is not installed")
+    def test_to_arrow(self):
+        arrow = self.table.to_arrow()
+        self.assertEqual(arrow.num_rows, 3)
+        self.assertEqual(arrow.column('total').to_pylist(), [15.99, None, 25.0])
+        self.assertEqual(arrow.column('member.memberId').to_pylist(), ['m1', None, 'm2'])
+        self.assertEqual(arrow.column('products').to_pylist(), [['p1', 'p2'], [], ['p2']])
+        self.assertEqual(str(arrow.schema.field('date').type), 'timestamp[ms, tz=UTC]')
+
+class TestAnalysisToColumnar(unittest.TestCase):
+    def setUp(self):
+        generator = SyntheticDataGenerator(members=30, products=15, orders=500, seed=5)
+        graph = InMemoryDgraph()
+        graph.load(generator.members(), generator.products(), generator.orders(), generator.reviews())
+        self.server = DgraphStubServer(graph).start()
+        self.addCleanup(self.server.stop)
+        self.graph = graph
+
+    def test_matches_the_dict_response(self):
+        api = AnalysisAPI(DgraphClient(self.server.url))
+        table = api.to_columnar('demand_forecasting')
+        orders = self.graph.query(api.query_document('demand_forecasting'))['data']['queryOrder']
+        self.assertEqual(len(table), len(orders))
+        self.assertEqual(list(table.decode('orderId')), [order['orderId'] for order in orders])
+        np.testing.assert_array_equal(table.column('total'), [order['total'] for order in orders])
+        offsets = table.offsets('products')
+        product_ids = table.child('products').decode('productId')
+        for i, order in enumerate(orders):
+            self.assertEqual(list(product_ids[offsets[i]:offsets[i + 1]]),
+                             [product['productId'] for product in order['products']])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,8 @@
 # python -m unittest utest_dgraph_client.py
 # deactivate
 
+import os
+import sys
 import unittest
 import responses
 
@@ -12,7 +14,7 @@ import responses
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
 
 # Now you can import DgraphClient
-from analysis_engine import DgraphClient
+from analysis_engine import DgraphClient, HttpTransport, get_default_transport
 
 class TestDgraphClient(unittest.TestCase):
     def setUp(self):
@@ -103,5 +105,30 @@ class TestDgraphClient(unittest.TestCase):
 
         self.assertTrue('Network error' in str(context.exception))
 
+    def test_clients_share_default_transport(self):
+        other = DgraphClient('http://localhost:8080/graphql')
+
+        # Every client without an explicit transport reuses the same connection pool
+        self.assertIs(self.client.transport, other.transport)
+        self.assertIs(self.client.transport, get_default_transport())
+
+    @responses.activate
+    def test_query_with_custom_transport(self):
+        responses.add(
+            responses.POST,
+            'http://localhost:8080/graphql',
+            json={'data': {'queryMember': []}},
+            status=200
+        )
+
+        transport = HttpTransport(pool_maxsize=2, timeout=5)
+        client = DgraphClient('http://localhost:8080/graphql', transport=transport)
+
+        response = client.query("query { queryMember { memberId } }")
+
+        self.assertEqual(response, {'data': {'queryMember': []}})
+        self.assertEqual(len(responses.calls), 1)
+        transport.close()
+
 if __name__ == '__main__':
     unittest.main()
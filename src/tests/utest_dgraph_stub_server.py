@@ -0,0 +1,150 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests aiohttp websockets
+# python -m unittest utest_dgraph_stub_server.py
+# deactivate
+
+import os
+import sys
+import time
+import asyncio
+import unittest
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+from dgraph_stub_server import InMemoryDgraph, DgraphStubServer
+from analysis_engine import DgraphClient, AnalysisAPI
+from subscriptions import SubscriptionManager
+
+MEMBERS = [('1', 'Alice Smith', 'alice@example.com'), ('2', 'Bob Jones', 'bob@example.com'), ('3', 'Carol Smith', None)]
+PRODUCTS = [('1', 'Lipstick', 'A red lipstick', 15.99, 'Beauty'), ('2', 'Serum', 'A hydrating serum', 25.0, 'Skincare')]
+ORDERS = [
+    ('1', '1', ['1'], 15.99, '2024-01-05T10:00:00'),
+    ('2', '1', ['1', '2'], 40.99, '2024-02-10T12:00:00'),
+    ('3', '2', ['2'], 25.0, '2024-03-15T09:30:00'),
+]
+REVIEWS = [('1', 5, 'Great!', '1', '1', '2024-01-06T00:00:00'), ('2', 2, 'Meh', '2', '2', '2024-03-20T00:00:00')]
+
+class TestInMemoryDgraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = InMemoryDgraph()
+        self.graph.load(MEMBERS, PRODUCTS, ORDERS, REVIEWS)
+
+    def test_query_with_nested_edges_and_inverses(self):
+        response = self.graph.query("""
+        query { getMember(memberId: "1") { name orders(order: {desc: date}) { orderId date products { productId } } } }
+        """)
+        self.assertEqual(response['data']['getMember'], {'name': 'Alice Smith', 'orders': [
+            {'orderId': '2', 'date': '2024-02-10T12:00:00Z', 'products': [{'productId': '1'}, {'productId': '2'}]},
+            {'orderId': '1', 'date': '2024-01-05T10:00:00Z', 'products': [{'productId': '1'}]},
+        ]})
+        response = self.graph.query('query { getProduct(productId: "2") { reviews { reviewId member { memberId } } } }')
+        self.assertEqual(response['data']['getProduct']['reviews'], [{'reviewId': '2', 'member': {'memberId': '2'}}])
+
+    def test_filter_order_and_pagination(self):
+        response = self.graph.query("""
+        query($min: Float, $first: Int) {
+          queryOrder(filter: {total: {ge: $min}, not: {orderId: {eq: "3"}}}, order: {desc: total}, first: $first) { orderId }
+          byDate: queryOrder(filter: {date: {between: {min: "2024-02-01", max: "2024-12-31"}}}, order: {asc: orderId}, offset: 1) { orderId }
+          queryMember(filter: {or: [{name: {anyofterms: "carol"}}, {email: {eq: "bob@example.com"}}]}, order: {asc: email}) { memberId }
+          byMember: queryOrder(filter: {member: {memberId: {in: ["2"]}}}) { orderId }
+        }
+        """, {'min': 15.99, 'first': 1})
+        data = response['data']
+        self.assertEqual(data['queryOrder'], [{'orderId': '2'}])
+        self.assertEqual(data['byDate'], [{'orderId': '3'}])
+        # Members without an email sort last
+        self.assertEqual(data['queryMember'], [{'memberId': '2'}, {'memberId': '3'}])
+        self.assertEqual(data['byMember'], [{'orderId': '3'}])
+
+    def test_aggregates(self):
+        response = self.graph.query("""
+        query {
+          aggregateOrder(filter: {total: {gt: 20}}) { count totalSum totalMax dateMin }
+          queryMember(filter: {memberId: {eq: "1"}}) { ordersAggregate { count totalAvg } reviewsAggregate { ratingAvg } }
+        }
+        """)
+        aggregate = response['data']['aggregateOrder']
+        self.assertAlmostEqual(aggregate.pop('totalSum'), 65.99)
+        self.assertEqual(aggregate, {'count': 2, 'totalMax': 40.99, 'dateMin': '2024-02-10T12:00:00Z'})
+        member = response['data']['queryMember'][0]
+        self.assertEqual(member['ordersAggregate']['count'], 2)
+        self.assertAlmostEqual(member['ordersAggregate']['totalAvg'], 28.49)
+        self.assertEqual(member['reviewsAggregate'], {'ratingAvg': 5.0})
+
+    def test_add_update_delete(self):
+        response = self.graph.mutate("""
+        mutation($input: [AddOrderInput!]!) { addOrder(input: $input) { numUids order { orderId member { memberId } } } }
+        """, {'input': [{'orderId': '4', 'member': {'memberId': '4', 'name': 'Dan'},
+                         'products': [{'productId': '1'}], 'total': 15.99, 'date': '2024-04-01T00:00:00Z'}]})
+        # The new member is created along with the order
+        self.assertEqual(response['data']['addOrder'], {'numUids': 2, 'order': [{'orderId': '4', 'member': {'memberId': '4'}}]})
+
+        response = self.graph.mutate("""
+        mutation { updateOrder(input: {filter: {orderId: {eq: "4"}}, set: {total: 20.5, member: {memberId: "2"}}}) { numUids } }
+        """)
+        self.assertEqual(response['data']['updateOrder']['numUids'], 1)
+        response = self.graph.query('query { getMember(memberId: "2") { orders { orderId total } } getMember4: getMember(memberId: "4") { orders { orderId } } }')
+        self.assertEqual(response['data']['getMember']['orders'], [{'orderId': '3', 'total': 25.0}, {'orderId': '4', 'total': 20.5}])
+        self.assertEqual(response['data']['getMember4']['orders'], [])
+
+        response = self.graph.mutate('mutation { deleteProduct(filter: {productId: {eq: "1"}}) { msg numUids product { name } } }')
+        self.assertEqual(response['data']['deleteProduct'], {'msg': 'Deleted', 'numUids': 1, 'product': [{'name': 'Lipstick'}]})
+        response = self.graph.query('query { getOrder(orderId: "2") { products { productId } } getReview(reviewId: "1") { product { productId } } }')
+        self.assertEqual(response['data'], {'getOrder': {'products': [{'productId': '2'}]}, 'getReview': {'product': None}})
+
+    def test_failed_mutation_is_rolled_back(self):
+        response = self.graph.mutate("""
+        mutation { addMember(input: [{memberId: "9", name: "New"}, {memberId: "1", name: "Duplicate"}]) { numUids } }
+        """)
+        self.assertIn('already exists', response['errors'][0]['message'])
+        self.assertIsNone(self.graph.query('query { getMember(memberId: "9") { name } }')['data']['getMember'])
+        self.assertEqual(self.graph.count('Member'), 3)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.graph.query('query { queryProduct { productId orders { orderId } } }')
+        self.assertEqual(response['errors'][0]['message'], 'Cannot query field "orders" on type "Product".')
+
+    def test_stands_in_for_the_client(self):
+        response = AnalysisAPI(self.graph).market_basket_analysis()
+        self.assertEqual(len(response['data']['queryOrder']), 3)
+
+class TestDgraphStubServer(unittest.TestCase):
+    def setUp(self):
+        graph = InMemoryDgraph()
+        graph.load(MEMBERS, PRODUCTS, ORDERS, REVIEWS)
+        self.server = DgraphStubServer(graph).start()
+        self.addCleanup(self.server.stop)
+
+    def test_serves_queries_over_http(self):
+        client = DgraphClient(self.server.url)
+        response = AnalysisAPI(client).sales_trend_analysis()
+        self.assertEqual([order['orderId'] for order in response['data']['queryOrder']], ['1', '2', '3'])
+        self.assertEqual(self.server.requests, 1)
+
+    def test_injected_latency(self):
+        client = DgraphClient(self.server.url)
+        self.server.latency = 0.05
+        started = time.perf_counter()
+        client.query('query { queryMember { memberId } }')
+        self.assertGreaterEqual(time.perf_counter() - started, 0.05)
+
+    def test_subscriptions_receive_changes(self):
+        async def run():
+            async with SubscriptionManager(self.server.url) as manager:
+                subscription = await manager.subscribe('subscription { aggregateOrder { count } }')
+                first = await asyncio.wait_for(subscription.__anext__(), 5)
+                await asyncio.get_running_loop().run_in_executor(None, DgraphClient(self.server.url).mutate, """
+                mutation { deleteOrder(filter: {orderId: {eq: "1"}}) { numUids } }
+                """)
+                second = await asyncio.wait_for(subscription.__anext__(), 5)
+                return first, second
+
+        first, second = asyncio.run(run())
+        self.assertEqual(first['data']['aggregateOrder']['count'], 3)
+        self.assertEqual(second['data']['aggregateOrder']['count'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests responses
+# python -m unittest utest_etl_loader.py
+# deactivate
+
+import os
+import sys
+import time
+import itertools
+import threading
+import unittest
+import responses
+
+# Add the examples directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from create_mock_data import DgraphDataInserter
+from etl_loader import EtlLoader, load_order
+
+class FakeInserter:
+    """
+    Stands in for DgraphDataInserter: "commits" batches in memory and logs every event.
+    Member batches are slow, so orders have to wait for them.
+    """
+    graphql_endpoint = 'http://localhost:8080/graphql'
+
+    def __init__(self, failing_ids=()):
+        self.events = []
+        self.lock = threading.Lock()
+        self.failing_ids = set(failing_ids)
+
+    def _bulk(self, type_name, records, on_batch, delay=0.0):
+        records = iter(records)
+        for batch in iter(lambda: list(itertools.islice(records, 2)), []):
+            time.sleep(delay)
+            error = 'failed' if any(record[0] in self.failing_ids for record in batch) else None
+            with self.lock:
+                self.events.append((type_name, [record[0] for record in batch], error))
+            on_batch(batch, error)
+        return type_name
+
+    def insert_members_bulk(self, records, on_batch=None):
+        return self._bulk('Member', records, on_batch, delay=0.02)
+
+    def insert_products_bulk(self, records, on_batch=None):
+        return self._bulk('Product', records, on_batch)
+
+    def insert_orders_bulk(self, records, on_batch=None):
+        return self._bulk('Order', records, on_batch)
+
+    def insert_reviews_bulk(self, records, on_batch=None):
+        return self._bulk('Review', records, on_batch)
+
+MEMBERS = [('m%d' % i, 'Member %d' % i, 'm%d@example.com' % i) for i in range(6)]
+PRODUCTS = [('p%d' % i, 'Product %d' % i, '', 9.99, 'Beauty') for i in range(4)]
+
+class TestEtlLoader(unittest.TestCase):
+    def test_load_order(self):
+        self.assertEqual(load_order(), [['Member', 'Product'], ['Order', 'Review']])
+
+    def test_orders_wait_for_their_references(self):
+        inserter = FakeInserter()
+        orders = [('o%d' % i, 'm%d' % i, ['p0', 'p%d' % (i % 4)], 10.0, '2024-01-01') for i in range(6)]
+
+        results = EtlLoader(inserter, prefetch_existing=False).load(MEMBERS, PRODUCTS, orders, [])
+
+        committed = set()
+        for type_name, ids, error in inserter.events:
+            if type_name == 'Order':
+                for order in orders:
+                    if order[0] in ids:
+                        self.assertIn(order[1], committed)
+            committed.update(ids)
+        self.assertEqual(sum(len(ids) for type_name, ids, _ in inserter.events if type_name == 'Order'), 6)
+        self.assertEqual(results['Order']['rejected'], [])
+        # Orders are pipelined: some are sent before the last member batch
+        order_positions = [index for index, event in enumerate(inserter.events) if event[0] == 'Order']
+        member_positions = [index for index, event in enumerate(inserter.events) if event[0] == 'Member']
+        self.assertLess(order_positions[0], member_positions[-1])
+
+    def test_held_records_are_indexed_by_reference(self):
+        # The member load only commits once every order has been read and held back;
+        # rescanning the held orders on each new one would take minutes here
+        orders_read = threading.Event()
+        members = [('m%d' % i, 'Member %d' % i, '') for i in range(2000)]
+        orders = [('o%d' % i, 'm%d' % (i % 2000), ['p0'], 10.0, '2024-01-01') for i in range(20000)]
+
+        def read_orders():
+            yield from orders
+            orders_read.set()
+
+        class BlockedMembers(FakeInserter):
+            def insert_members_bulk(inner, records, on_batch=None):
+                self.assertTrue(orders_read.wait(10))
+                records = list(records)
+                on_batch(records, None)
+                return 'Member'
+
+        inserter = BlockedMembers()
+        started = time.time()
+        results = EtlLoader(inserter, prefetch_existing=False).load(members, PRODUCTS, read_orders(), [])
+        self.assertLess(time.time() - started, 10)
+        self.assertEqual(results['Order']['rejected'], [])
+        self.assertEqual(sum(len(ids) for type_name, ids, _ in inserter.events if type_name == 'Order'), 20000)
+
+    def test_dangling_and_failed_references_are_rejected(self):
+        inserter = FakeInserter(failing_ids={'m4'})
+        orders = [('o1', 'missing', ['p0'], 10.0, '2024-01-01'), ('o2', 'm1', ['p9'], 10.0, '2024-01-01')]
+        reviews = [('r1', 5, 'Great', 'm5', 'p1', '2024-01-02'), ('r2', 4, 'Good', 'm0', 'p1', '2024-01-02')]
+
+        results = EtlLoader(inserter, prefetch_existing=False).load(MEMBERS, PRODUCTS, orders, reviews)
+
+        self.assertEqual([(record[0], reason) for record, reason in results['Order']['rejected']],
+                         [('o1', 'unknown Member missing'), ('o2', 'unknown Product p9')])
+        self.assertEqual([record[0] for record, _ in results['Review']['rejected']], ['r1'])
+        self.assertNotIn('Order', [event[0] for event in inserter.events])
+        self.assertIn(('Review', ['r2'], None), inserter.events)
+
+    @responses.activate
+    def test_fetch_existing_ids(self):
+        url = 'http://localhost:8080/graphql'
+        responses.add(responses.POST, url, json={'data': {'queryMember': [{'memberId': 'm1'}, {'memberId': 'm2'}]}})
+        responses.add(responses.POST, url, json={'data': {'queryMember': [{'memberId': 'm3'}]}})
+        loader = EtlLoader(DgraphDataInserter(url, timeout=7), page_size=2)
+        self.assertEqual(loader.fetch_existing_ids('Member'), {'m1', 'm2', 'm3'})
+        self.assertEqual(responses.calls[0].request.req_kwargs['timeout'], 7)
+
+        responses.reset()
+        responses.add(responses.POST, url, json={'data': None, 'errors': [{'message': 'schema not loaded'}]})
+        with self.assertRaisesRegex(RuntimeError, 'schema not loaded'):
+            loader.fetch_existing_ids('Member')
+        responses.reset()
+        responses.add(responses.POST, url, json={'data': None})
+        with self.assertRaises(RuntimeError):
+            loader.fetch_existing_ids('Member')
+
+if __name__ == '__main__':
+    unittest.main()
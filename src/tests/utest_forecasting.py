@@ -0,0 +1,80 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests aiohttp ijson numpy
+# python -m unittest utest_forecasting.py
+# deactivate
+
+import os
+import sys
+import unittest
+from collections import Counter
+
+import numpy as np
+
+# Add the backend and examples directories to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from dgraph_stub_server import InMemoryDgraph
+from analysis_engine import AnalysisAPI
+from generate_synthetic_data import SyntheticDataGenerator
+from forecasting import DemandForecaster, demand_series
+
+class TestDemandSeries(unittest.TestCase):
+    def test_units_per_product_and_day(self):
+        orders = [
+            {'date': '2024-01-03T10:00:00Z', 'products': [{'productId': 'b'}, {'productId': 'a'}]},
+            {'date': '2024-01-01T09:00:00Z', 'products': [{'productId': 'b'}]},
+            {'date': '2024-01-03T18:00:00Z', 'products': [{'productId': 'b'}]},
+        ]
+        series = demand_series(orders)
+        self.assertEqual(list(series.product_ids), ['a', 'b'])
+        self.assertEqual(str(series.start), '2024-01-01')
+        np.testing.assert_array_equal(series.demand, [[0, 0, 1], [1, 0, 2]])
+        padded = demand_series(orders, start='2023-12-31', end='2024-01-02')
+        np.testing.assert_array_equal(padded.row('b'), [0, 1, 0])
+        self.assertEqual(len(padded.dates), 3)
+
+    def test_matches_order_counts(self):
+        generator = SyntheticDataGenerator(members=40, products=15, orders=800, seed=8)
+        graph = InMemoryDgraph()
+        graph.load(generator.members(), generator.products(), generator.orders(), generator.reviews())
+        records = AnalysisAPI(graph).demand_forecasting()['data']['queryOrder']
+        series = demand_series(records)
+        expected = Counter(product['productId'] for record in records for product in record['products'])
+        self.assertEqual({product_id: series.row(product_id).sum() for product_id in series.product_ids}, expected)
+
+class TestDemandForecaster(unittest.TestCase):
+    def test_seasonal_and_intermittent_demand(self):
+        rng = np.random.default_rng(0)
+        days = np.arange(364)
+        weekly = 10 + 6 * np.sin(2 * np.pi * days / 7)
+        regular = rng.poisson(np.tile(weekly, (20, 1)))
+        # About one sale of 4 units every 10 days
+        sparse = np.where(rng.random((20, 364)) < 0.1, 4, 0)
+        forecaster = DemandForecaster().fit(np.vstack([regular, sparse]))
+        self.assertEqual(list(forecaster.models), ['holt_winters'] * 20 + ['croston'] * 20)
+        forecast = forecaster.forecast(14)
+        self.assertEqual(forecast.shape, (40, 14))
+        self.assertTrue((forecast >= 0).all())
+        # The weekly pattern continues where the history stopped
+        np.testing.assert_allclose(forecast[:20].mean(axis=0), np.tile(weekly, 2)[:14], atol=1.5)
+        np.testing.assert_allclose(forecast[20:].mean(), 0.4, atol=0.1)
+
+    def test_backtest(self):
+        rng = np.random.default_rng(1)
+        demand = rng.poisson(np.linspace(1, 30, 50)[:, None], (50, 200)).astype(float)
+        demand[0] = 0
+        result = DemandForecaster().backtest(demand, horizon=14, folds=3)
+        self.assertEqual(result['mae'].shape, (50,))
+        self.assertEqual(result['mae'][0], 0)
+        self.assertTrue(np.isnan(result['mase'][0]))
+        # Poisson noise around a flat mean: the forecasts beat the seasonal naive forecast
+        self.assertLess(result['overall']['mase'], 1.0)
+        self.assertTrue((result['smape'][1:] < 2).all())
+        with self.assertRaises(ValueError):
+            DemandForecaster().backtest(demand[:, :20], horizon=14)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests aiohttp
+# python -m unittest utest_instrumentation.py
+# deactivate
+
+import os
+import sys
+import socket
+import unittest
+import requests
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+from dgraph_stub_server import InMemoryDgraph, DgraphStubServer
+from analysis_engine import AnalysisAPI, DgraphClient, HttpTransport
+from instrumentation import Instrumentation, PrometheusExporter, SpanCallback, TimingHTTPAdapter, describe_operation
+from result_cache import ResultCache
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        graph = InMemoryDgraph()
+        graph.load(members=[('1', 'Alice', 'alice@example.com'), ('2', 'Bob', 'bob@example.com')])
+        self.server = DgraphStubServer(graph).start()
+        self.addCleanup(self.server.stop)
+        self.timings = []
+        self.spans = []
+        self.exporter = PrometheusExporter()
+        self.instrumentation = Instrumentation(self.timings.append, SpanCallback(self.spans.append), self.exporter)
+        transport = HttpTransport()
+        self.addCleanup(transport.close)
+        self.client = DgraphClient(self.server.url, transport=transport, instrumentation=self.instrumentation)
+
+    def test_describe_operation(self):
+        self.assertEqual(describe_operation('query CustomerSegmentation { queryMember { memberId } }'),
+                         ('query', 'CustomerSegmentation'))
+        self.assertEqual(describe_operation('{ getMember(memberId: "1") { name } }'), ('query', 'getMember'))
+        self.assertEqual(describe_operation('not graphql {'), ('unknown', 'unknown'))
+
+    def test_times_each_phase(self):
+        AnalysisAPI(self.client).customer_segmentation()
+        AnalysisAPI(self.client).customer_segmentation()
+
+        first, second = self.timings
+        self.assertEqual((first.operation_type, first.operation_name), ('query', 'CustomerSegmentation'))
+        self.assertEqual(first.status_code, 200)
+        self.assertGreater(first.request_bytes, 0)
+        self.assertGreater(first.response_bytes, 0)
+        self.assertEqual(first.errors, 0)
+        self.assertGreater(first.phases['connect'], 0)
+        self.assertGreater(first.phases['ttfb'], 0)
+        self.assertAlmostEqual(sum(first.phases.values()), first.duration, delta=0.005)
+        # The second request reuses the pooled connection
+        self.assertEqual(second.phases['dns'], 0)
+        self.assertEqual(second.phases['connect'], 0)
+
+    def test_counts_graphql_and_transport_errors(self):
+        self.client.query('query Broken { queryProduct { orders { orderId } } }')
+        self.assertEqual(self.timings[-1].errors, 1)
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            closed_port = probe.getsockname()[1]
+        client = DgraphClient('http://127.0.0.1:%d/graphql' % closed_port, transport=HttpTransport(),
+                              instrumentation=self.instrumentation)
+        with self.assertRaises(requests.ConnectionError):
+            client.query('query Down { queryMember { memberId } }')
+        self.assertEqual((self.timings[-1].errors, self.timings[-1].error_type), (1, 'ConnectionError'))
+        self.assertEqual(self.spans[-1]['status'], {'code': 'ERROR'})
+
+    def test_spans_and_prometheus_text(self):
+        self.client.query('query Members { queryMember { memberId } }')
+        self.client.mutate('mutation { addMember(input: [{memberId: "3"}]) { numUids } }')
+
+        span = self.spans[0]
+        self.assertEqual(span['name'], 'query Members')
+        self.assertEqual(span['attributes']['graphql.operation.name'], 'Members')
+        self.assertGreater(span['end_time_unix_nano'], span['start_time_unix_nano'])
+        text = self.exporter.render()
+        self.assertIn('dgraph_client_requests_total{operation="Members",type="query"} 1', text)
+        self.assertIn('dgraph_client_requests_total{operation="addMember",type="mutation"} 1', text)
+        self.assertIn('dgraph_client_request_duration_seconds_count{operation="Members",type="query"} 1', text)
+        self.assertIn('phase="ttfb"', text)
+
+    def test_metrics_are_served_locally_by_default(self):
+        self.client.query('query Members { queryMember { memberId } }')
+        server = self.exporter.serve(port=0)
+        self.addCleanup(server.shutdown)
+
+        host, port = server.server_address
+        self.assertEqual(host, '127.0.0.1')
+        text = requests.get('http://127.0.0.1:%d/metrics' % port, timeout=5).text
+        self.assertIn('dgraph_client_requests_total{operation="Members",type="query"} 1', text)
+
+    def test_cache_hits_are_recorded(self):
+        self.client.cache = ResultCache()
+        self.client.query('query Members { queryMember { memberId } }')
+        self.client.query('query Members { queryMember { memberId } }')
+        self.assertEqual([timing.cache_hit for timing in self.timings], [False, True])
+
+    def test_streamed_queries_are_timed(self):
+        self.client.cache = ResultCache()
+        query = 'query Members { queryMember { memberId } }'
+        records = list(self.client.query_stream(query, chunk_size=16))
+
+        self.assertEqual([record['memberId'] for record in records], ['1', '2'])
+        timing, = self.timings
+        self.assertEqual((timing.operation_type, timing.operation_name, timing.status_code), ('query', 'Members', 200))
+        self.assertGreater(timing.request_bytes, 0)
+        self.assertGreater(timing.response_bytes, 0)
+        self.assertGreater(timing.phases['download'], 0)
+        self.assertAlmostEqual(sum(timing.phases.values()), timing.duration, delta=0.005)
+        # Streamed results are not cached
+        self.assertEqual(self.client.cache.stats()['entries'], 0)
+
+        # Stopping early still reports the operation
+        next(self.client.query_stream(query, chunk_size=16))
+        self.assertEqual(len(self.timings), 2)
+
+    def test_disabled_by_default(self):
+        transport = HttpTransport()
+        self.addCleanup(transport.close)
+        client = DgraphClient(self.server.url, transport=transport)
+        self.assertEqual(client.query('query { queryMember { memberId } }')['data']['queryMember'][0]['memberId'], '1')
+        self.assertEqual(self.timings, [])
+        # Plain clients keep the default connections
+        self.assertNotIsInstance(transport.session.get_adapter(self.server.url), TimingHTTPAdapter)
+        self.assertIsInstance(self.client.transport.session.get_adapter(self.server.url), TimingHTTPAdapter)
+
+if __name__ == '__main__':
+    unittest.main()
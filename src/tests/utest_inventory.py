@@ -0,0 +1,74 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests aiohttp ijson numpy scipy
+# python -m unittest utest_inventory.py
+# deactivate
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# Add the backend and examples directories to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from dgraph_stub_server import InMemoryDgraph
+from analysis_engine import AnalysisAPI
+from generate_synthetic_data import SyntheticDataGenerator
+from inventory import InventoryOptimizer
+
+class TestInventoryOptimizer(unittest.TestCase):
+    def test_reorder_point(self):
+        # Daily demand with mean 10 and variance 4
+        optimizer = InventoryOptimizer(order_cycle=10).fit(np.array([[8.0, 12.0, 8.0, 12.0, 10.0]]))
+        np.testing.assert_allclose(optimizer.mean, [10])
+        np.testing.assert_allclose(optimizer.variance, [4])
+        plan = optimizer.plan(service_level=0.95, lead_time=4)
+        # sigma = sqrt(4 days * 4) = 4 units, z(0.95) = 1.645
+        np.testing.assert_allclose(plan['safety_stock'], [1.6449 * 4], rtol=1e-4)
+        np.testing.assert_allclose(plan['reorder_point'], [40 + 1.6449 * 4], rtol=1e-4)
+        np.testing.assert_allclose(plan['turnover'], [3650 / (50 + 1.6449 * 4)], rtol=1e-4)
+        np.testing.assert_allclose(plan['stockouts_per_year'], [0.05 * 36.5])
+        # Loss function G(1.645) = 0.0209: 0.08 units short per 100-unit order
+        np.testing.assert_allclose(plan['fill_rate'], [1 - 4 * 0.02089 / 100], rtol=1e-5)
+        varying = InventoryOptimizer(order_cycle=10, lead_time_std=1.0).fit(np.array([[8.0, 12.0, 8.0, 12.0, 10.0]]))
+        np.testing.assert_allclose(varying.plan(0.95, 4)['safety_stock'], [1.6449 * np.sqrt(16 + 100)], rtol=1e-4)
+        with self.assertRaises(ValueError):
+            optimizer.plan(service_level=1.0)
+
+    def test_sweep_matches_single_plans(self):
+        rng = np.random.default_rng(0)
+        optimizer = InventoryOptimizer().fit(rng.poisson(rng.uniform(0, 20, (300, 1)), (300, 180)))
+        lead_times, service_levels = [1, 7, 21], [0.8, 0.9, 0.95, 0.99]
+        grid = optimizer.sweep(lead_times, service_levels)
+        self.assertEqual(grid['reorder_point'].shape, (3, 4, 300))
+        for i, lead_time in enumerate(lead_times):
+            for j, service_level in enumerate(service_levels):
+                plan = optimizer.plan(service_level, lead_time)
+                for name, values in plan.items():
+                    np.testing.assert_allclose(grid[name][i, j], values)
+        # More safety stock for longer lead times and higher service levels
+        self.assertTrue((np.diff(grid['safety_stock'], axis=0) >= 0).all())
+        self.assertTrue((np.diff(grid['safety_stock'], axis=1) >= 0).all())
+        self.assertTrue((np.diff(grid['turnover'], axis=1) <= 0).all())
+        # Per-product lead times broadcast along the products axis
+        per_product = optimizer.plan(0.9, np.where(np.arange(300) % 2, 7, 21))
+        np.testing.assert_allclose(per_product['reorder_point'][1::2], grid['reorder_point'][1, 1, 1::2])
+
+    def test_fit_from_orders(self):
+        generator = SyntheticDataGenerator(members=30, products=12, orders=500, seed=9)
+        graph = InMemoryDgraph()
+        graph.load(generator.members(), generator.products(), generator.orders(), generator.reviews())
+        records = AnalysisAPI(graph).inventory_optimization()['data']['queryOrder']
+        optimizer = InventoryOptimizer().fit(records)
+        days = optimizer.days
+        units = sum(len(record['products']) for record in records)
+        self.assertAlmostEqual(optimizer.mean.sum() * days, units)
+        self.assertEqual(len(optimizer.fit(records, window=30).mean), len(optimizer.product_ids))
+        self.assertEqual(optimizer.days, 30)
+
+if __name__ == '__main__':
+    unittest.main()
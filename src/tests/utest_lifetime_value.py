@@ -0,0 +1,99 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests aiohttp ijson numpy scipy
+# python -m unittest utest_lifetime_value.py
+# deactivate
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# Add the backend and examples directories to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from dgraph_stub_server import InMemoryDgraph
+from analysis_engine import AnalysisAPI
+from generate_synthetic_data import SyntheticDataGenerator
+from lifetime_value import RFM, LifetimeValueModel, rfm_from_table
+
+def simulate_bgnbd(n, r, alpha, a, b, T, seed):
+    # Purchases at a Poisson rate, each followed by a chance of dropping out, per Fader, Hardie & Lee (2005)
+    rng = np.random.default_rng(seed)
+    rate, dropout = rng.gamma(r, 1 / alpha, n), rng.beta(a, b, n)
+    x, t_x, t = np.zeros(n), np.zeros(n), np.zeros(n)
+    alive = np.ones(n, dtype=bool)
+    while alive.any():
+        active = np.flatnonzero(alive)
+        t[active] += rng.exponential(1 / rate[active])
+        ended = t[active] > T
+        alive[active[ended]] = False
+        active = active[~ended]
+        x[active] += 1
+        t_x[active] = t[active]
+        alive[active[rng.random(len(active)) < dropout[active]]] = False
+    return x, t_x
+
+class TestRFM(unittest.TestCase):
+    MEMBERS = [
+        {'memberId': '1', 'orders': [{'total': 30.0, 'date': '2024-01-15T00:00:00Z'},
+                                     {'total': 10.0, 'date': '2024-01-01T00:00:00Z'},
+                                     {'total': 20.0, 'date': '2024-01-29T00:00:00Z'}]},
+        {'memberId': '2', 'orders': [{'total': 5.0, 'date': '2024-01-08T00:00:00Z'}]},
+        {'memberId': '3', 'orders': []},
+    ]
+
+    def test_summary_from_orders(self):
+        rfm = rfm_from_table(self.MEMBERS, now=np.datetime64('2024-02-05'))
+        self.assertEqual(list(rfm.member_ids), ['1', '2', '3'])
+        np.testing.assert_allclose(rfm.frequency, [2, 0, 0])
+        np.testing.assert_allclose(rfm.recency, [4, 0, 0])
+        np.testing.assert_allclose(rfm.T, [5, 4, 0])
+        # The first order is not a repeat purchase
+        np.testing.assert_allclose(rfm.monetary, [25, 0, 0])
+
+    def test_summary_from_aggregates_matches(self):
+        generator = SyntheticDataGenerator(members=60, products=10, orders=600, seed=4)
+        graph = InMemoryDgraph()
+        graph.load(generator.members(), generator.products(), generator.orders(), generator.reviews())
+        full = rfm_from_table(AnalysisAPI(graph).customer_lifetime_value()['data']['queryMember'])
+        pushed = rfm_from_table(AnalysisAPI(graph, aggregate=True).customer_lifetime_value()['data']['queryMember'])
+        for name in ('frequency', 'recency', 'T'):
+            np.testing.assert_allclose(getattr(pushed, name), getattr(full, name))
+
+class TestLifetimeValueModel(unittest.TestCase):
+    def test_recovers_simulated_parameters(self):
+        x, t_x = simulate_bgnbd(20000, r=0.25, alpha=4.0, a=0.8, b=2.5, T=52.0, seed=1)
+        rng = np.random.default_rng(2)
+        # Gamma-Gamma spend: mean order value per member drawn from an inverse-gamma-distributed scale
+        scale = 1 / rng.gamma(3.0, 1 / 10.0, len(x))
+        monetary = np.where(x > 0, rng.gamma(6.0 * np.maximum(x, 1), scale) / np.maximum(x, 1), 0.0)
+        rfm = RFM(np.arange(len(x)).astype(str), x, t_x, np.full(len(x), 52.0), monetary)
+        model = LifetimeValueModel().fit(rfm)
+        np.testing.assert_allclose(model.bgnbd, [0.25, 4.0, 0.8, 2.5], rtol=0.25)
+        np.testing.assert_allclose(model.gamma_gamma, [6.0, 3.0, 10.0], rtol=0.3)
+
+        alive = model.probability_alive(rfm)
+        self.assertTrue(((alive > 0) & (alive <= 1)).all())
+        self.assertTrue((alive[x == 0] == 1).all())
+        clv = model.customer_lifetime_value(rfm, horizon=52, step=4, discount_rate=0.01)
+        self.assertFalse(np.isnan(clv).any())
+        # Over the same horizon, discounting can only lower the value
+        self.assertTrue((clv <= model.customer_lifetime_value(rfm, horizon=52, step=4) + 1e-9).all())
+        self.assertTrue((model.expected_purchases(rfm, 52) >= model.expected_purchases(rfm, 26)).all())
+
+    def test_recent_frequent_buyers_are_worth_more(self):
+        x, t_x = simulate_bgnbd(5000, r=0.3, alpha=5.0, a=1.2, b=3.0, T=40.0, seed=3)
+        rfm = RFM(np.arange(len(x)).astype(str), x, t_x, np.full(len(x), 40.0), np.where(x > 0, 20.0, 0.0))
+        model = LifetimeValueModel().fit(rfm)
+        probe = RFM(np.array(['a', 'b', 'c']), np.array([5.0, 5.0, 1.0]), np.array([39.0, 10.0, 39.0]),
+                    np.full(3, 40.0), np.full(3, 20.0))
+        value = model.customer_lifetime_value(probe)
+        self.assertGreater(value[0], value[1])
+        self.assertGreater(value[0], value[2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests aiohttp ijson numpy scipy
+# python -m unittest utest_market_basket.py
+# deactivate
+
+import os
+import sys
+import unittest
+from collections import Counter
+from itertools import combinations
+
+# Add the backend and examples directories to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from dgraph_stub_server import InMemoryDgraph
+from analysis_engine import AnalysisAPI
+from generate_synthetic_data import SyntheticDataGenerator
+from market_basket import MarketBasketEngine
+
+BASKETS = [['a', 'b', 'c'], ['a', 'b'], ['a', 'c'], ['b', 'c'], ['a', 'b', 'c', 'd'], ['d'], ['a', 'b', 'b']]
+
+def records(baskets):
+    return [{'orderId': str(i), 'products': [{'productId': item} for item in basket]} for i, basket in enumerate(baskets)]
+
+class TestMarketBasketEngine(unittest.TestCase):
+    def test_supports_and_rule_metrics(self):
+        engine = MarketBasketEngine(min_support=2 / 7, min_confidence=0.6).fit_records(records(BASKETS))
+        itemsets = {items: count for items, count, support in engine.frequent_itemsets()}
+        self.assertEqual(itemsets, {('a',): 5, ('b',): 5, ('c',): 4, ('d',): 2,
+                                    ('a', 'b'): 4, ('a', 'c'): 3, ('b', 'c'): 3, ('a', 'b', 'c'): 2})
+        rule = next(rule for rule in engine.rules() if rule.antecedent == ('a', 'c') and rule.consequent == ('b',))
+        self.assertAlmostEqual(rule.support, 2 / 7)
+        self.assertAlmostEqual(rule.confidence, 2 / 3)
+        self.assertAlmostEqual(rule.lift, (2 / 3) / (5 / 7))
+        for rule in engine.rules():
+            self.assertGreaterEqual(rule.confidence, 0.6)
+        lifts = [rule.lift for rule in engine.rules()]
+        self.assertEqual(lifts, sorted(lifts, reverse=True))
+
+    def test_matches_brute_force_on_synthetic_orders(self):
+        generator = SyntheticDataGenerator(members=200, products=30, orders=3000, seed=11)
+        baskets = [set(order[2]) for order in generator.orders()]
+        expected = Counter()
+        for basket in baskets:
+            for size in (1, 2, 3):
+                expected.update(combinations(sorted(basket), size))
+        min_count = 15
+        expected = {items: count for items, count in expected.items() if count >= min_count}
+
+        for workers in (1, 4):
+            engine = MarketBasketEngine(min_support=min_count / len(baskets), max_length=3, workers=workers)
+            engine.fit_records(records(baskets))
+            found = {tuple(sorted(items)): count for items, count, support in engine.frequent_itemsets()}
+            self.assertEqual(found, expected)
+
+    def test_fits_an_analysis_result(self):
+        generator = SyntheticDataGenerator(members=20, products=10, orders=300, seed=2)
+        graph = InMemoryDgraph()
+        graph.load(generator.members(), generator.products(), generator.orders(), generator.reviews())
+        response = AnalysisAPI(graph).market_basket_analysis()
+        engine = MarketBasketEngine(min_support=0.02, min_confidence=0.1).fit_records(response['data']['queryOrder'])
+        self.assertEqual(engine.orders, 300)
+        self.assertTrue(engine.rules(limit=5))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests websockets
+# python -m unittest utest_materialized_views.py
+# deactivate
+
+import os
+import sys
+import json
+import unittest
+
+# Add the src directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+from materialized_views import MemberReviewCountView, ProductOrderCountView, SalesPerDayView, ViewManager
+
+ORDERS = [
+    {'orderId': '1', 'total': 10.0, 'date': '2024-03-01T09:00:00Z', 'products': [{'productId': 'a'}, {'productId': 'b'}]},
+    {'orderId': '2', 'total': 5.0, 'date': '2024-03-01T17:00:00Z', 'products': [{'productId': 'a'}]},
+    {'orderId': '3', 'total': 7.5, 'date': '2024-03-02T08:00:00Z', 'products': [{'productId': 'c'}]},
+]
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class SeedingClient:
+    def __init__(self, data):
+        self.data = data
+        self.queries = []
+
+    def query(self, query, variables=None):
+        self.queries.append(query)
+        return {'data': self.data}
+
+def data_message(root_field, records):
+    return json.dumps({'type': 'data', 'id': '1', 'payload': {'data': {root_field: records}}})
+
+class TestMaterializedViews(unittest.TestCase):
+    def test_sales_per_day_folds_only_changes(self):
+        clock = FakeClock()
+        view = SalesPerDayView(clock=clock)
+        view.seed(ORDERS)
+        self.assertEqual(view.get('2024-03-01'), {'orders': 2, 'total': 15.0})
+
+        # Order 2 is updated, order 3 deleted and order 4 added
+        clock.now = 130.0
+        snapshot = [ORDERS[0], dict(ORDERS[1], total=6.0), {'orderId': '4', 'total': 1.0, 'date': '2024-03-03T00:00:00Z'}]
+        view.on_message(data_message('queryOrder', snapshot))
+
+        self.assertEqual(view.updates_applied, 3)
+        self.assertEqual(view.state(), {
+            '2024-03-01': {'orders': 2, 'total': 16.0},
+            '2024-03-03': {'orders': 1, 'total': 1.0},
+        })
+        clock.now = 135.0
+        self.assertEqual(view.staleness(), 5.0)
+
+    def test_product_order_counts(self):
+        view = ProductOrderCountView()
+        view.seed(ORDERS)
+        view.apply_snapshot(ORDERS[1:])
+
+        self.assertEqual(view.state(), {'a': 1, 'c': 1})
+        self.assertEqual(view.get('b'), 0)
+
+    def test_non_data_messages_are_ignored(self):
+        view = MemberReviewCountView()
+        self.assertIsNone(view.staleness())
+
+        view.on_message({'type': 'ka'})
+
+        self.assertIsNone(view.staleness())
+        self.assertEqual(view.state(), {})
+
+    def test_manager_seeds_and_reads_views(self):
+        client = SeedingClient({'queryMember': [{'memberId': '1', 'reviewsAggregate': {'count': 3}}]})
+        manager = ViewManager(client)
+
+        manager.register('reviews_per_member', MemberReviewCountView())
+        view_state = manager.read('reviews_per_member')
+
+        self.assertIn('reviewsAggregate { count }', client.queries[0])
+        self.assertEqual(view_state['state'], {'1': 3})
+        self.assertIsNotNone(view_state['staleness'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests websockets aiohttp
+# python -m unittest utest_pagination.py
+# deactivate
+
+import os
+import sys
+import unittest
+
+# Add the src directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+from analysis_engine import AnalysisAPI
+from graphql_document import GraphQLError, parse
+from pagination import paginate
+
+ORDERS = [{'orderId': '%03d' % i, 'total': float(i)} for i in range(25)]
+
+class PagingClient:
+    """
+    A fake DgraphClient serving queryOrder pages from an in-memory list.
+    """
+    def __init__(self, rows):
+        self.rows = rows
+        self.requests = []
+
+    def query(self, query, variables=None):
+        self.requests.append((query, variables))
+        field = parse(query).operation().selections[0]
+        rows = self.rows
+        if 'pageAfter' in variables:
+            rows = [row for row in rows if row['orderId'] > variables['pageAfter']]
+        offset = variables.get('pageOffset', 0)
+        return {'data': {field.response_key: rows[offset:offset + variables['pageFirst']]}}
+
+class TestPagination(unittest.TestCase):
+    def test_offset_pages(self):
+        client = PagingClient(ORDERS)
+
+        records = list(paginate(client, "query { queryOrder { orderId total } }", page_size=10))
+
+        self.assertEqual(records, ORDERS)
+        self.assertEqual([variables['pageOffset'] for _, variables in client.requests], [0, 10, 20])
+        self.assertIn('queryOrder(order: {asc: orderId}, first: $pageFirst, offset: $pageOffset)', client.requests[0][0])
+
+    def test_keyset_pages(self):
+        client = PagingClient(ORDERS)
+
+        records = list(paginate(client, "query { queryOrder { orderId } }", page_size=10, keyset=True, prefetch=False))
+
+        self.assertEqual([record['orderId'] for record in records], [row['orderId'] for row in ORDERS])
+        self.assertNotIn('pageAfter', client.requests[0][1])
+        self.assertEqual(client.requests[1][1]['pageAfter'], '009')
+        self.assertIn('filter: {orderId: {gt: $pageAfter}}', client.requests[1][0])
+
+    def test_caller_first_limits_the_scan(self):
+        client = PagingClient(ORDERS)
+
+        records = list(paginate(client, "query { queryOrder(first: 12) { orderId } }", page_size=5))
+
+        self.assertEqual(len(records), 12)
+        self.assertEqual([variables['pageFirst'] for _, variables in client.requests], [5, 5, 2])
+
+    def test_errors_are_raised(self):
+        class FailingClient:
+            def query(self, query, variables=None):
+                return {'errors': [{'message': 'Some error occurred'}]}
+
+        with self.assertRaises(GraphQLError) as context:
+            list(paginate(FailingClient(), "query { queryOrder { orderId } }"))
+
+        self.assertEqual(context.exception.errors[0]['message'], 'Some error occurred')
+
+    def test_analysis_stream_requires_root_for_multi_root_queries(self):
+        analysis_api = AnalysisAPI(PagingClient(ORDERS))
+
+        with self.assertRaises(ValueError):
+            list(analysis_api.stream('cross_sell_upsell_analysis'))
+
+        records = list(analysis_api.stream('cross_sell_upsell_analysis', root_field='queryOrder', page_size=7))
+        self.assertEqual(len(records), len(ORDERS))
+
+if __name__ == '__main__':
+    unittest.main()
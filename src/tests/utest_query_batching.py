@@ -0,0 +1,124 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install responses
+# python -m unittest utest_query_batching.py
+# deactivate
+
+import os
+import sys
+import json
+import unittest
+import responses
+
+# Add the src directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+from analysis_engine import AnalysisAPI, DgraphClient
+from graphql_document import EnumValue, Variable, parse, render_operation
+from query_batching import QueryBatcher
+
+ORDERS = [
+    {'orderId': '1', 'total': 24.98, 'date': '2024-01-01T00:00:00Z', 'products': [{'productId': '1'}, {'productId': '2'}]},
+    {'orderId': '2', 'total': 38.98, 'date': '2024-01-02T00:00:00Z', 'products': [{'productId': '3'}]},
+]
+MEMBERS = [{'memberId': '1', 'recommendedProducts': [{'productId': '7'}]}]
+
+class RecordingClient:
+    """
+    A fake DgraphClient that records the documents it receives and returns a canned response.
+    """
+    def __init__(self, response):
+        self.response = response
+        self.documents = []
+
+    def query(self, query, variables=None):
+        self.documents.append(query)
+        return self.response
+
+class TestGraphQLDocument(unittest.TestCase):
+    def test_parse_arguments_and_variables(self):
+        document = parse("""
+        query Orders($minTotal: Float!, $first: Int = 10) {
+            recent: queryOrder(filter: {total: {ge: $minTotal}}, order: {asc: total}, first: $first) {
+                orderId
+            }
+        }
+        """)
+        operation = document.operation()
+        field = operation.selections[0]
+
+        self.assertEqual(operation.name, 'Orders')
+        self.assertEqual(operation.variable_definitions, [('minTotal', 'Float!', None), ('first', 'Int', 10)])
+        self.assertEqual(field.response_key, 'recent')
+        self.assertEqual(field.arguments['filter'], {'total': {'ge': Variable('minTotal')}})
+        self.assertEqual(field.arguments['order'], {'asc': EnumValue('total')})
+
+    def test_render_round_trip(self):
+        source = 'query { queryMember(filter: {name: {anyofterms: "Alice"}}, first: 5) { memberId orders { total } } }'
+        rendered = render_operation(parse(source).operation())
+
+        self.assertEqual(render_operation(parse(rendered).operation()), rendered)
+        self.assertIn('queryMember(filter: {name: {anyofterms: "Alice"}}, first: 5)', rendered)
+
+    def test_unbalanced_document_is_rejected(self):
+        with self.assertRaises(ValueError):
+            parse("query { queryOrder { orderId }")
+
+class TestQueryBatching(unittest.TestCase):
+    def setUp(self):
+        self.analysis_api = AnalysisAPI(DgraphClient('http://localhost:8080/graphql'))
+
+    def _respond(self, request):
+        # Answer the merged document from canned data, keyed by the aliases it asks for
+        body = json.loads(request.body)
+        self.documents.append(body['query'])
+        operation = parse(body['query']).operation()
+        data = {}
+        for field in operation.selections:
+            rows = ORDERS if field.name == 'queryOrder' else MEMBERS
+            data[field.response_key] = rows
+        return 200, {}, json.dumps({'data': data})
+
+    @responses.activate
+    def test_shared_selections_are_fetched_once(self):
+        self.documents = []
+        responses.add_callback(responses.POST, 'http://localhost:8080/graphql', callback=self._respond)
+
+        results = self.analysis_api.run_batched([
+            'market_basket_analysis',
+            'cross_sell_upsell_analysis',
+            'recommendation_effectiveness',
+            'demand_forecasting',
+        ])
+
+        # One round trip, with a single queryOrder and a single queryMember root field
+        self.assertEqual(len(responses.calls), 1)
+        roots = [field.name for field in parse(self.documents[0]).operation().selections]
+        self.assertEqual(sorted(roots), ['queryMember', 'queryOrder'])
+
+        # Every caller gets exactly the fields it selected
+        self.assertEqual(results['market_basket_analysis'], {'data': {'queryOrder': [
+            {'orderId': '1', 'products': [{'productId': '1'}, {'productId': '2'}]},
+            {'orderId': '2', 'products': [{'productId': '3'}]},
+        ]}})
+        self.assertEqual(results['demand_forecasting']['data']['queryOrder'][1],
+                         {'orderId': '2', 'total': 38.98, 'date': '2024-01-02T00:00:00Z', 'products': [{'productId': '3'}]})
+        self.assertEqual(results['cross_sell_upsell_analysis']['data']['queryMember'], MEMBERS)
+
+    def test_conflicting_arguments_are_aliased(self):
+        client = RecordingClient({
+            'data': {'queryOrder': [{'orderId': '1'}], 'queryOrder_1': [{'orderId': '1'}, {'orderId': '2'}]}
+        })
+        batcher = QueryBatcher(client)
+        batcher.query('query { queryOrder(first: 1) { orderId } }')
+        batcher.query('query { queryOrder(first: 2) { orderId } }')
+
+        first, second = batcher.flush()
+
+        self.assertIn('queryOrder_1: queryOrder(first: 2)', client.documents[0])
+        self.assertEqual(first, {'data': {'queryOrder': [{'orderId': '1'}]}})
+        self.assertEqual(second, {'data': {'queryOrder': [{'orderId': '1'}, {'orderId': '2'}]}})
+
+if __name__ == '__main__':
+    unittest.main()
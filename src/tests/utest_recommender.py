@@ -0,0 +1,96 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests aiohttp ijson numpy scipy
+# python -m unittest utest_recommender.py
+# deactivate
+
+import os
+import sys
+import unittest
+
+# Add the backend and examples directories to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from dgraph_stub_server import InMemoryDgraph, DgraphStubServer
+from analysis_engine import DgraphClient, AnalysisAPI
+from generate_synthetic_data import SyntheticDataGenerator
+from recommender import ItemRecommender, RecommendationWriter
+
+def member(member_id, baskets, reviews=()):
+    return {'memberId': member_id,
+            'orders': [{'products': [{'productId': product} for product in basket]} for basket in baskets],
+            'reviews': [{'rating': rating, 'product': {'productId': product}} for product, rating in reviews]}
+
+MEMBERS = [
+    member('1', [['lipstick', 'gloss']]),
+    member('2', [['lipstick', 'gloss', 'liner']]),
+    member('3', [['lipstick', 'gloss']], [('gloss', 5)]),
+    member('4', [['serum', 'toner']]),
+    member('5', [['serum', 'toner', 'cream']], [('cream', 1)]),
+    member('6', [['lipstick']]),
+    member('7', []),
+]
+
+class TestItemRecommender(unittest.TestCase):
+    def setUp(self):
+        self.recommender = ItemRecommender(k=3, shrinkage=0.0).fit(MEMBERS)
+
+    def test_neighbor_index_follows_co_occurrence(self):
+        similar = [product for product, score in self.recommender.similar_products('lipstick')]
+        self.assertEqual(similar[0], 'gloss')
+        self.assertNotIn('serum', similar)
+        self.assertEqual(self.recommender.neighbors.shape, (len(self.recommender.items), 3))
+
+    def test_recommendations_exclude_history(self):
+        self.assertEqual(self.recommender.recommend('6', n=1), ['gloss'])
+        self.assertNotIn('lipstick', self.recommender.recommend('6'))
+        self.assertEqual(self.recommender.recommend_for_items(['serum'], n=1), ['toner'])
+        # Members without history fall back to the most purchased products
+        self.assertEqual(self.recommender.recommend('7', n=2), ['lipstick', 'gloss'])
+        self.assertEqual(self.recommender.recommend('unknown', n=1), ['lipstick'])
+
+    def test_low_ratings_count_against_a_product(self):
+        self.assertLess(self.recommender.interactions[4, self.recommender.product_index['cream']],
+                        self.recommender.interactions[4, self.recommender.product_index['serum']])
+
+    def test_batch_scoring_matches_single_member(self):
+        recommendations = dict(self.recommender.recommend_all(n=3, chunk_size=4))
+        for member_id, products in recommendations.items():
+            self.assertEqual(products, self.recommender.recommend(member_id, n=3))
+        # Member 7 has no history, so the bulk output falls back to popular products instead of []
+        self.assertEqual(recommendations['7'], self.recommender.recommend('7', n=3))
+        self.assertTrue(recommendations['7'])
+
+class TestRecommendationWriter(unittest.TestCase):
+    def setUp(self):
+        generator = SyntheticDataGenerator(members=40, products=20, orders=400, seed=9)
+        self.graph = InMemoryDgraph()
+        self.graph.load(generator.members(), generator.products(), generator.orders(), generator.reviews())
+        self.server = DgraphStubServer(self.graph).start()
+        self.addCleanup(self.server.stop)
+        self.client = DgraphClient(self.server.url)
+
+    def current(self):
+        response = AnalysisAPI(self.client).personalized_marketing()
+        return {member['memberId']: sorted(product['productId'] for product in member['recommendedProducts'])
+                for member in response['data']['queryMember']}
+
+    def test_writes_only_changed_edges(self):
+        recommender = ItemRecommender(k=5).fit_client(self.client)
+        recommendations = dict(recommender.recommend_all(n=3))
+        writer = RecommendationWriter(self.client, batch_size=7, workers=2)
+        report = writer.write(recommendations)
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(self.current(), {member_id: sorted(products) for member_id, products in recommendations.items()})
+
+        changed = dict(recommendations)
+        first = next(member_id for member_id, products in changed.items() if products)
+        changed[first] = changed[first][:1]
+        report = writer.write(changed)
+        self.assertEqual((report['updated'], report['unchanged']), (1, len(changed) - 1))
+        self.assertEqual(self.current()[first], changed[first][:1])
+
+if __name__ == '__main__':
+    unittest.main()
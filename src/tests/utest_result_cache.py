@@ -0,0 +1,133 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install responses
+# python -m unittest utest_result_cache.py
+# deactivate
+
+import os
+import sys
+import unittest
+import responses
+
+# Add the src directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+from analysis_engine import AnalysisAPI, DgraphClient
+from result_cache import ResultCache, touched_types
+
+MEMBERS_QUERY = "query { queryMember { memberId orders { total } } }"
+PRODUCTS_QUERY = "query { queryProduct { productId reviewsAggregate { count } } }"
+ADD_ORDER = """
+mutation AddOrder($input: [AddOrderInput!]!) {
+  addOrder(input: $input) { order { orderId products { productId } } }
+}
+"""
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResultCache(ttl=30, max_bytes=1024, clock=self.clock)
+
+    def test_touched_types(self):
+        self.assertEqual(touched_types(MEMBERS_QUERY), {'Member', 'Order'})
+        self.assertEqual(touched_types(PRODUCTS_QUERY), {'Product', 'Review'})
+        self.assertEqual(touched_types(ADD_ORDER), {'Order'})
+
+    def test_hit_ignores_whitespace_and_returns_a_copy(self):
+        self.cache.put(MEMBERS_QUERY, None, {'data': {'queryMember': []}})
+
+        first = self.cache.get("query {\n    queryMember { memberId\n orders { total } }\n}")
+        first['data']['queryMember'].append('modified')
+
+        self.assertEqual(self.cache.get(MEMBERS_QUERY), {'data': {'queryMember': []}})
+        self.assertIsNone(self.cache.get(MEMBERS_QUERY, {'first': 1}))
+        self.assertEqual(self.cache.stats()['hits'], 2)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_entries_expire(self):
+        self.cache.put(MEMBERS_QUERY, None, {'data': {'queryMember': []}})
+        self.clock.now = 31
+
+        self.assertIsNone(self.cache.get(MEMBERS_QUERY))
+        self.assertEqual(self.cache.stats()['expirations'], 1)
+
+    def test_size_bound_evicts_least_recently_used(self):
+        big = {'data': {'rows': 'x' * 400}}
+        self.cache.put('query { a }', None, big)
+        self.cache.put('query { b }', None, big)
+        self.cache.get('query { a }')
+        self.cache.put('query { c }', None, big)
+
+        self.assertIsNotNone(self.cache.get('query { a }'))
+        self.assertIsNone(self.cache.get('query { b }'))
+        self.assertLessEqual(self.cache.stats()['bytes'], 1024)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_errors_are_not_cached(self):
+        self.cache.put(MEMBERS_QUERY, None, {'errors': [{'message': 'Some error occurred'}]})
+
+        self.assertIsNone(self.cache.get(MEMBERS_QUERY))
+
+    def test_mutation_invalidates_by_type(self):
+        self.cache.put(MEMBERS_QUERY, None, {'data': {'queryMember': []}})
+        self.cache.put(PRODUCTS_QUERY, None, {'data': {'queryProduct': []}})
+
+        self.assertEqual(self.cache.invalidate_mutation(ADD_ORDER), 1)
+        self.assertIsNone(self.cache.get(MEMBERS_QUERY))
+        self.assertIsNotNone(self.cache.get(PRODUCTS_QUERY))
+
+    def test_result_of_a_query_overtaken_by_a_mutation_is_not_stored(self):
+        generation = self.cache.generation(MEMBERS_QUERY)
+        self.cache.invalidate_mutation(ADD_ORDER)
+        self.cache.put(MEMBERS_QUERY, None, {'data': {'queryMember': []}}, generation)
+        self.assertIsNone(self.cache.get(MEMBERS_QUERY))
+        self.assertEqual(self.cache.stats()['stale_puts'], 1)
+
+        # Types the query does not read do not matter
+        generation = self.cache.generation(PRODUCTS_QUERY)
+        self.cache.invalidate(['Order'])
+        self.cache.put(PRODUCTS_QUERY, None, {'data': {'queryProduct': []}}, generation)
+        self.assertIsNotNone(self.cache.get(PRODUCTS_QUERY))
+
+        generation = self.cache.generation(PRODUCTS_QUERY)
+        self.cache.clear()
+        self.cache.put(PRODUCTS_QUERY, None, {'data': {'queryProduct': []}}, generation)
+        self.assertIsNone(self.cache.get(PRODUCTS_QUERY))
+
+    @responses.activate
+    def test_client_skips_results_invalidated_in_flight(self):
+        client = DgraphClient('http://localhost:8080/graphql', cache=self.cache)
+
+        def answer(request):
+            # The mutation lands while the query is on the wire
+            self.cache.invalidate_mutation(ADD_ORDER)
+            return 200, {}, '{"data": {"queryMember": []}}'
+
+        responses.add_callback(responses.POST, 'http://localhost:8080/graphql', callback=answer)
+        client.query(MEMBERS_QUERY)
+        self.assertIsNone(self.cache.get(MEMBERS_QUERY))
+
+    @responses.activate
+    def test_client_uses_cache_until_mutation(self):
+        responses.add(responses.POST, 'http://localhost:8080/graphql', json={'data': {'queryMember': []}}, status=200)
+        client = DgraphClient('http://localhost:8080/graphql', cache=self.cache)
+        analysis_api = AnalysisAPI(client)
+
+        analysis_api.customer_lifetime_value()
+        analysis_api.customer_lifetime_value()
+        self.assertEqual(len(responses.calls), 1)
+
+        client.mutate(ADD_ORDER, {'input': []})
+        analysis_api.customer_lifetime_value()
+        self.assertEqual(len(responses.calls), 3)
+
+if __name__ == '__main__':
+    unittest.main()
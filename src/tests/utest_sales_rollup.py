@@ -0,0 +1,127 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests aiohttp ijson numpy
+# python -m unittest utest_sales_rollup.py
+# deactivate
+
+import os
+import sys
+import unittest
+from collections import defaultdict
+
+import numpy as np
+
+# Add the backend and examples directories to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from dgraph_stub_server import InMemoryDgraph
+from analysis_engine import AnalysisAPI
+from generate_synthetic_data import SyntheticDataGenerator
+from columnar import to_datetime64
+from sales_rollup import SalesRollup
+
+def order(order_id, date, total, *products):
+    return {'orderId': order_id, 'date': date, 'total': total,
+            'products': [{'productId': product_id, 'category': category, 'price': price}
+                         for product_id, category, price in products]}
+
+LIPSTICK = ('lipstick', 'Beauty', 10.0)
+SERUM = ('serum', 'Skincare', 30.0)
+
+class TestSalesRollup(unittest.TestCase):
+    def test_buckets_and_revenue_split(self):
+        rollup = SalesRollup()
+        rollup.add_orders([
+            order('1', '2024-01-01T10:00:00Z', 40.0, LIPSTICK, SERUM),
+            order('2', '2024-01-03T10:00:00Z', 10.0, LIPSTICK),
+            order('3', '2024-02-10T10:00:00Z', 30.0, SERUM),
+        ])
+        starts, revenue = rollup.series('day')
+        self.assertEqual(str(starts[0]), '2024-01-01')
+        self.assertEqual(revenue[0], 40.0)
+        self.assertEqual(revenue[2], 10.0)
+        # Monday 2024-01-01 starts the first ISO week
+        starts, units = rollup.series('week', 'units', by='product', key='lipstick')
+        self.assertEqual(str(starts[0]), '2024-01-01')
+        self.assertEqual(units[0], 2)
+        starts, revenue = rollup.series('month', by='category')
+        self.assertEqual([str(start) for start in starts], ['2024-01-01', '2024-02-01'])
+        # Order 1 is split 10:30 by price
+        np.testing.assert_allclose(revenue, [[20.0, 30.0], [0.0, 30.0]])
+
+    def test_incremental_folds_match_a_full_build(self):
+        generator = SyntheticDataGenerator(members=50, products=20, orders=3000, seed=5)
+        graph = InMemoryDgraph()
+        graph.load(generator.members(), generator.products(), generator.orders(), generator.reviews())
+        records = AnalysisAPI(graph).sales_trend_analysis()['data']['queryOrder']
+        full = SalesRollup()
+        full.add_orders(records)
+        incremental = SalesRollup()
+        # Batches arrive out of date order, so the cubes also grow backwards in time
+        for start in reversed(range(0, len(records), 700)):
+            incremental.add_orders(records[start:start + 700])
+        for granularity in ('day', 'week', 'month'):
+            starts, values = full.series(granularity, by='product')
+            other_starts, other_values = incremental.series(granularity, by='product')
+            np.testing.assert_array_equal(starts, other_starts)
+            columns = [incremental.products.index(product) for product in full.products]
+            np.testing.assert_allclose(other_values[:, columns], values)
+
+        monthly = defaultdict(float)
+        for record in records:
+            monthly[record['date'][:7]] += record['total']
+        starts, revenue = full.series('month')
+        self.assertEqual(sorted(str(start)[:7] for start, value in zip(starts, revenue) if value), sorted(monthly))
+        for start, value in zip(starts, revenue):
+            self.assertAlmostEqual(value, monthly.get(str(start)[:7], 0.0), places=6)
+        # Line revenue adds back up to the order totals
+        self.assertAlmostEqual(full.cubes['month'].revenue.sum(), sum(monthly.values()), places=6)
+        self.assertLess(full.nbytes, 1000000)
+
+    def test_update_polls_only_new_orders(self):
+        graph = InMemoryDgraph()
+        graph.load([('m', 'M', None)], [('p', 'Lipstick', 'Red', 10.0, 'Beauty')],
+                   [('1', 'm', ['p'], 10.0, '2024-01-01T00:00:00'), ('2', 'm', ['p'], 20.0, '2024-01-02T00:00:00')], [])
+        rollup = SalesRollup()
+        self.assertEqual(rollup.update(graph), 2)
+        self.assertEqual(rollup.update(graph), 0)
+        graph.load([], [], [('3', 'm', ['p'], 5.0, '2024-01-02T00:00:00')], [])
+        self.assertEqual(rollup.update(graph), 1)
+        self.assertEqual(list(rollup.series('day')[1]), [10.0, 25.0])
+
+    def test_watermark_compares_dates_not_strings(self):
+        # Dgraph prints fractions of any length, and '...:00Z' > '...:00.5Z' as strings
+        orders = [order('1', '2024-01-01T00:00:00.5Z', 10.0, LIPSTICK), order('2', '2024-01-01T00:00:00Z', 20.0, LIPSTICK)]
+
+        class Client:
+            def query(self, query, variables):
+                since = to_datetime64(variables['since'])
+                return {'data': {'queryOrder': [record for record in orders if to_datetime64(record['date']) >= since]}}
+
+        rollup = SalesRollup()
+        self.assertEqual(rollup.update(Client()), 2)
+        self.assertEqual(rollup.watermark, np.datetime64('2024-01-01T00:00:00.500'))
+        orders.append(order('3', '2024-01-01T00:00:01Z', 5.0, LIPSTICK))
+        self.assertEqual(rollup.update(Client()), 1)
+        self.assertEqual(rollup.update(Client()), 0)
+        self.assertEqual(list(rollup.series('day')[1]), [35.0])
+
+    def test_year_over_year_and_spikes(self):
+        rollup = SalesRollup()
+        orders = []
+        for month in range(1, 13):
+            for year, amount in ((2023, 100.0), (2024, 150.0)):
+                total = amount * (5 if month == 12 else 1)
+                orders.append(order('%d-%d' % (year, month), '%d-%02d-15T00:00:00Z' % (year, month), total, LIPSTICK))
+        rollup.add_orders(orders)
+        starts, keys, current, previous, growth = rollup.year_over_year('month', by='category')
+        self.assertEqual(keys, ['Beauty'])
+        self.assertTrue(np.isnan(growth[:12]).all())
+        np.testing.assert_allclose(growth[12:, 0], 0.5)
+        spikes = rollup.seasonal_spikes('month', by='category', window=3, threshold=3.0)
+        self.assertEqual(sorted(str(start)[:7] for start, _, _, _ in spikes), ['2023-12', '2024-12'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests aiohttp ijson numpy
+# python -m unittest utest_segmentation.py
+# deactivate
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# Add the backend and examples directories to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from dgraph_stub_server import InMemoryDgraph
+from generate_synthetic_data import SyntheticDataGenerator
+from segmentation import CustomerSegmenter, MemberFeatures, MiniBatchKMeans, RFMBinner, fetch_categories
+
+class TestMemberFeatures(unittest.TestCase):
+    def test_features_of_a_batch(self):
+        members = [
+            {'memberId': '1', 'orders': [
+                {'total': 10.0, 'date': '2024-01-01T00:00:00Z', 'products': [{'category': 'Beauty'}, {'category': 'Skincare'}]},
+                {'total': 30.0, 'date': '2024-01-21T00:00:00Z', 'products': [{'category': 'Beauty'}, {'category': 'Hair'}]}],
+             'reviewsAggregate': {'count': 3}},
+            {'memberId': '2', 'orders': [], 'reviewsAggregate': {'count': 0}},
+        ]
+        features = MemberFeatures(members, ['Beauty', 'Skincare'], '2024-01-31')
+        self.assertEqual(list(features.member_ids), ['1', '2'])
+        self.assertEqual(list(features.orders), [2, 0])
+        self.assertEqual(list(features.average_order_value), [20, 0])
+        self.assertEqual(list(features.reviews), [3, 0])
+        self.assertEqual(features.recency_days[0], 10)
+        self.assertTrue(np.isnan(features.recency_days[1]))
+        # Categories outside the fixed list are left out of the mix
+        np.testing.assert_allclose(features.category_mix, [[2 / 3, 1 / 3], [0, 0]])
+        self.assertEqual(features.matrix().shape, (2, 5))
+
+class TestMiniBatchKMeans(unittest.TestCase):
+    def test_finds_separated_clusters_batch_by_batch(self):
+        rng = np.random.default_rng(0)
+        truth = np.array([[0, 0], [10, 0], [0, 10]], dtype=np.float64)
+        labels = rng.integers(0, 3, 30000)
+        X = truth[labels] + rng.normal(0, 0.5, (30000, 2))
+        kmeans = MiniBatchKMeans(clusters=3, seed=1)
+        for start in range(0, len(X), 1000):
+            kmeans.partial_fit(X[start:start + 1000])
+        centers = kmeans.centers * kmeans.scale + kmeans.mean
+        for center in truth:
+            self.assertLess(np.min(np.linalg.norm(centers - center, axis=1)), 0.2)
+        predicted = kmeans.predict(X)
+        # Each true cluster maps onto a single predicted segment
+        for label in range(3):
+            self.assertEqual(len(np.unique(predicted[labels == label])), 1)
+
+class TestRFMBinner(unittest.TestCase):
+    def test_reservoir_quantiles(self):
+        rng = np.random.default_rng(2)
+        binner = RFMBinner(bins=4, sample_size=2000, seed=3)
+        for _ in range(20):
+            binner.partial_fit(rng.uniform(0, 100, 1000), rng.uniform(0, 100, 1000), rng.uniform(0, 100, 1000))
+        self.assertEqual(len(binner.sample), 2000)
+        np.testing.assert_allclose(binner.edges(), [[25, 50, 75]] * 3, atol=5)
+        scores = binner.transform(np.array([5.0, 95.0, np.nan]), np.array([95.0, 5.0, 0.0]), np.array([60.0, 10.0, 0.0]))
+        self.assertEqual(scores.tolist(), [[4, 4, 3], [1, 1, 1], [0, 0, 0]])
+
+class TestCustomerSegmenter(unittest.TestCase):
+    def test_streams_members_from_dgraph(self):
+        generator = SyntheticDataGenerator(members=200, products=30, orders=2000, seed=8)
+        graph = InMemoryDgraph()
+        graph.load(generator.members(), generator.products(), generator.orders(), generator.reviews())
+        segmenter = CustomerSegmenter(graph, clusters=4, batch_size=64, page_size=50, now='2025-01-01')
+        segmenter.fit(passes=2)
+        self.assertEqual(segmenter.categories, fetch_categories(graph))
+        segments = list(segmenter.segments())
+        self.assertEqual(len(segments), 200)
+        self.assertEqual(len({member_id for member_id, _, _ in segments}), 200)
+        self.assertTrue({segment for _, segment, _ in segments} <= set(range(4)))
+        profiles = segmenter.profiles()
+        self.assertEqual(len(profiles), 4)
+        self.assertAlmostEqual(sum(profile['members'] for profile in profiles), 400)
+
+        before = segmenter.kmeans.counts.sum()
+        segmenter.refresh(decay=0.5)
+        self.assertAlmostEqual(segmenter.kmeans.counts.sum(), before * 0.5 + 200)
+
+    def test_refresh_follows_shifted_data(self):
+        def load(orders):
+            generator = SyntheticDataGenerator(members=200, products=30, orders=orders, seed=8)
+            graph = InMemoryDgraph()
+            graph.load(generator.members(), generator.products(), generator.orders(), generator.reviews())
+            return graph
+
+        def order_level(segmenter):
+            # Weighted mean of the centers' log order counts, in feature units
+            kmeans = segmenter.kmeans
+            return np.average((kmeans.centers * kmeans.scale + kmeans.mean)[:, 0], weights=kmeans.counts)
+
+        before, after = load(1000), load(8000)
+        target = np.mean([features.matrix()[:, 0].mean() for features in
+                          CustomerSegmenter(after, batch_size=200, page_size=200, now='2025-01-01')._batches()])
+        levels = {}
+        for decay in (1.0, 0.1):
+            segmenter = CustomerSegmenter(before, clusters=4, batch_size=64, page_size=50, now='2025-01-01').fit(passes=2)
+            start = order_level(segmenter)
+            segmenter.client = after
+            segmenter.refresh(decay=decay)
+            levels[decay] = order_level(segmenter)
+        self.assertGreater(target - start, 1.5)
+        # Members now order more, and the decayed centers follow them most of the way
+        self.assertGreater(levels[1.0], start)
+        self.assertGreater(levels[0.1], levels[1.0])
+        self.assertLess(abs(levels[0.1] - target), 0.4)
+
+if __name__ == '__main__':
+    unittest.main()
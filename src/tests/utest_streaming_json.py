@@ -0,0 +1,70 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install responses ijson
+# python -m unittest utest_streaming_json.py
+# deactivate
+
+import os
+import sys
+import json
+import unittest
+import responses
+
+# Add the src directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+import streaming_json
+from analysis_engine import AnalysisAPI, DgraphClient
+from graphql_document import GraphQLError
+
+ORDERS = [
+    {'orderId': str(i), 'total': i * 1.25, 'date': '2024-01-%02dT00:00:00Z' % (i % 28 + 1),
+     'products': [{'productId': str(i % 7)}, {'productId': 'café'}]}
+    for i in range(50)
+]
+BODY = json.dumps({'extensions': {'touched_uids': 12}, 'data': {'queryOrder': ORDERS}}).encode()
+
+def chunked(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+class TestStreamingJson(unittest.TestCase):
+    def test_python_scanner_across_small_chunks(self):
+        # Chunks small enough to split keys, numbers and multi-byte characters
+        items = list(streaming_json._iter_items_python(chunked(BODY, 7), ('data', 'queryOrder')))
+
+        self.assertEqual(items, ORDERS)
+
+    @unittest.skipIf(streaming_json.ijson is None, "ijson is not installed")
+    def test_ijson_backend_across_small_chunks(self):
+        items = list(streaming_json._iter_items_ijson(chunked(BODY, 7), ('data', 'queryOrder')))
+
+        self.assertEqual(items, ORDERS)
+
+    def test_errors_are_raised_after_partial_data(self):
+        body = json.dumps({'data': {'queryOrder': ORDERS[:2]}, 'errors': [{'message': 'Some error occurred'}]}).encode()
+
+        for backend in (streaming_json._iter_items_python, streaming_json.iter_items):
+            items = []
+            with self.assertRaises(GraphQLError):
+                for item in backend(chunked(body, 16), ('data', 'queryOrder')):
+                    items.append(item)
+            self.assertEqual(items, ORDERS[:2])
+
+    def test_null_collection(self):
+        body = json.dumps({'data': {'queryOrder': None}}).encode()
+
+        self.assertEqual(list(streaming_json._iter_items_python([body], ('data', 'queryOrder'))), [])
+        self.assertEqual(list(streaming_json.iter_items([body], ('data', 'queryOrder'))), [])
+
+    @responses.activate
+    def test_analysis_stream_response(self):
+        responses.add(responses.POST, 'http://localhost:8080/graphql', body=BODY, status=200)
+        analysis_api = AnalysisAPI(DgraphClient('http://localhost:8080/graphql'))
+
+        items = list(analysis_api.stream_response('market_basket_analysis'))
+
+        self.assertEqual(items, ORDERS)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,239 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install websockets
+# python -m unittest utest_subscriptions.py
+# deactivate
+
+import os
+import sys
+import json
+import asyncio
+import unittest
+import websockets
+
+# Add the src directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+from subscriptions import Backoff, BoundedQueue, QueueFull, SubscriptionManager
+
+class GraphQLWsServer:
+    """
+    A minimal graphql-ws server that answers every `start` with two data messages
+    echoing the subscription variables, and records every message it receives.
+    """
+    def __init__(self, drop_after_start=0):
+        self.connections = 0
+        self.received = []
+        # Number of connections to drop right after their first `start`, to simulate a restart
+        self.drop_after_start = drop_after_start
+
+    async def handler(self, websocket, path=None):
+        self.connections += 1
+        async for raw in websocket:
+            message = json.loads(raw)
+            self.received.append(message)
+            if message['type'] == 'connection_init':
+                await websocket.send(json.dumps({'type': 'connection_ack'}))
+                await websocket.send(json.dumps({'type': 'ka'}))
+            elif message['type'] == 'start':
+                variables = message['payload']['variables']
+                for sequence in (1, 2):
+                    await websocket.send(json.dumps({
+                        'id': message['id'], 'type': 'data',
+                        'payload': {'data': {'queryOrder': [{'memberId': variables['memberId'], 'sequence': sequence}]}}
+                    }))
+                if self.drop_after_start:
+                    self.drop_after_start -= 1
+                    await websocket.close()
+                    return
+            elif message['type'] == 'stop':
+                await websocket.send(json.dumps({'id': message['id'], 'type': 'complete'}))
+
+class TestSubscriptionManager(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = GraphQLWsServer()
+        self.websocket_server = await websockets.serve(self.server.handler, '127.0.0.1', 0, subprotocols=['graphql-ws'])
+        port = list(self.websocket_server.sockets)[0].getsockname()[1]
+        self.manager = SubscriptionManager('http://127.0.0.1:%d/graphql' % port)
+
+    async def asyncTearDown(self):
+        await self.manager.close()
+        self.websocket_server.close()
+        await self.websocket_server.wait_closed()
+
+    async def test_many_subscriptions_share_one_connection(self):
+        query = "subscription($memberId: String!) { queryOrder(filter: {member: {memberId: {eq: $memberId}}}) { orderId } }"
+        subscriptions = [await self.manager.subscribe(query, {'memberId': str(i)}) for i in range(5)]
+
+        for index, subscription in enumerate(subscriptions):
+            first = await asyncio.wait_for(subscription.__anext__(), 1)
+            second = await asyncio.wait_for(subscription.__anext__(), 1)
+            self.assertEqual(first['data']['queryOrder'][0], {'memberId': str(index), 'sequence': 1})
+            self.assertEqual(second['data']['queryOrder'][0]['sequence'], 2)
+
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len({subscription.id for subscription in subscriptions}), 5)
+
+    async def test_stop_one_subscription(self):
+        received = []
+        query = "subscription($memberId: String!) { queryOrder { orderId } }"
+        kept = await self.manager.subscribe(query, {'memberId': 'kept'}, callback=received.append)
+        stopped = await self.manager.subscribe(query, {'memberId': 'stopped'})
+
+        await stopped.stop()
+        payloads = [payload async for payload in stopped]
+        await asyncio.sleep(0.05)
+
+        self.assertIn({'id': stopped.id, 'type': 'stop'}, self.server.received)
+        self.assertIn(kept.id, self.manager.subscriptions)
+        self.assertNotIn(stopped.id, self.manager.subscriptions)
+        self.assertEqual(len(received), 2)
+        self.assertLessEqual(len(payloads), 2)
+
+    async def test_slow_consumer_does_not_stall_the_connection(self):
+        query = "subscription($memberId: String!) { queryOrder { orderId } }"
+        # Never read: one payload fills its queue, the other waits in its delivery task
+        slow = await self.manager.subscribe(query, {'memberId': 'slow'}, overflow='block', queue_size=1)
+        fast = await self.manager.subscribe(query, {'memberId': 'fast'})
+
+        payloads = [await asyncio.wait_for(fast.__anext__(), 1) for _ in range(2)]
+
+        self.assertEqual([payload['data']['queryOrder'][0]['memberId'] for payload in payloads], ['fast', 'fast'])
+        self.assertEqual(slow.queue.qsize(), 1)
+        self.assertFalse(slow.delivery.done())
+
+        # The next payload fills the backlog; one more fails and stops the slow subscription only
+        for sequence in (3, 4):
+            self.assertIn(slow.id, self.manager.subscriptions)
+            self.manager._dispatch(json.dumps({'id': slow.id, 'type': 'data',
+                                               'payload': {'data': {'queryOrder': [{'sequence': sequence}]}}}))
+        await asyncio.sleep(0.05)
+
+        self.assertNotIn(slow.id, self.manager.subscriptions)
+        self.assertIn(fast.id, self.manager.subscriptions)
+        self.assertIn({'id': slow.id, 'type': 'stop'}, self.server.received)
+        self.assertEqual([(await slow.__anext__())['data']['queryOrder'][0]['sequence'] for _ in range(3)], [1, 2, 3])
+        with self.assertRaisesRegex(Exception, 'fell behind by more than 1 payloads'):
+            await asyncio.wait_for(slow.__anext__(), 1)
+        with self.assertRaises(StopAsyncIteration):
+            await asyncio.wait_for(slow.__anext__(), 1)
+
+    async def test_slow_callback_backlog_is_bounded(self):
+        release = asyncio.Event()
+        received = []
+
+        async def callback(payload):
+            await release.wait()
+            received.append(payload)
+
+        subscription = await self.manager.subscribe("subscription { queryOrder { orderId } }", {'memberId': '1'},
+                                                    callback=callback, overflow='drop_oldest', queue_size=2)
+        await asyncio.sleep(0.05)
+        for sequence in range(3, 10):
+            self.manager._dispatch(json.dumps({'id': subscription.id, 'type': 'data', 'payload': {'sequence': sequence}}))
+
+        # The first payload is in the callback, the backlog only keeps the newest two
+        self.assertEqual(subscription.backlog.qsize(), 2)
+        self.assertEqual(subscription.backlog.dropped, 6)
+        release.set()
+        await asyncio.wait_for(subscription.delivery, 1)
+        self.assertEqual(received[1:], [{'sequence': 8}, {'sequence': 9}])
+
+    async def test_failing_callback_is_reported_on_its_subscription(self):
+        query = "subscription($memberId: String!) { queryOrder { orderId } }"
+
+        def callback(payload):
+            raise KeyError('orderId')
+
+        broken = await self.manager.subscribe(query, {'memberId': 'broken'}, callback=callback)
+        working = await self.manager.subscribe(query, {'memberId': 'working'})
+
+        with self.assertRaisesRegex(Exception, 'callback failed'):
+            await asyncio.wait_for(broken.__anext__(), 1)
+        self.assertEqual((await asyncio.wait_for(working.__anext__(), 1))['data']['queryOrder'][0]['memberId'], 'working')
+        self.assertFalse(self.manager.reader.done())
+
+    async def test_invalid_messages_fail_the_subscriptions(self):
+        subscription = await self.manager.subscribe("subscription { queryOrder { orderId } }", {'memberId': '1'})
+        for _ in range(2):
+            await asyncio.wait_for(subscription.__anext__(), 1)
+
+        self.manager._dispatch('<html>')
+
+        with self.assertRaisesRegex(Exception, 'Invalid subscription message'):
+            await asyncio.wait_for(subscription.__anext__(), 1)
+
+    async def test_reconnects_and_restarts_subscriptions(self):
+        self.server.drop_after_start = 1
+        self.manager.backoff = Backoff(initial=0.01, maximum=0.05)
+        subscription = await self.manager.subscribe("subscription { queryOrder { orderId } }", {'memberId': '7'})
+
+        payloads = [await asyncio.wait_for(subscription.__anext__(), 2) for _ in range(4)]
+
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(self.manager.reconnects, 1)
+        self.assertEqual([payload['data']['queryOrder'][0]['sequence'] for payload in payloads], [1, 2, 1, 2])
+        starts = [message for message in self.server.received if message['type'] == 'start']
+        self.assertEqual([message['id'] for message in starts], [subscription.id, subscription.id])
+
+class TestBoundedQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_drop_oldest(self):
+        queue = BoundedQueue(maxsize=2, policy='drop_oldest')
+        for item in range(5):
+            await queue.put(item)
+
+        self.assertEqual([await queue.get(), await queue.get()], [3, 4])
+        self.assertEqual(queue.dropped, 3)
+
+    async def test_coalesce_latest(self):
+        queue = BoundedQueue(maxsize=2, policy='coalesce_latest')
+        for item in range(5):
+            await queue.put(item)
+
+        self.assertEqual(queue.qsize(), 1)
+        self.assertEqual(await queue.get(), 4)
+
+    async def test_overflow_keeps_control_items(self):
+        for policy in ('drop_oldest', 'coalesce_latest'):
+            queue = BoundedQueue(maxsize=2, policy=policy)
+            await queue.put(1)
+            queue.put_nowait('error', control=True)
+            for item in range(2, 6):
+                await queue.put(item)
+            queue.put_nowait('complete', control=True)
+
+            items = [await queue.get() for _ in range(queue.qsize())]
+            self.assertEqual(items, ['error', 4, 5, 'complete'] if policy == 'drop_oldest' else ['error', 5, 'complete'])
+
+    async def test_block_waits_for_consumer(self):
+        queue = BoundedQueue(maxsize=1, policy='block')
+        await queue.put('first')
+        with self.assertRaises(QueueFull):
+            queue.put_nowait('second')
+
+        producer = asyncio.ensure_future(queue.put('second'))
+        await asyncio.sleep(0.01)
+        self.assertFalse(producer.done())
+
+        self.assertEqual(await queue.get(), 'first')
+        await asyncio.wait_for(producer, 1)
+        self.assertEqual(await queue.get(), 'second')
+
+    async def test_control_items_bypass_the_bound(self):
+        queue = BoundedQueue(maxsize=1, policy='block')
+        await queue.put('data')
+        queue.put_nowait('complete', control=True)
+
+        self.assertEqual(queue.qsize(), 2)
+
+    def test_backoff_is_bounded(self):
+        backoff = Backoff(initial=1, maximum=8)
+
+        delays = [backoff.delay(attempt) for attempt in range(10)]
+
+        self.assertTrue(all(0 <= delay <= 8 for delay in delays))
+        self.assertTrue(all(0 <= backoff.delay(0) <= 1 for _ in range(20)))
+
+if __name__ == '__main__':
+    unittest.main()
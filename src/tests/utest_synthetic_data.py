@@ -0,0 +1,80 @@
+# Create and activate a virtual environment
+# ------------------------------------------------------------------
+# python3 -m venv myenv && source myenv/bin/activate
+# pip install --upgrade pip && pip install requests numpy
+# python -m unittest utest_synthetic_data.py
+# deactivate
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+
+# Add the examples directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../examples')))
+
+from create_mock_data import DgraphDataInserter
+from generate_synthetic_data import SyntheticDataGenerator, read_ndjson
+
+class TestSyntheticDataGenerator(unittest.TestCase):
+    def setUp(self):
+        self.generator = SyntheticDataGenerator(members=500, products=100, orders=5000, seed=7, chunk_size=1000)
+
+    def test_same_seed_gives_same_data(self):
+        other = SyntheticDataGenerator(members=500, products=100, orders=5000, seed=7, chunk_size=1000)
+        self.assertEqual(list(self.generator.orders()), list(other.orders()))
+        self.assertEqual(list(self.generator.reviews()), list(other.reviews()))
+        different = SyntheticDataGenerator(members=500, products=100, orders=5000, seed=8, chunk_size=1000)
+        self.assertNotEqual(list(self.generator.orders()), list(different.orders()))
+
+    def test_orders_are_consistent(self):
+        prices = {product[0]: product[3] for product in self.generator.products()}
+        members = {member[0] for member in self.generator.members()}
+        orders = list(self.generator.orders())
+
+        self.assertEqual(len(orders), 5000)
+        self.assertEqual(len({order[0] for order in orders}), 5000)
+        for order_id, member_id, product_ids, total, date in orders:
+            self.assertIn(member_id, members)
+            self.assertTrue(1 <= len(product_ids) <= 20)
+            self.assertEqual(len(set(product_ids)), len(product_ids))
+            self.assertAlmostEqual(total, sum(prices[product_id] for product_id in product_ids), places=6)
+            self.assertTrue('2023-01-01' <= date < '2024-01-01')
+
+    def test_popularity_is_skewed(self):
+        lines = Counter(product_id for order in self.generator.orders() for product_id in order[2])
+        top = sum(count for _, count in lines.most_common(10))
+        # The top 10% of the products get a large share of the order lines
+        self.assertGreater(top / sum(lines.values()), 0.3)
+
+    def test_reviews_follow_orders(self):
+        orders = {order[0]: order for order in self.generator.orders()}
+        reviews = list(self.generator.reviews())
+
+        self.assertEqual(len({review[0] for review in reviews}), len(reviews))
+        ratings = Counter(review[1] for review in reviews)
+        self.assertTrue(set(ratings) <= {1, 2, 3, 4, 5})
+        self.assertGreater(ratings[5], ratings[1])
+        for review_id, rating, comment, member_id, product_id, date in reviews:
+            order = orders[review_id.split('-')[0]]
+            self.assertEqual(member_id, order[1])
+            self.assertIn(product_id, order[2])
+            self.assertGreaterEqual(date, order[4])
+
+    def test_ndjson_round_trip(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        written = self.generator.write_ndjson(directory, compress=True)
+
+        orders = list(read_ndjson(os.path.join(directory, 'orders.ndjson.gz')))
+        self.assertEqual(written['Order'], len(orders))
+        first = next(self.generator.orders())
+        self.assertEqual(DgraphDataInserter.order_input(**orders[0]), DgraphDataInserter.order_input(*first))
+        reviews = list(read_ndjson(os.path.join(directory, 'reviews.ndjson.gz')))
+        self.assertEqual(reviews[0]['review_id'], next(self.generator.reviews())[0])
+
+if __name__ == '__main__':
+    unittest.main()